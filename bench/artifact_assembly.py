@@ -0,0 +1,104 @@
+"""Artifact assembly cost: temp directory + zip.write (+ copy) vs the in-memory ArtifactBuilder.
+
+Reproduces how generate-terraform (/terraform) and containerize-project
+(apply) built their ZIPs before, and compares latency and bytes moved
+with the shared builder. "Bytes copied" counts every write and read of
+artifact data: files written to the temp dir, read back into the ZIP,
+the ZIP itself, and containerize-project's final copy to the output dir.
+
+    python bench/artifact_assembly.py --scale 1 --scale 50
+"""
+import argparse, io, os, shutil, sys, tempfile, time, zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "services"))
+
+from shared.artifact import ArtifactBuilder, iter_archive
+
+TERRAFORM_FILES = {
+    "main.tf": 'resource "aws_ecs_service" "app" {\n  name = var.name\n  desired_count = 2\n}\n' * 40,
+    "provider.tf": 'terraform {\n  required_providers {\n    aws = { source = "hashicorp/aws" }\n  }\n}\n',
+    "variables.tf": 'variable "name" {\n  type = string\n}\n' * 10,
+    "outputs.tf": 'output "service" { value = aws_ecs_service.app.id }\n',
+    "terraform_config.json": '{"cloud_provider": "aws", "type": "single-docker"}\n',
+    "README.md": "# Auto-generated Terraform files\n",
+}
+
+CONTAINERIZE_FILES = {
+    "Dockerfile": "FROM python:3.12-slim\nWORKDIR /app\nCOPY . /app\nCMD [\"python\", \"main.py\"]\n",
+    "docker-compose.yml": "services:\n  app:\n    build:\n      context: ./\n    ports:\n    - 8000:8000\n",
+    "README.md": "Generated simple Dockerfile + docker-compose for single-container deployment.\n",
+}
+
+
+def scaled(files, scale):
+    return {name: text * scale for name, text in files.items()}
+
+
+def legacy_zip(files, out_dir=None):
+    """Old path: write files to a temp dir, walk it into a ZIP, optionally copy the ZIP out."""
+    copied = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gen_dir = os.path.join(tmpdir, "gen")
+        for name, text in files.items():
+            path = os.path.join(gen_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(text)
+            copied += 2 * len(text.encode())  # written, then read back by zip.write
+        if out_dir is None:
+            stream = io.BytesIO()
+            with zipfile.ZipFile(stream, "w") as z:
+                for base, _, fnames in os.walk(gen_dir):
+                    for fn in fnames:
+                        z.write(os.path.join(base, fn), os.path.relpath(os.path.join(base, fn), gen_dir))
+            return copied + stream.getbuffer().nbytes
+        artifact = os.path.join(tmpdir, "artifact.zip")
+        with zipfile.ZipFile(artifact, "w", zipfile.ZIP_DEFLATED) as z:
+            for base, _, fnames in os.walk(gen_dir):
+                for fn in fnames:
+                    z.write(os.path.join(base, fn), os.path.relpath(os.path.join(base, fn), gen_dir))
+        size = os.path.getsize(artifact)
+        shutil.copyfile(artifact, os.path.join(out_dir, "artifact.zip"))
+        return copied + 3 * size  # written, read by copyfile, written again
+
+
+def builder_zip(files, out_dir=None):
+    """New path: strings straight into ZIP entries, to the response or the output file."""
+    if out_dir is None:
+        return sum(len(chunk) for chunk in iter_archive(files.items()))
+    path = os.path.join(out_dir, "artifact.zip")
+    with open(path, "wb") as f, ArtifactBuilder(f) as builder:
+        for name, text in files.items():
+            builder.add(name, text)
+    return os.path.getsize(path)
+
+
+def measure(fn, files, out_dir, repeat):
+    best, copied = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        copied = fn(files, out_dir)
+        best = min(best, time.perf_counter() - start)
+    return best, copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, action="append", help="repeat each file's content N times")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print("%-22s %6s %12s %12s %14s %14s" % ("service", "scale", "legacy ms", "builder ms",
+                                             "legacy bytes", "builder bytes"))
+    with tempfile.TemporaryDirectory() as out_dir:
+        for scale in args.scale or [1, 50]:
+            for service, files, dest in (("generate-terraform", TERRAFORM_FILES, None),
+                                         ("containerize-project", CONTAINERIZE_FILES, out_dir)):
+                files = scaled(files, scale)
+                lt, lb = measure(legacy_zip, files, dest, args.repeat)
+                bt, bb = measure(builder_zip, files, dest, args.repeat)
+                print("%-22s %6d %12.3f %12.3f %14d %14d" % (service, scale, lt * 1e3, bt * 1e3, lb, bb))
+
+
+if __name__ == "__main__":
+    main()
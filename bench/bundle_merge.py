@@ -0,0 +1,81 @@
+"""Project bundling cost: recompressing the uploaded repo vs raw member copy vs a plain file copy.
+
+Builds a synthetic repository ZIP of roughly ``--size-mb`` megabytes of
+source-like text, then merges it with the generated Terraform files the
+old way (decompress every member and deflate it again) and the way
+generate-terraform does it now (copy compressed bytes through the central
+directory). A straight copy of the uploaded archive is the lower bound.
+
+    python bench/bundle_merge.py --size-mb 20 --files 2000
+"""
+import argparse, io, os, random, shutil, sys, time, zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "services"))
+
+from shared.artifact import iter_archive
+
+GENERATED = {
+    "main.tf": 'resource "aws_ecs_service" "app" {\n  name = var.name\n}\n',
+    "provider.tf": 'provider "aws" {\n  region = var.region\n}\n',
+    "variables.tf": 'variable "name" {\n  type = string\n}\n',
+    "outputs.tf": 'output "service" { value = aws_ecs_service.app.id }\n',
+    "terraform_config.json": '{"type": "single-docker"}\n',
+    "README.md": "# Auto-generated Terraform files\n",
+}
+
+WORDS = ("def", "return", "import", "self", "value", "config", "request", "for", "in", "if",
+         "else", "None", "True", "client", "response", "data", "path", "name", "=", "(", ")")
+
+
+def synthetic_repo(size_mb: float, files: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    per_file = max(1, int(size_mb * 1024 * 1024 / files))
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as z:
+        for i in range(files):
+            text = " ".join(rng.choice(WORDS) for _ in range(per_file // 5))
+            z.writestr("project/pkg%d/module_%d.py" % (i % 40, i), text[:per_file])
+    return stream.getvalue()
+
+
+def recompress(repo: bytes) -> int:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dest, zipfile.ZipFile(io.BytesIO(repo)) as src:
+        for name, text in GENERATED.items():
+            dest.writestr(name, text)
+        for info in src.infolist():
+            dest.writestr(info.filename, src.read(info))
+    return out.getbuffer().nbytes
+
+
+def raw_copy(repo: bytes) -> int:
+    return sum(len(c) for c in iter_archive(GENERATED.items(), bundle=zipfile.ZipFile(io.BytesIO(repo))))
+
+
+def file_copy(repo: bytes) -> int:
+    out = io.BytesIO()
+    shutil.copyfileobj(io.BytesIO(repo), out)
+    return out.getbuffer().nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    repo = synthetic_repo(args.size_mb, args.files)
+    print("repo: %d members, %.1f MB compressed" % (args.files, len(repo) / 1e6))
+    print("%-12s %10s %12s" % ("method", "ms", "output MB"))
+    for name, fn in (("recompress", recompress), ("raw copy", raw_copy), ("file copy", file_copy)):
+        best, size = float("inf"), 0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            size = fn(repo)
+            best = min(best, time.perf_counter() - start)
+        print("%-12s %10.1f %12.2f" % (name, best * 1e3, size / 1e6))
+
+
+if __name__ == "__main__":
+    main()
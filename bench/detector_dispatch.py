@@ -0,0 +1,86 @@
+"""Micro-benchmark for the codebase-context detector dispatcher.
+
+Registers an increasing number of synthetic detectors on top of the
+built-in ones and reports the per-file cost of one dispatch pass over a
+``FileIndex`` (built once, as listing an archive now produces it). With
+index-based routing the cost should stay flat as detectors are added.
+
+    python bench/detector_dispatch.py --files 200000
+"""
+import argparse, os, random, sys, time
+
+SERVICES = os.path.join(os.path.dirname(__file__), "..", "src", "services")
+sys.path[:0] = [SERVICES, os.path.join(SERVICES, "codebase-context")]
+
+from detectors import DETECTORS, Detector, DetectorRegistry, FileSource, LANG_BY_EXT, PKG_MANAGERS
+from file_index import FileIndex
+
+
+def synthetic_files(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    exts = list(LANG_BY_EXT) + [".md", ".txt", ".png", ""]
+    specials = list(PKG_MANAGERS) + ["Dockerfile", ".env", "docker-compose.yml"]
+    top = ["src", "tests", "app", "lib", "docs"]
+    files = []
+    for i in range(n):
+        parts = [rng.choice(top)] + ["d%d" % rng.randrange(50) for _ in range(rng.randrange(4))]
+        if rng.random() < 0.01:
+            name = rng.choice(specials)
+        else:
+            name = "f%d%s" % (i, rng.choice(exts))
+        files.append("/".join(parts + [name]))
+    return files
+
+
+def synthetic_detector(i: int):
+    class _Synthetic(Detector):
+        name = "synthetic_%d" % i
+        basenames = ("marker_%d.cfg" % i,)
+        extensions = (".x%d" % i,)
+
+        def __init__(self):
+            self.hits = 0
+
+        def visit(self, path, key):
+            self.hits += 1
+
+        def visit_count(self, key, count):
+            self.hits += count
+
+        def result(self, source):
+            return self.hits
+    return _Synthetic
+
+
+class NullSource(FileSource):
+    def size(self, path):
+        return 0
+
+    def read(self, path, limit):
+        return b""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--extra", type=int, nargs="+", default=[0, 8, 32, 128, 512])
+    args = parser.parse_args()
+
+    files = FileIndex.from_paths(synthetic_files(args.files))
+    print("%8s %10s %12s" % ("extra", "detectors", "ns/file"))
+    for extra in args.extra:
+        registry = DetectorRegistry(DETECTORS.detectors)
+        for i in range(extra):
+            registry.register(synthetic_detector(i))
+        registry.index  # build indexes outside the timed region
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            registry.run(files, NullSource())
+            best = min(best, time.perf_counter() - start)
+        print("%8d %10d %12.1f" % (extra, len(registry.detectors), best / len(files) * 1e9))
+
+
+if __name__ == "__main__":
+    main()
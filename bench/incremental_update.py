@@ -0,0 +1,110 @@
+"""Re-analysis cost of a changed project: full /extract analysis vs a manifest delta update.
+
+Builds a synthetic repository of ``--files`` members, analyzes it once to
+seed a manifest, then changes ``--changed`` files (edits, additions and
+deletions). Reports the time to re-analyze the whole new archive, to
+update the manifest from the whole new archive, and to update it from a
+delta archive holding only the changes.
+
+    python bench/incremental_update.py --files 100000 --changed 10 --changed 1000
+"""
+import argparse, io, os, random, sys, time, zipfile
+
+SERVICES = os.path.join(os.path.dirname(__file__), "..", "src", "services")
+sys.path[:0] = [SERVICES, os.path.join(SERVICES, "codebase-context")]
+
+from detectors import DETECTORS, LANG_BY_EXT, PKG_MANAGERS
+from file_index import ZipIndex
+from incremental import Manifest
+from app import ZipSource
+
+
+def synthetic_repo(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    exts = list(LANG_BY_EXT) + [".md", ".txt", ""]
+    specials = list(PKG_MANAGERS) + ["Dockerfile", ".env", "docker-compose.yml"]
+    files = {}
+    for i in range(n):
+        parts = [rng.choice(["src", "tests", "app", "lib"])] + ["d%d" % rng.randrange(50) for _ in range(2)]
+        name = rng.choice(specials) if rng.random() < 0.01 else "f%d%s" % (i, rng.choice(exts))
+        files["/".join(parts + [name])] = "VALUE_%d=1\n    - 80%02d:80\n" % (i, i % 100)
+    return files
+
+
+def to_zip(files) -> bytes:
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as z:
+        for name, text in files.items():
+            z.writestr(name, text)
+    return stream.getvalue()
+
+
+def change(files, count, seed=1):
+    rng = random.Random(seed)
+    new, delta = dict(files), {}
+    paths = rng.sample(sorted(files), count)
+    third = count // 3
+    deleted = paths[:third]
+    for path in deleted:
+        del new[path]
+    for path in paths[third:2 * third]:
+        new[path] += "EDITED=1\n"
+        delta[path] = new[path]
+    for i in range(count - 2 * third):
+        path = "src/new/added_%d.py" % i
+        new[path] = delta[path] = "NEW_%d=1\n" % i
+    return new, delta, deleted
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def indexed(data: bytes):
+    fp = io.BytesIO(data)
+    index = ZipIndex.from_zip(fp)
+    return index, ZipSource(fp, index)
+
+
+def seeded(files_zip):
+    manifest = Manifest(DETECTORS)
+    manifest.update(*indexed(files_zip))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--changed", type=int, action="append")
+    args = parser.parse_args()
+
+    files = synthetic_repo(args.files)
+    base = to_zip(files)
+    print("repo: %d files" % len(files))
+    print("%8s %14s %16s %14s" % ("changed", "full ms", "manifest full ms", "delta ms"))
+    for count in args.changed or [10, 1000]:
+        new, delta, deleted = change(files, count)
+        new_zip, delta_zip = to_zip(new), to_zip(delta)
+
+        def full():
+            DETECTORS.run(*indexed(new_zip))
+
+        manifest = seeded(base)
+
+        def manifest_full():
+            manifest.update(*indexed(new_zip))
+
+        t_manifest = timed(manifest_full)
+        manifest = seeded(base)
+
+        def manifest_delta():
+            manifest.update(*indexed(delta_zip), delta=True, deleted=deleted)
+
+        print("%8d %14.1f %16.1f %14.1f" % (count, timed(full) * 1e3, t_manifest * 1e3,
+                                            timed(manifest_delta) * 1e3))
+
+
+if __name__ == "__main__":
+    main()
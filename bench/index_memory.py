@@ -0,0 +1,115 @@
+"""Peak memory of listing and routing a large repository: ZipFile + path strings vs the compact FileIndex.
+
+Writes a synthetic archive of ``--files`` members, then analyzes it in a
+fresh process per mode and reports the peak RSS growth over the process
+after loading the archive bytes, scaled to 100k files. "zipfile" is how
+codebase-context listed archives before (a ZipInfo per member, a list of
+path strings, per-path string routing); "index" reads the central
+directory into a ``ZipIndex`` and routes per distinct name.
+
+    python bench/index_memory.py --files 100000 --files 500000
+"""
+import argparse, io, os, random, subprocess, sys, tempfile, time, warnings, zipfile
+
+SERVICES = os.path.join(os.path.dirname(__file__), "..", "src", "services")
+sys.path[:0] = [SERVICES, os.path.join(SERVICES, "codebase-context")]
+
+
+COMMON_NAMES = ("__init__.py", "index.js", "index.ts", "utils.py", "README.md", "package.json",
+                "test_main.py", "main.go", "types.ts", "config.json", "models.py", "styles.css")
+
+
+def synthetic_repo(path: str, n: int, seed: int = 0) -> None:
+    """A monorepo in directory-walk order; half the basenames are common ones."""
+    rng = random.Random(seed)
+    exts = [".py", ".js", ".ts", ".go", ".json", ".md", ".txt", ""]
+    warnings.simplefilter("ignore", UserWarning)  # a directory may be drawn twice
+    with zipfile.ZipFile(path, "w") as z:
+        i = 0
+        while i < n:
+            parts = ["packages", "pkg%d" % rng.randrange(2000), rng.choice(["src", "tests", "lib"])]
+            parts += ["m%d" % rng.randrange(30) for _ in range(rng.randrange(3))]
+            common = iter(rng.sample(COMMON_NAMES, len(COMMON_NAMES)))
+            for _ in range(min(n - i, rng.randrange(1, 20))):
+                name = next(common, None) if rng.random() < 0.5 else None
+                name = name or "file_%d%s" % (i, rng.choice(exts))
+                z.writestr("/".join(parts + [name]), b"")
+                i += 1
+
+
+def status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def reset_peak() -> None:
+    # ru_maxrss would carry over the parent's peak from fork; VmHWM is reset here.
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def legacy(data: bytes):
+    from detectors import DETECTORS
+    z = zipfile.ZipFile(io.BytesIO(data))
+    files = [info.filename for info in z.infolist() if not info.is_dir()]
+    by_name, by_name_ci, by_ext, by_dir = DETECTORS.index
+    hits = 0
+    for path in files:
+        head, _, name = path.rpartition("/")
+        hits += len(by_name.get(name, ())) + len(by_name_ci.get(name.lower(), ()))
+        hits += len(by_ext.get(os.path.splitext(name)[1].lower(), ()))
+        if head:
+            hits += len(by_dir.get(path.partition("/")[0].lower(), ()))
+    return z, files
+
+
+def indexed(data: bytes):
+    from app import ZipSource
+    from detectors import DETECTORS
+    from file_index import ZipIndex
+    fp = io.BytesIO(data)
+    index = ZipIndex.from_zip(fp)
+    DETECTORS.run(index, ZipSource(fp, index))
+    return index
+
+
+def child(mode: str, path: str) -> None:
+    import app, detectors  # noqa: F401  imported before the baseline is taken
+    with open(path, "rb") as f:
+        data = f.read()
+    reset_peak()
+    before = status_kb("VmRSS")
+    start = time.perf_counter()
+    kept = (legacy if mode == "zipfile" else indexed)(data)
+    elapsed = time.perf_counter() - start
+    print(status_kb("VmHWM") - before, status_kb("VmRSS") - before, elapsed)
+    del kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, action="append")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    env = dict(os.environ, CODEBASE_CACHE_DIR="")
+    print("%9s %8s %16s %18s %9s" % ("files", "mode", "peak MB/100k", "retained MB/100k", "ms"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.files or [100000]:
+            path = os.path.join(tmp, "repo.zip")
+            synthetic_repo(path, n)
+            for mode in ("zipfile", "index"):
+                out = subprocess.run([sys.executable, __file__, "--child", mode, path], env=env,
+                                     check=True, capture_output=True, text=True).stdout.split()
+                peak, retained, elapsed = int(out[0]), int(out[1]), float(out[2])
+                scale = 1e5 / n / 1024
+                print("%9d %8s %16.1f %18.1f %9.0f" % (n, mode, peak * scale, retained * scale, elapsed * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Throughput of language-context keyword matching: per-keyword regexes vs the compiled matcher.
+
+    python bench/language_keywords.py
+"""
+import argparse, importlib.util, os, random, re, time
+
+APP = os.path.join(os.path.dirname(__file__), "..", "src", "services", "language-context", "app.py")
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("language_context_app", APP)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Reference implementation: what /extract did before the tables were compiled.
+def find_keys(text, mapping):
+    res = []
+    t = text.lower()
+    for key, kws in mapping.items():
+        if any(re.search(r"\b" + re.escape(kw) + r"\b", t) for kw in kws):
+            res.append(key)
+    return sorted(set(res))
+
+
+def find_list(text, kws):
+    t = text.lower()
+    return sorted(set([kw for kw in kws if re.search(r"\b" + re.escape(kw) + r"\b", t)]))
+
+
+def legacy_scan(app, text):
+    return {
+        "cloud_provider": find_keys(text, app.CLOUD_KEYWORDS),
+        "deployment_targets": find_keys(text, app.DEPLOYMENT_TARGETS),
+        "databases": find_keys(text, app.DATABASES),
+        "storage": find_keys(text, app.STORAGE),
+        "networking": find_keys(text, app.NETWORKING),
+        "ci_cd": find_list(text, app.CI_CD),
+    }
+
+
+def compiled_scan(app, text):
+    return app.KEYWORDS.scan(text.lower())
+
+
+def synthetic_instruction(app, size, keyword_rate=0.002, seed=0):
+    rng = random.Random(seed)
+    vocab = ["deploy", "the", "service", "with", "and", "a", "to", "our", "users", "latency",
+             "team", "design", "should", "api", "backend", "we", "need"]
+    keywords = list(app.KEYWORDS.hits_by_kw)
+    words, length = [], 0
+    while length < size:
+        w = rng.choice(keywords) if rng.random() < keyword_rate else rng.choice(vocab)
+        words.append(w)
+        length += len(w) + 1
+    return " ".join(words)[:size]
+
+
+def throughput(fn, app, text, min_time):
+    n, start = 0, time.perf_counter()
+    while True:
+        fn(app, text)
+        n += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 100 * 1024])
+    parser.add_argument("--keyword-rate", type=float, default=0.002,
+                        help="fraction of words drawn from the keyword tables")
+    parser.add_argument("--min-time", type=float, default=1.0)
+    args = parser.parse_args()
+
+    app = load_app()
+    print("%10s %14s %14s %8s" % ("chars", "legacy req/s", "compiled req/s", "speedup"))
+    for size in args.sizes:
+        text = synthetic_instruction(app, size, args.keyword_rate)
+        assert legacy_scan(app, text) == compiled_scan(app, text)
+        legacy = throughput(legacy_scan, app, text, args.min_time)
+        compiled = throughput(compiled_scan, app, text, args.min_time)
+        print("%10d %14.1f %14.1f %7.1fx" % (size, legacy, compiled, compiled / legacy))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Cost of the instrumentation: per stage timing and per request, on and off.
+
+A stage is timed around an empty block, so the figure is the overhead
+alone; a request is a trivial FastAPI endpoint served through the
+in-process test client, with and without the metrics middleware.
+
+    python bench/metrics_overhead.py --stages 1000000 --requests 2000
+"""
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "services"))
+
+from shared import metrics
+
+
+def per_stage(n):
+    start = time.perf_counter()
+    for _ in range(n):
+        with metrics.stage("bench"):
+            pass
+    return (time.perf_counter() - start) / n
+
+
+def per_request(n, instrumented):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(metrics.ASGIMiddleware)
+
+    @app.get("/ping")
+    def ping():
+        return {}
+
+    with TestClient(app) as client:
+        for _ in range(100):
+            client.get("/ping")
+        start = time.perf_counter()
+        for _ in range(n):
+            client.get("/ping")
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    print("%-26s %12s" % ("", "us per call"))
+    for enabled in (False, True):
+        metrics.ENABLED = enabled
+        print("%-26s %12.3f" % ("stage, %s" % ("on" if enabled else "off"), per_stage(args.stages) * 1e6))
+    for instrumented in (False, True):
+        print("%-26s %12.1f" % ("request, %s" % ("on" if instrumented else "off"),
+                                per_request(args.requests, instrumented) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
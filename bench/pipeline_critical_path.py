@@ -0,0 +1,72 @@
+"""End-to-end latency of the service flow: one stage after another vs the stage graph.
+
+Every stage is replaced by a sleep of a typical service latency, so only
+the scheduling differs. Sequential runs the stages the way the orchestrator
+did (language, codebase, suggestion, containerize, terraform); the graph
+runs both contexts concurrently and containerizes speculatively while the
+suggestion is generated. Shown for a right and a wrong type prediction.
+
+    python bench/pipeline_critical_path.py --suggestion 6 --terraform 20
+"""
+import argparse, asyncio, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "services"))
+
+from shared.pipeline import Stage, StageGraph, needs_containerizing, predicted_right
+
+
+def sleeper(seconds, value=None):
+    async def run(results):
+        await asyncio.sleep(seconds)
+        return value
+    return run
+
+
+def stages(args, suggested_type):
+    codebase = {"containerization": {"dockerfile": False, "compose": False, "kubernetes": False}}
+    return (
+        Stage("language_context", sleeper(args.language)),
+        Stage("codebase_context", sleeper(args.codebase, codebase)),
+        Stage("suggestion", sleeper(args.suggestion, {"type": suggested_type}),
+              deps=("language_context", "codebase_context")),
+        Stage("containerize_predicted", sleeper(args.containerize), deps=("codebase_context",),
+              when=needs_containerizing, keep_if=("suggestion", predicted_right)),
+        Stage("containerize", sleeper(args.containerize), deps=("codebase_context", "suggestion"),
+              when=lambda r: needs_containerizing(r) and not predicted_right(r)),
+        Stage("terraform", sleeper(args.terraform), deps=("suggestion",)),
+    )
+
+
+async def sequential(args):
+    start = time.perf_counter()
+    for seconds in (args.language, args.codebase, args.suggestion, args.containerize, args.terraform):
+        await sleeper(seconds)({})
+    return time.perf_counter() - start
+
+
+async def graph(args, suggested_type):
+    result = await StageGraph(stages(args, suggested_type)).run({})
+    return result.elapsed, result.status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--language", type=float, default=2.0, help="seconds per stage")
+    parser.add_argument("--codebase", type=float, default=0.5)
+    parser.add_argument("--suggestion", type=float, default=6.0)
+    parser.add_argument("--containerize", type=float, default=1.0)
+    parser.add_argument("--terraform", type=float, default=8.0)
+    args = parser.parse_args()
+
+    critical = max(args.language, args.codebase) + args.suggestion + args.terraform
+    print("%-22s %10s" % ("schedule", "seconds"))
+    print("%-22s %10.2f" % ("sequential", asyncio.run(sequential(args))))
+    for label, suggested in (("graph, predicted", "single-docker"), ("graph, mispredicted", "multi-docker")):
+        elapsed, status = asyncio.run(graph(args, suggested))
+        print("%-22s %10.2f   containerize_predicted=%s containerize=%s" % (
+            label, elapsed, status["containerize_predicted"], status["containerize"]))
+    print("%-22s %10.2f" % ("critical path", critical))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Event-loop responsiveness of codebase-context while a huge repo is scanned.
+
+Posts one large synthetic repository (many big .env and compose files) to
+``/extract`` and, while it is being analyzed, keeps ``--concurrency``
+clients posting tiny repositories. Reports latency percentiles of the
+small requests with and without the large one in flight. Every upload is
+unique, so the result caches do not answer them.
+
+    uvicorn app:app --port 8001   # in src/services/codebase-context
+    python bench/scan_latency.py --url http://127.0.0.1:8001/extract
+"""
+import argparse, asyncio, io, statistics, time, zipfile
+
+import httpx
+
+
+def big_repo(files: int, kb: int) -> bytes:
+    line = b"SOME_VARIABLE_NAME=some-value-that-is-long-enough\n"
+    body = line * (kb * 1024 // len(line))
+    ports = b"    ports:\n      - 8080:80\n" * (kb * 1024 // 30)
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as z:
+        for i in range(files):
+            # Distinct contents, so the member cache cannot answer for them.
+            tag = b"# service %d\n" % i
+            z.writestr("svc%d/.env" % i, tag + body)
+            z.writestr("svc%d/docker-compose.yml" % i, tag + ports)
+    return stream.getvalue()
+
+
+def small_repo(n: int) -> bytes:
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as z:
+        z.writestr("app/main.py", "print(%d)\n" % n)
+        z.writestr(".env", "PORT=%d\n" % n)
+        z.writestr("requirements.txt", "fastapi\n")
+    return stream.getvalue()
+
+
+async def small_clients(client, url, concurrency, stop, latencies):
+    counter = iter(range(10 ** 9))
+
+    async def worker():
+        while not stop.is_set():
+            data = small_repo(next(counter) + int(time.time() * 1e6))
+            start = time.perf_counter()
+            r = await client.post(url, files={"repo_zip": ("r.zip", data, "application/zip")})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def percentiles(values):
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1e3
+    return "n=%5d  p50=%8.1f ms  p99=%8.1f ms  max=%8.1f ms" % (
+        len(values), statistics.median(values) * 1e3, pick(0.99), values[-1] * 1e3)
+
+
+async def run(args):
+    big = big_repo(args.files, args.kb)
+    async with httpx.AsyncClient(timeout=600) as client:
+        stop, idle = asyncio.Event(), []
+        task = asyncio.create_task(small_clients(client, args.url, args.concurrency, stop, idle))
+        await asyncio.sleep(args.idle_seconds)
+        stop.set()
+        await task
+
+        stop, busy = asyncio.Event(), []
+        task = asyncio.create_task(small_clients(client, args.url, args.concurrency, stop, busy))
+        start = time.perf_counter()
+        r = await client.post(args.url, files={"repo_zip": ("big.zip", big, "application/zip")})
+        big_seconds = time.perf_counter() - start
+        stop.set()
+        await task
+
+    print("large repo: %d files, %.1f MB compressed, analyzed in %.2f s (status %d)"
+          % (2 * args.files, len(big) / 1e6, big_seconds, r.status_code))
+    print("small requests, idle:     ", percentiles(idle))
+    print("small requests, during:   ", percentiles(busy))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8001/extract")
+    parser.add_argument("--files", type=int, default=200, help="services in the large repo")
+    parser.add_argument("--kb", type=int, default=256, help="size of each .env/compose file")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--idle-seconds", type=float, default=2.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
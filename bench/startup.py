@@ -0,0 +1,197 @@
+"""Startup benchmark: time to first request and per-worker memory, by way of serving.
+
+Each service is started the ways it can be deployed and timed from spawn
+to the first successful answer to a real request (model calls go to
+``stub_model``) and to ``/ready``. Once every worker has served requests,
+the proportional (PSS) and unique (USS) memory of each worker process is
+read from ``/proc`` (Linux): pages shared copy-on-write with the master
+count in PSS only partially, and in USS not at all. Under gunicorn the
+workers are then killed, and the time until a replacement answers the
+same request is taken as well: what a crashed or recycled worker costs.
+
+* ``uvicorn``: one uvicorn process, as the FastAPI services used to run;
+* ``gunicorn``: gunicorn workers that each import the app themselves;
+* ``preload``: gunicorn with ``shared.gunicorn_conf``, the app imported
+  and warmed once in the master and forked.
+
+    python bench/startup.py --workers 2 --runs 3 -o startup.json
+"""
+import argparse, json, os, signal, statistics, subprocess, sys, tempfile, time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_model, synth
+from suite import SERVICES, SUGGESTION, TERRAFORM_REPLY, free_port, meta, process_tree
+
+MODES = ("uvicorn", "gunicorn", "preload")
+
+
+class Target(NamedTuple):
+    name: str
+    asgi: bool
+    method: str
+    path: str
+    request: Dict[str, Any]  # httpx request arguments
+    env: Dict[str, str] = {}
+
+
+def targets(model_url: str, artifact_dir: str) -> List[Target]:
+    model = {"OPENAI_BASE_URL": model_url, "OPENAI_API_KEY": "stub", "LLM_CACHE_SIZE": "0"}
+    archive = synth.repo_zip(files=200, depth=3, languages={"python": 3, "javascript": 1}, seed=1)
+    upload = {"files": {"repo_zip": ("repo.zip", archive, "application/zip")}}
+    return [
+        Target("language-context", True, "POST", "/extract",
+               {"json": {"instruction": synth.instruction(30)}}),
+        Target("codebase-context", True, "POST", "/extract", upload, {"CODEBASE_CACHE_DIR": ""}),
+        Target("containerize-project", True, "POST", "/", dict(upload, data={"suggestion_type": "single-docker"}),
+               {"ARTIFACT_DIR": artifact_dir}),
+        Target("deployment-suggestion", True, "POST", "/suggest",
+               {"json": {"language_context": {"cloud_provider": ["aws"]}, "codebase_context": {"analyzed": True}}},
+               model),
+        Target("generate-terraform", False, "POST", "/terraform", {"json": {"suggestion": SUGGESTION}}, model),
+    ]
+
+
+def command(target: Target, mode: str, port: int, workers: int) -> List[str]:
+    if mode == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+                "--log-level", "warning"]
+    argv = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", "127.0.0.1:%d" % port,
+            "--log-level", "warning", "app:app"]
+    if mode == "preload":
+        argv[3:3] = ["-c", "python:shared.gunicorn_conf"]
+    argv[3:3] = ["-k", "uvicorn.workers.UvicornWorker"] if target.asgi else ["--threads", "8"]
+    return argv
+
+
+def memory_kb(pid: int) -> Optional[Dict[str, int]]:
+    """PSS and USS of one process, from ``smaps_rollup``."""
+    fields = {}
+    try:
+        with open("/proc/%d/smaps_rollup" % pid) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    return {"pss": fields.get("Pss", 0), "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)}
+
+
+def measure(target: Target, mode: str, workers: int, requests: int) -> Dict[str, Any]:
+    port = free_port()
+    url = "http://127.0.0.1:%d" % port
+    env = dict(os.environ, PYTHONPATH=SERVICES, **target.env)
+    log = tempfile.TemporaryFile()
+    start = time.perf_counter()
+    proc = subprocess.Popen(command(target, mode, port, workers), cwd=os.path.join(SERVICES, target.name),
+                            env=env, stdout=log, stderr=subprocess.STDOUT)
+    result: Dict[str, Any] = {}
+    try:
+        with httpx.Client(base_url=url, timeout=60) as client:
+            first = ready = None
+            while first is None or ready is None:
+                if proc.poll() is not None or time.perf_counter() - start > 120:
+                    log.seek(0)
+                    raise RuntimeError("%s (%s) did not start:\n%s" % (
+                        target.name, mode, log.read().decode(errors="replace")))
+                try:
+                    if first is None:
+                        sent = time.perf_counter()
+                        if client.request(target.method, target.path, **target.request).is_success:
+                            first = time.perf_counter()
+                            result["first_request_ms"] = round((first - start) * 1000, 1)
+                            result["first_latency_ms"] = round((first - sent) * 1000, 1)
+                    if ready is None and client.get("/ready").is_success:
+                        ready = time.perf_counter()
+                        result["ready_ms"] = round((ready - start) * 1000, 1)
+                except httpx.TransportError:
+                    time.sleep(0.01)
+
+            # Every worker serves requests (new connections spread across
+            # them) before memory is read.
+            for _ in range(requests):
+                with httpx.Client(base_url=url, timeout=60) as fresh:
+                    fresh.request(target.method, target.path, **target.request)
+        pids = process_tree(proc.pid)
+        worker_pids = pids[1:] if mode != "uvicorn" else pids[:1]
+        usage = [m for m in map(memory_kb, worker_pids) if m]
+        total = [m for m in map(memory_kb, pids) if m]
+        if usage:
+            result["worker_pss_mb"] = round(statistics.mean(m["pss"] for m in usage) / 1024, 1)
+            result["worker_uss_mb"] = round(statistics.mean(m["uss"] for m in usage) / 1024, 1)
+            result["total_pss_mb"] = round(sum(m["pss"] for m in total) / 1024, 1)
+            result["processes"] = len(total)
+
+        if mode != "uvicorn":
+            killed = time.perf_counter()
+            for pid in worker_pids:
+                os.kill(pid, signal.SIGKILL)
+            # The master keeps listening; requests wait for the new workers.
+            with httpx.Client(base_url=url, timeout=60) as client:
+                while not _succeeds(client, target):
+                    time.sleep(0.01)
+            result["respawn_ms"] = round((time.perf_counter() - killed) * 1000, 1)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+    return result
+
+
+def _succeeds(client: httpx.Client, target: Target) -> bool:
+    try:
+        return client.request(target.method, target.path, **target.request).is_success
+    except httpx.TransportError:
+        return False
+
+
+def median_of(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {key: statistics.median(r[key] for r in runs) for key in runs[0] if all(key in r for r in runs)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--runs", type=int, default=3, help="starts per service and mode; medians are reported")
+    parser.add_argument("--requests", type=int, default=20, help="requests served before memory is read")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--only", action="append", help="services whose name contains this")
+    args = parser.parse_args()
+
+    model = stub_model.serve(free_port(), TERRAFORM_REPLY, 0.01)
+    model_url = "http://127.0.0.1:%d/v1" % model.server_address[1]
+    results: Dict[str, Dict[str, Any]] = {}
+    print("%-24s %-9s %10s %10s %10s %10s %10s %10s %10s" % (
+        "", "", "first ms", "latency", "ready ms", "PSS/wkr", "USS/wkr", "PSS all", "respawn"))
+    try:
+        with tempfile.TemporaryDirectory() as artifact_dir:
+            for target in targets(model_url, artifact_dir):
+                if args.only and not any(o in target.name for o in args.only):
+                    continue
+                for mode in args.modes.split(","):
+                    if mode == "uvicorn" and not target.asgi:
+                        continue
+                    r = median_of([measure(target, mode, args.workers, args.requests) for _ in range(args.runs)])
+                    results.setdefault(target.name, {})[mode] = r
+                    print("%-24s %-9s %10.0f %10.1f %10.0f %10.1f %10.1f %10.1f %10s" % (
+                        target.name, mode, r.get("first_request_ms", 0), r.get("first_latency_ms", 0),
+                        r.get("ready_ms", 0), r.get("worker_pss_mb", 0), r.get("worker_uss_mb", 0),
+                        r.get("total_pss_mb", 0), "%.0f" % r["respawn_ms"] if "respawn_ms" in r else "-"))
+    finally:
+        model.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta(args), "services": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Local stand-in for the OpenAI Responses API.
+
+Point a service at it with ``OPENAI_BASE_URL=http://127.0.0.1:8900/v1`` and
+any ``OPENAI_API_KEY``. Every ``POST /v1/responses`` sleeps for ``--delay``
+seconds and answers with ``--reply`` (or the contents of ``--reply-file``).
+Requests with ``"stream": true`` get the reply as server-sent
+``response.output_text.delta`` events of ``--chunk`` characters, with the
+delay spread evenly across them. ``GET /stats`` reports how many
+upstream calls were made.
+
+    python bench/stub_model.py --port 8900 --delay 2
+"""
+import argparse, json, threading, time, uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def response_body(text: str, model: str) -> dict:
+    return {
+        "id": "resp_" + uuid.uuid4().hex,
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [{
+            "type": "message",
+            "id": "msg_" + uuid.uuid4().hex,
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {"input_tokens": 0, "output_tokens": len(text.split()), "total_tokens": len(text.split())},
+    }
+
+
+class StubModel:
+    """Holds the canned reply and call counters shared by request handlers."""
+
+    def __init__(self, reply: str, delay: float, chunk: int = 64):
+        self.reply = reply
+        self.delay = delay
+        self.chunk = chunk
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    self._send(200, {"calls": stub.calls})
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.endswith("/responses"):
+                    self._send(404, {"error": "not found"})
+                    return
+                with stub.lock:
+                    stub.calls += 1
+                model = body.get("model", "stub")
+                if body.get("stream"):
+                    self._stream(model)
+                    return
+                time.sleep(stub.delay)
+                self._send(200, response_body(stub.reply, model))
+
+            def _stream(self, model: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                final = response_body(stub.reply, model)
+                pieces = [stub.reply[i:i + stub.chunk] for i in range(0, len(stub.reply), stub.chunk)] or [""]
+                events = [{"type": "response.created", "response": dict(final, status="in_progress", output=[])}]
+                events += [{"type": "response.output_text.delta", "item_id": final["output"][0]["id"],
+                            "output_index": 0, "content_index": 0, "delta": p} for p in pieces]
+                events.append({"type": "response.completed", "response": final})
+                for seq, event in enumerate(events):
+                    if event["type"] == "response.output_text.delta":
+                        time.sleep(stub.delay / len(pieces))
+                    event["sequence_number"] = seq
+                    data = ("event: %s\ndata: %s\n\n" % (event["type"], json.dumps(event))).encode()
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+class StubServer(ThreadingHTTPServer):
+    # The default backlog of 5 overflows under concurrent load, and the
+    # dropped connections retry after seconds, swamping the latencies.
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def serve(port: int, reply: str, delay: float, chunk: int = 64) -> ThreadingHTTPServer:
+    """Start the stub in a background thread and return the server."""
+    stub = StubModel(reply, delay, chunk)
+    server = StubServer(("127.0.0.1", port), stub.handler())
+    server.stub = stub
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--delay", type=float, default=1.0)
+    parser.add_argument("--reply", default='{"type": "single-docker"}')
+    parser.add_argument("--reply-file")
+    parser.add_argument("--chunk", type=int, default=64)
+    args = parser.parse_args()
+    reply = open(args.reply_file).read() if args.reply_file else args.reply
+    server = serve(args.port, reply, args.delay, args.chunk)
+    print("stub model listening on http://127.0.0.1:%d/v1" % args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""Load benchmark suite for the services, with a JSON report to compare across commits.
+
+Starts language-context, codebase-context and generate-terraform locally
+(the latter under gunicorn, as deployed, with the model replaced by
+``stub_model``), drives each scenario at a fixed concurrency and records
+throughput, latency percentiles and the peak resident memory of the
+service's processes. Inputs come from ``synth`` with fixed seeds, so two
+reports differ only by the code under test (and the machine).
+
+    python bench/suite.py -o before.json
+    python bench/suite.py -o after.json --compare before.json
+
+With ``--compare`` the scenarios present in both reports are listed side
+by side, and the exit status is 1 if any got slower, or used more memory,
+by more than ``--threshold``.
+"""
+import argparse, asyncio, datetime, json, os, platform, socket, subprocess, sys, tempfile, time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+SERVICES = os.path.join(ROOT, "src", "services")
+sys.path.insert(0, HERE)
+
+import stub_model, synth
+
+TERRAFORM_REPLY = json.dumps(dict((
+    ("provider.tf", 'provider "aws" {\n  region = var.region\n}\n'),
+    ("variables.tf", 'variable "region" {\n  type    = string\n  default = "us-east-1"\n}\n'),
+    ("main.tf", 'resource "aws_instance" "app" {\n  ami           = "ami-123"\n  instance_type = "t3.micro"\n}\n'),
+    ("outputs.tf", 'output "ip" {\n  value = aws_instance.app.public_ip\n}\n'),
+)))
+SUGGESTION = {"language": "python", "type": "single-docker", "cloud_provider": "aws"}
+
+
+class Service(NamedTuple):
+    name: str
+    command: Callable[[int], List[str]]  # port -> argv, run from the service's directory
+    env: Dict[str, str] = {}
+
+
+class Scenario(NamedTuple):
+    name: str
+    service: str
+    path: str
+    requests: int
+    concurrency: int
+    payload: Callable[[int], Dict[str, Any]]  # request number -> httpx request arguments
+
+
+def uvicorn(port):
+    return [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning"]
+
+
+def gunicorn(port):
+    return [sys.executable, "-m", "gunicorn", "-w", "2", "--threads", "8", "-b", "127.0.0.1:%d" % port,
+            "--timeout", "360", "--log-level", "warning", "app:app"]
+
+
+def services(model_url: str) -> Dict[str, Service]:
+    return {s.name: s for s in (
+        Service("language-context", uvicorn),
+        # Memory-only result cache, so earlier runs cannot answer for this one.
+        Service("codebase-context", uvicorn, {"CODEBASE_CACHE_DIR": ""}),
+        Service("generate-terraform", gunicorn,
+                {"OPENAI_BASE_URL": model_url, "OPENAI_API_KEY": "stub", "LLM_CACHE_SIZE": "0"}),
+    )}
+
+
+def scenarios(args) -> List[Scenario]:
+    n, c = args.requests, args.concurrency
+    small = synth.repo_zip(files=200, depth=3, languages={"python": 3, "javascript": 1}, env_files=2,
+                           compose_files=1, seed=1)
+    large = synth.repo_zip(files=args.large_files, depth=6,
+                           languages={"python": 2, "javascript": 2, "go": 1, "java": 1},
+                           env_files=50, compose_files=5, seed=2)
+    batch = "".join(json.dumps({"instruction": synth.instruction(40, seed=i)}) + "\n" for i in range(1000))
+
+    def upload(archive):
+        return {"files": {"repo_zip": ("repo.zip", archive, "application/zip")}}
+
+    return [
+        Scenario("language/extract-short", "language-context", "/extract", n, c,
+                 lambda i: {"json": {"instruction": synth.instruction(20, seed=i)}}),
+        Scenario("language/extract-long", "language-context", "/extract", n, c,
+                 lambda i: {"json": {"instruction": synth.instruction(2000, seed=i)}}),
+        Scenario("language/batch-1000", "language-context", "/extract/batch", max(1, n // 10), c,
+                 lambda i: {"content": batch, "headers": {"Content-Type": "application/x-ndjson"}}),
+        Scenario("codebase/extract-small", "codebase-context", "/extract", n, c,
+                 lambda i: upload(synth.with_nonce(small, str(i)))),
+        Scenario("codebase/extract-small-cached", "codebase-context", "/extract", n, c,
+                 lambda i: upload(small)),
+        Scenario("codebase/extract-large", "codebase-context", "/extract", max(1, n // 10), c,
+                 lambda i: upload(synth.with_nonce(large, str(i)))),
+        Scenario("terraform/buffered", "generate-terraform", "/terraform", n, c,
+                 lambda i: {"json": {"suggestion": dict(SUGGESTION, run=i)}}),
+        Scenario("terraform/stream", "generate-terraform", "/terraform?stream=1", n, c,
+                 lambda i: {"json": {"suggestion": dict(SUGGESTION, run=i)}}),
+    ]
+
+
+# --- Processes ---
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid: int) -> List[int]:
+    """``pid`` and its descendants, whichever of their threads started them (Linux)."""
+    pids, i = [pid], 0
+    while i < len(pids):
+        try:
+            tasks = os.listdir("/proc/%d/task" % pids[i])
+        except OSError:
+            tasks = []
+        for task in tasks:
+            try:
+                with open("/proc/%d/task/%s/children" % (pids[i], task)) as f:
+                    pids.extend(int(p) for p in f.read().split())
+            except OSError:
+                pass
+        i += 1
+    return pids
+
+
+def reset_peaks(pid: int) -> None:
+    """Restart the peak RSS counters of a process tree (Linux; a no-op elsewhere)."""
+    for p in process_tree(pid):
+        try:
+            with open("/proc/%d/clear_refs" % p, "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Sum of the peak RSS of every process in the tree since the last reset."""
+    total = None
+    for p in process_tree(pid):
+        try:
+            with open("/proc/%d/status" % p) as f:
+                kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+        except (OSError, StopIteration):
+            continue
+        total = (total or 0) + kb / 1024
+    return total
+
+
+class Running:
+    """A service started on a free port; stopped on exit."""
+
+    def __init__(self, service: Service):
+        self.service = service
+        self.port = free_port()
+        self.log = tempfile.TemporaryFile()
+        env = dict(os.environ, PYTHONPATH=SERVICES, **service.env)
+        self.proc = subprocess.Popen(service.command(self.port), cwd=os.path.join(SERVICES, service.name),
+                                     env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        self.url = "http://127.0.0.1:%d" % self.port
+
+    def wait_ready(self, timeout: float = 60) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                break
+            try:
+                if httpx.get(self.url + "/", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.log.seek(0)
+        raise RuntimeError("%s did not start:\n%s" % (self.service.name, self.log.read().decode(errors="replace")))
+
+    def __enter__(self):
+        self.wait_ready()
+        return self
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.log.close()
+
+
+# --- Load ---
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+async def drive(url: str, scenario: Scenario, payloads: List[Dict[str, Any]], warmup: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=scenario.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=600, limits=limits) as client:
+
+        async def worker(queue, record):
+            for kwargs in queue:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(scenario.path, **kwargs)
+                    await response.aread()
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if record:
+                    latencies.append(time.perf_counter() - start)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        # The warm-up runs at full concurrency too, so every worker process
+        # and thread of the service has served a request before timing starts.
+        for record, batch in ((False, payloads[:warmup]), (True, payloads[warmup:])):
+            queue = iter(batch)
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(queue, record) for _ in range(scenario.concurrency)))
+            elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    ok = sum(n for status, n in statuses.items() if status.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "concurrency": scenario.concurrency,
+        "statuses": statuses,
+        "errors": len(latencies) - ok,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else None,
+        "latency_ms": {name: round(value * 1000, 2) for name, value in (
+            ("mean", sum(ordered) / len(ordered)), ("p50", percentile(ordered, 50)),
+            ("p90", percentile(ordered, 90)), ("p99", percentile(ordered, 99)), ("max", ordered[-1]))},
+    }
+
+
+def run_suite(args) -> Dict[str, Any]:
+    model = stub_model.serve(free_port(), TERRAFORM_REPLY, args.model_delay)
+    model_url = "http://127.0.0.1:%d/v1" % model.server_address[1]
+    selected = [s for s in scenarios(args) if not args.only or any(o in s.name for o in args.only)]
+    results: Dict[str, Any] = {}
+    try:
+        for name, service in services(model_url).items():
+            todo = [s for s in selected if s.service == name]
+            if not todo:
+                continue
+            with Running(service) as running:
+                for scenario in todo:
+                    warmup = min(args.warmup, scenario.requests)
+                    payloads = [scenario.payload(i) for i in range(scenario.requests + warmup)]
+                    reset_peaks(running.proc.pid)
+                    result = asyncio.run(drive(running.url, scenario, payloads, warmup))
+                    peak = peak_rss_mb(running.proc.pid)
+                    result["peak_rss_mb"] = round(peak, 1) if peak is not None else None
+                    results[scenario.name] = dict(service=name, **result)
+                    print("%-32s %8.1f req/s  p50 %8.1f ms  p99 %8.1f ms  %s MB  errors %d" % (
+                        scenario.name, result["throughput_rps"] or 0, result["latency_ms"]["p50"],
+                        result["latency_ms"]["p99"], result["peak_rss_mb"], result["errors"]))
+    finally:
+        model.shutdown()
+    return {"meta": meta(args), "scenarios": results}
+
+
+def meta(args) -> Dict[str, Any]:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        except OSError:
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+    }
+
+
+# --- Comparison ---
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> int:
+    """Print both reports side by side; the number of regressions beyond ``threshold``."""
+    regressions = 0
+    print("\n%-32s %22s %22s %22s" % ("vs " + (base["meta"].get("commit") or "?")[:10],
+                                       "req/s", "p99 ms", "peak MB"))
+    for name, after in new["scenarios"].items():
+        before = base["scenarios"].get(name)
+        if before is None:
+            continue
+        row, flags = [], []
+        for label, get, worse in (
+                ("req/s", lambda r: r["throughput_rps"], lambda b, a: a < b * (1 - threshold)),
+                ("p99", lambda r: r["latency_ms"]["p99"], lambda b, a: a > b * (1 + threshold)),
+                ("peak MB", lambda r: r["peak_rss_mb"], lambda b, a: a > b * (1 + threshold))):
+            b, a = get(before), get(after)
+            if not b or a is None:
+                row.append("%22s" % "-")
+                continue
+            row.append("%9.1f -> %9.1f" % (b, a) + (" !" if worse(b, a) else "  "))
+            if worse(b, a):
+                flags.append(label)
+        regressions += bool(flags)
+        print("%-32s %s" % (name, " ".join(row)))
+    print("%d regression(s) beyond %.0f%%" % (regressions, threshold * 100))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", default="bench-report.json")
+    parser.add_argument("--requests", type=int, default=200, help="per scenario (a tenth for heavy ones)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="requests sent before measuring")
+    parser.add_argument("--large-files", type=int, default=20000, help="files in the large repository")
+    parser.add_argument("--model-delay", type=float, default=0.05, help="seconds per stub model call")
+    parser.add_argument("--only", action="append", help="run scenarios whose name contains this")
+    parser.add_argument("--compare", help="earlier report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    report = run_suite(args)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("wrote", args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            sys.exit(1 if compare(json.load(f), report, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
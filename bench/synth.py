@@ -0,0 +1,119 @@
+"""Synthetic inputs for the benchmarks: repository archives and instructions.
+
+Repositories are shaped by file count, directory depth, language mix and
+the number of ``.env`` and compose files; instructions by length in
+words. Output depends only on the arguments and the seed, so runs on
+different commits see the same inputs.
+
+    python bench/synth.py repo.zip --files 5000 --depth 4 --languages python=3,javascript=1 --env 10 --compose 2
+"""
+import argparse, io, random, zipfile
+from typing import Dict, List, Optional
+
+# language -> (source extension, manifest at the root, manifest contents, source line)
+LANGUAGES = {
+    "python": (".py", "requirements.txt", "fastapi\nuvicorn\nrequests\n", "import os\nprint(os.environ.get('PORT'))\n"),
+    "javascript": (".js", "package.json", '{"name": "app", "dependencies": {"express": "^4"}}\n',
+                   "const port = process.env.PORT || 3000;\n"),
+    "typescript": (".ts", "package.json", '{"name": "app", "dependencies": {"next": "^14"}}\n',
+                   "export const port: number = Number(process.env.PORT);\n"),
+    "go": (".go", "go.mod", "module example.com/app\n\ngo 1.21\n", "package main\n\nfunc main() {}\n"),
+    "java": (".java", "pom.xml", "<project></project>\n", "class App { public static void main(String[] a) {} }\n"),
+    "ruby": (".rb", "Gemfile", "source 'https://rubygems.org'\ngem 'rails'\n", "puts ENV['PORT']\n"),
+}
+
+WORDS = ("service", "application", "database", "please", "traffic", "users", "team", "region",
+         "latency", "small", "simple", "secure", "the", "with", "and", "for", "our", "a")
+KEYWORDS = ("aws", "gcp", "azure", "kubernetes", "docker", "containers", "lambda", "postgres", "redis",
+            "s3", "cloudfront", "github actions", "us-east-1", "autoscaling", "high availability", "gdpr",
+            "low cost", "vpc", "route53", "ec2")
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """``python=3,javascript=1`` -> weights per language."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in LANGUAGES:
+            raise ValueError(f"unknown language {name!r}; choose from {', '.join(LANGUAGES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def repo_zip(files: int = 200, depth: int = 3, languages: Optional[Dict[str, float]] = None,
+             env_files: int = 1, compose_files: int = 1, file_bytes: int = 256,
+             seed: int = 0) -> bytes:
+    """A deflated archive of ``files`` source files spread over directories up to ``depth`` deep."""
+    rng = random.Random(seed)
+    mix = languages or {"python": 1.0}
+    names, weights = list(mix), list(mix.values())
+    dirs = [""]
+    for _ in range(max(1, files // 20)):
+        parts = ["d%d" % rng.randrange(8) for _ in range(rng.randint(1, max(1, depth)))]
+        dirs.append("/".join(parts) + "/")
+
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as z:
+        manifests = {}
+        for name in names:
+            _, manifest, contents, _ = LANGUAGES[name]
+            manifests.setdefault(manifest, contents)
+        for manifest, contents in manifests.items():
+            z.writestr(manifest, contents)
+        for i in range(files):
+            ext, _, _, line = LANGUAGES[rng.choices(names, weights)[0]]
+            body = ("# file %d\n" % i) + line * max(1, file_bytes // len(line))
+            z.writestr("%sf%d%s" % (rng.choice(dirs), i, ext), body)
+        for i in range(env_files):
+            prefix = "" if i == 0 else "svc%d/" % i
+            z.writestr(prefix + ".env", "".join("VAR_%d_%d=value%d\n" % (i, k, k) for k in range(20))
+                       + "PORT=%d\n" % (8000 + i))
+        for i in range(compose_files):
+            prefix = "" if i == 0 else "stack%d/" % i
+            services = "".join("  s%d:\n    build: ./s%d\n    ports:\n      - \"%d:80\"\n" % (k, k, 9000 + k)
+                               for k in range(5))
+            z.writestr(prefix + "docker-compose.yml", "services:\n" + services)
+    return stream.getvalue()
+
+
+def with_nonce(archive: bytes, nonce: str) -> bytes:
+    """``archive`` plus a small member of its own, so content-addressed caches miss.
+
+    Appending rewrites only the central directory, which is much cheaper
+    than generating another repository.
+    """
+    stream = io.BytesIO(archive)
+    with zipfile.ZipFile(stream, "a") as z:
+        z.writestr(".bench-nonce", nonce)
+    return stream.getvalue()
+
+
+def instruction(words: int = 30, seed: int = 0) -> str:
+    """A deployment request of about ``words`` words, roughly one in five a keyword."""
+    rng = random.Random(seed)
+    out: List[str] = ["Deploy"]
+    while len(out) < words:
+        out.append(rng.choice(KEYWORDS) if rng.random() < 0.2 else rng.choice(WORDS))
+    return " ".join(out) + "."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--languages", default="python", help="weights, e.g. python=3,javascript=1")
+    parser.add_argument("--env", type=int, default=1, help=".env files")
+    parser.add_argument("--compose", type=int, default=1, help="compose files")
+    parser.add_argument("--file-bytes", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    data = repo_zip(args.files, args.depth, parse_mix(args.languages), args.env, args.compose,
+                    args.file_bytes, args.seed)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print("wrote %s: %d files, %.1f KB" % (args.output, args.files, len(data) / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Wall-clock of per-file Terraform generation: one file at a time vs the dependency scheduler.
+
+Runs generate-terraform's parallel mode against the local stub model, so
+every file costs ``--delay`` seconds. Serial time approaches the sum of
+all files; scheduled time approaches the longest dependency chain
+(main.tf -> outputs.tf).
+
+    python bench/terraform_parallel.py --delay 1
+"""
+import argparse, os, sys, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICES = os.path.join(HERE, "..", "src", "services")
+sys.path[:0] = [HERE, SERVICES, os.path.join(SERVICES, "generate-terraform")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8901)
+    args = parser.parse_args()
+
+    import stub_model
+    server = stub_model.serve(args.port, 'resource "null_resource" "x" {\n  triggers = { v = var.name }\n}\n', args.delay)
+    os.environ.update(OPENAI_BASE_URL="http://127.0.0.1:%d/v1" % args.port,
+                      OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "stub"), LLM_CACHE_SIZE="0")
+    import app
+
+    suggestion = {"cloud_provider": "aws", "type": "single-docker"}
+    print("%10s %10s %8s" % ("workers", "seconds", "calls"))
+    for workers in (1, len(app.FILE_TASKS)):
+        calls = server.stub.calls
+        client = app.openai.OpenAI()
+        start = time.perf_counter()
+        files = app.run_task_graph(
+            app.FILE_TASKS,
+            lambda task, deps: app.call_openai_for_file(client, task, suggestion, deps, use_cache=False),
+            max_workers=workers)
+        app.reconcile_variables(files)
+        print("%10d %10.2f %8d" % (workers, time.perf_counter() - start, server.stub.calls - calls))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@ import express from "express";
 import multer from "multer";
 import cors from "cors";
 import { sleep } from "bun";
-import JSZip from "jszip";
 
 const app = express();
 
@@ -216,35 +215,24 @@ async function generateTerraform(
     "❗ Sending suggestion to Terraform generation service ---------"
   );
 
-  // 1️⃣ Send suggestion to Terraform service
+  // Send the suggestion together with the original repo ZIP; the service
+  // returns the repo with the Terraform files merged in, without
+  // recompressing the repo's files.
+  const form = new FormData();
+  form.append("suggestion", JSON.stringify(suggestion));
+  form.append("repo_zip", new Blob([file.buffer]), file.originalname);
+
   const response = await fetch(`${process.env.GENERATE_TERRAFORM_URL}`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ suggestion }),
+    body: form,
   });
 
   if (!response.ok) {
     throw new Error(`Terraform service returned ${response.status}`);
   }
 
-  const terraformZipBuffer = Buffer.from(await response.arrayBuffer());
-
-  console.log("✅ Received Terraform ZIP ---------");
-
-  // 2️⃣ Load original repo ZIP and Terraform ZIP
-  const repoZip = await JSZip.loadAsync(file.buffer);
-  const tfZip = await JSZip.loadAsync(terraformZipBuffer);
-
-  // 3️⃣ Merge Terraform files into repo ZIP
-  tfZip.forEach((relativePath: any, fileEntry: any) => {
-    if (!fileEntry.dir) {
-      repoZip.file(relativePath, fileEntry.async("nodebuffer"));
-    }
-  });
-
-  // 4️⃣ Generate updated ZIP buffer
-  const updatedZipBuffer = await repoZip.generateAsync({ type: "nodebuffer" });
+  const bundledZipBuffer = Buffer.from(await response.arrayBuffer());
 
-  console.log("✅ Merged Terraform files into repo ZIP ---------");
-  return updatedZipBuffer;
+  console.log("✅ Received repo ZIP with Terraform files ---------");
+  return bundledZipBuffer;
 }
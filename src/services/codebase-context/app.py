@@ -1,183 +1,289 @@
-from fastapi import FastAPI, UploadFile, File
-from typing import Optional, Dict, List
-import tempfile, zipfile, os, re
-
-app = FastAPI(title="Codebase Context Extraction", version="0.3.0")
-
-# --- Helper Constants ---
-LANG_BY_EXT = {
-    ".py": "Python",
-    ".js": "JavaScript",
-    ".ts": "TypeScript",
-    ".java": "Java",
-    ".go": "Go",
-    ".rb": "Ruby",
-    ".php": "PHP",
-    ".rs": "Rust",
-    ".cpp": "C++",
-    ".c": "C",
-    ".cs": "C#",
-    ".html": "HTML",
-    ".css": "CSS",
-    ".sh": "Shell",
-    ".yml": "YAML",
-    ".yaml": "YAML",
-    ".json": "JSON",
-}
-
-PKG_MANAGERS = {
-    "package.json": "npm/yarn",
-    "requirements.txt": "pip",
-    "Pipfile": "pipenv",
-    "pyproject.toml": "poetry",
-    "Gemfile": "bundler",
-    "go.mod": "go modules",
-    "Cargo.toml": "cargo",
-    "pom.xml": "maven",
-    "build.gradle": "gradle",
-}
-
-CONTAINER_FILES = {
-    "Dockerfile": "dockerfile",
-    "docker-compose.yml": "compose",
-    "docker-compose.yaml": "compose",
-    "k8s.yaml": "kubernetes",
-    "k8s.yml": "kubernetes",
-}
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Response
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional, List, BinaryIO
+import io, zipfile, json, logging, os, tempfile, threading
+
+from cache import LRUCache, ResultCache, digest_stream, iter_json
+from detectors import DETECTORS, ContentScanner, FileSource
+from file_index import ZipIndex
+from incremental import Manifest, ManifestStore
+from shared import metrics, startup
+from shared.ingest import ZipGuard, ZipLimits, ZipRejected
+
+# Content scanning: files are read on a shared pool, with caps on how much
+# of one file and of one upload is read, and on how many files one upload
+# may have queued at once. Parsing holds the GIL, so a couple of threads
+# already give full throughput; more only add contention with the event loop.
+SCAN_MAX_FILE_BYTES = int(os.environ.get("CODEBASE_SCAN_FILE_BYTES", 1024 * 1024))
+SCAN_MAX_REQUEST_BYTES = int(os.environ.get("CODEBASE_SCAN_REQUEST_BYTES", 64 * 1024 * 1024))
+SCAN_WORKERS = int(os.environ.get("CODEBASE_SCAN_WORKERS", 2))
+SCAN_MAX_PENDING = int(os.environ.get("CODEBASE_SCAN_PENDING", 32))
+SCAN_POOL = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="scan")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start()
+    yield
+    SCAN_POOL.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="Codebase Context Extraction", version="0.3.0", lifespan=lifespan)
+metrics.instrument_fastapi(app)
+
+# Bump when detector output changes so stale on-disk results are not served.
+RESULT_CACHE_VERSION = "3"
+
+CACHE_TTL = float(os.environ.get("CODEBASE_CACHE_TTL", 24 * 3600))
+CACHE_DIR = os.environ.get("CODEBASE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "codebase-context-cache"))
+RESULT_CACHE = ResultCache(
+    max_entries=int(os.environ.get("CODEBASE_CACHE_SIZE", 256)),
+    ttl=CACHE_TTL,
+    directory=CACHE_DIR or None,
+    disk_max_entries=int(os.environ.get("CODEBASE_CACHE_DISK_SIZE", 4096)),
+)
+MEMBER_CACHE = LRUCache(int(os.environ.get("CODEBASE_MEMBER_CACHE_SIZE", 65536)), CACHE_TTL)
+# repo_id -> Manifest for /extract/incremental, in a SQLite database shared
+# by all workers (so a delta may land on any of them) that survives
+# restarts. With the path set empty, manifests are per process and a
+# delta can only follow an update served by the same worker.
+MANIFESTS = ManifestStore(
+    DETECTORS,
+    path=os.environ.get("CODEBASE_MANIFEST_DB_PATH",
+                        os.path.join(CACHE_DIR, "manifests.db") if CACHE_DIR else "") or None,
+    max_entries=int(os.environ.get("CODEBASE_MANIFEST_DISK_SIZE", 1024)),
+    memory_entries=int(os.environ.get("CODEBASE_MANIFEST_CACHE_SIZE", 64)),
+    ttl=CACHE_TTL,
+    version=RESULT_CACHE_VERSION,
+)
+# Caps on uploaded archives (ZIP_MAX_* variables), checked on the central
+# directory before anything is decompressed.
+ZIP_LIMITS = ZipLimits.from_env()
 
 # --- Helper Functions ---
 
-def scan_files(root_dir: str) -> List[str]:
-    """Recursively list all files in a directory."""
-    file_list = []
-    for dirpath, _, filenames in os.walk(root_dir):
-        for f in filenames:
-            file_list.append(os.path.join(dirpath, f))
-    return file_list
-
-def detect_languages(files_list: List[str]) -> Dict[str, int]:
-    """Count files by programming language based on extension."""
-    lang_count = {}
-    for f in files_list:
-        _, ext = os.path.splitext(f)
-        lang = LANG_BY_EXT.get(ext.lower())
-        if lang:
-            lang_count[lang] = lang_count.get(lang, 0) + 1
-    return lang_count
-
-def detect_pkg_managers(files_list: List[str]) -> List[str]:
-    """Detect package managers present in the repo."""
-    managers = []
-    for f in files_list:
-        name = os.path.basename(f)
-        if name in PKG_MANAGERS and PKG_MANAGERS[name] not in managers:
-            managers.append(PKG_MANAGERS[name])
-    return managers
-
-def detect_app_type(files_list: List[str]) -> List[str]:
-    """Rudimentary detection of app type."""
-    types = []
-    names = [os.path.basename(f).lower() for f in files_list]
-    if "manage.py" in names:
-        types.append("Django")
-    if "package.json" in names:
-        types.append("Node.js")
-    if "requirements.txt" in names or "pyproject.toml" in names:
-        types.append("Python")
-    if not types:
-        types.append("unspecified")
-    return types
-
-def detect_architecture(root_dir: str, files_list: List[str]) -> str:
-    """Rudimentary detection based on presence of certain folders."""
-    dirs = [d.lower() for d in os.listdir(root_dir) if os.path.isdir(os.path.join(root_dir, d))]
-    if "src" in dirs and "tests" in dirs:
-        return "standard multi-folder structure"
-    elif "app" in dirs:
-        return "single-app"
-    return "unspecified"
-
-def detect_containerization(files_list: List[str]) -> Dict[str, bool]:
-    """Detect presence of container-related files."""
-    result = {"dockerfile": False, "compose": False, "kubernetes": False}
-    names = [os.path.basename(f) for f in files_list]
-    for f in names:
-        if f in CONTAINER_FILES:
-            result[CONTAINER_FILES[f]] = True
-    return result
-
-def collect_env_vars(files_list: List[str]) -> Dict[str, List[str]]:
-    """Scan for .env files and collect variable names."""
-    env_vars = []
-    for f in files_list:
-        if os.path.basename(f) == ".env":
-            with open(f, "r", encoding="utf-8", errors="ignore") as file:
-                for line in file:
-                    if "=" in line and not line.strip().startswith("#"):
-                        key = line.split("=", 1)[0].strip()
-                        env_vars.append(key)
-    return {"variables": env_vars}
-
-def parse_network(files_list: List[str]) -> Dict[str, List[str]]:
-    """Detect ports in docker-compose files."""
-    ports = []
-    for f in files_list:
-        if os.path.basename(f) in ["docker-compose.yml", "docker-compose.yaml"]:
-            with open(f, "r", encoding="utf-8", errors="ignore") as file:
-                for line in file:
-                    match = re.search(r"(\d{2,5}):\d{2,5}", line)
-                    if match:
-                        ports.append(match.group(1))
-    return {"compose_ports": ports}
+def check_upload(upload: BinaryIO, guard: ZipGuard) -> None:
+    try:
+        guard.check_archive(upload)
+    except ZipRejected as e:
+        raise HTTPException(status_code=e.status, detail=e.to_dict())
+
+
+def open_index(upload: BinaryIO) -> ZipIndex:
+    """Index the admitted files of an upload; over-limit or unsafe archives are refused."""
+    try:
+        return ZipIndex.from_zip(upload, guard=ZipGuard(ZIP_LIMITS))
+    except ZipRejected as e:
+        raise HTTPException(status_code=e.status, detail=e.to_dict())
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="repo_zip is not a valid ZIP archive")
+
+
+class ZipSource(FileSource):
+    """Streams archive members to detectors, reusing per-member results.
+
+    Members are located through the archive's ``ZipIndex`` and decompressed
+    lazily while being read, so only the files a detector actually asks for
+    are ever inflated. Parsed values are cached by the member's CRC32 and
+    size from the central directory, so a file that is unchanged across
+    uploads is not read again.
+    """
+
+    def __init__(self, fp: BinaryIO, index: ZipIndex, member_cache: Optional[LRUCache] = None, **limits):
+        super().__init__(**limits)
+        self.fp = fp
+        self.index = index
+        self.member_cache = member_cache
+        self._lock = threading.Lock()
+        self._zip: Optional[zipfile.ZipFile] = None
+
+    def locate(self, path: str) -> int:
+        pos = self.index.find(path)
+        if pos is None:
+            raise KeyError(f"There is no item named {path!r} in the archive")
+        return pos
+
+    def size(self, path):
+        return self.index.file_size[self.locate(path)]
+
+    def read(self, path, limit):
+        # The read stops at ``limit`` decompressed bytes whatever the
+        # central directory claims.
+        try:
+            return self.index.read_member(self.fp, self.locate(path), limit, self._lock)
+        except NotImplementedError:
+            pass
+        # Rare compression methods and encryption are left to zipfile; its
+        # reads share the file, so they hold the lock throughout.
+        with self._lock:
+            if self._zip is None:
+                self._zip = zipfile.ZipFile(self.fp)
+            with self._zip.open(path) as f:
+                return f.read(limit)
+
+    def parse(self, detector, path, parser):
+        if self.member_cache is None:
+            return super().parse(detector, path, parser)
+        pos = self.locate(path)
+        key = (detector, self.index.file_crc[pos], self.index.file_size[pos])
+        values = self.member_cache.get(key)
+        if values is None:
+            text = self.text(path)
+            if text is None:
+                return []
+            values = parser(text)
+            self.member_cache.put(key, values)
+        return list(values)
+
+
+def analyze_upload(upload: BinaryIO) -> dict:
+    """Blocking part of ``/extract``: the response for an uploaded archive."""
+    # The upload is already spooled by Starlette (memory first, then a temp
+    # file). It is hashed in chunks, and a digest hit is answered without
+    # opening the archive at all; only its size and end record are checked
+    # first, so an oversized upload is not even hashed.
+    check_upload(upload, ZipGuard(ZIP_LIMITS))
+    with metrics.stage("hash"):
+        digest = RESULT_CACHE_VERSION + "-" + digest_stream(upload)
+    cached = RESULT_CACHE.get(digest)
+    if cached is not None:
+        return cached
+
+    # Otherwise the archive is read in place instead of being copied and
+    # extracted: the central directory is read into a compact index and only
+    # the members a detector opens are decompressed, as a stream.
+    with metrics.stage("zip_read"):
+        index = open_index(upload)
+    source = ZipSource(upload, index, MEMBER_CACHE, max_file_bytes=SCAN_MAX_FILE_BYTES,
+                       max_total_bytes=SCAN_MAX_REQUEST_BYTES)
+    # Detectors are routed once per distinct name in the index; the files
+    # content detectors matched are then read on the scan pool.
+    results = DETECTORS.run(index, source, ContentScanner(SCAN_POOL, SCAN_MAX_PENDING))
+    if source.budget.refused:
+        logging.warning("Content scan budget exhausted: %d files skipped", source.budget.refused)
+
+    response = {
+        "analyzed": True,
+        **results,
+        "file_count": len(index)
+    }
+    RESULT_CACHE.put(digest, response)
+    return response
+
+
+def extract_json(upload: BinaryIO) -> bytes:
+    # Encoded here too, in pieces: a large result would otherwise be
+    # serialized on the event loop, or hold the GIL while it is.
+    response = analyze_upload(upload)
+    with metrics.stage("encode_json"):
+        return "".join(iter_json(response)).encode()
+
+
+def analyze_incremental(repo_id: str, upload: Optional[BinaryIO], delta: bool, deleted: List[str]) -> bytes:
+    """Blocking part of ``/extract/incremental``: update the repo's manifest."""
+    with MANIFESTS.locked(repo_id):
+        return _update_manifest(repo_id, upload, delta, deleted)
+
+
+def _update_manifest(repo_id: str, upload: Optional[BinaryIO], delta: bool, deleted: List[str]) -> bytes:
+    manifest = MANIFESTS.get(repo_id)
+    if manifest is None:
+        if delta:
+            raise HTTPException(status_code=409, detail="No manifest for this repo_id; send the whole archive")
+        manifest = Manifest(DETECTORS)
+    if upload is None:
+        if not delta:
+            raise HTTPException(status_code=400, detail="repo_zip is required unless delta is set")
+        index, source = None, FileSource()
+    else:
+        with metrics.stage("zip_read"):
+            index = open_index(upload)
+        source = ZipSource(upload, index, MEMBER_CACHE, max_file_bytes=SCAN_MAX_FILE_BYTES,
+                           max_total_bytes=SCAN_MAX_REQUEST_BYTES)
+    with metrics.stage("manifest_update"):
+        results, stats = manifest.update(index, source, ContentScanner(SCAN_POOL, SCAN_MAX_PENDING),
+                                         delta, deleted)
+    if source.budget.refused:
+        logging.warning("Content scan budget exhausted: %d files skipped", source.budget.refused)
+    MANIFESTS.put(repo_id, manifest)
+
+    response = {
+        "analyzed": True,
+        **results,
+        "file_count": len(manifest),
+        "incremental": {"repo_id": repo_id, **stats._asdict()},
+    }
+    return "".join(iter_json(response)).encode()
+
+
+@startup.warmup("detectors")
+def warm_detectors():
+    """Build the routing tables and run every detector once, on a small archive."""
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as z:
+        z.writestr("Dockerfile", "FROM python:3.12\nEXPOSE 8000\n")
+        z.writestr("docker-compose.yml", 'services:\n  web:\n    ports:\n      - "8000:8000"\n')
+        z.writestr(".env", "PORT=8000\n")
+        z.writestr("requirements.txt", "fastapi\n")
+        z.writestr("package.json", "{}\n")
+        z.writestr("src/main.py", "")
+    index = ZipIndex.from_zip(stream)
+    DETECTORS.run(index, ZipSource(stream, index, None))
 
 
 # --- FastAPI Endpoints ---
 
 @app.get('/')
 async def index():
-    return {"message": "Codebase Context Extraction Service is running."}
+    return {
+        "message": "Codebase Context Extraction Service is running.",
+        "cache": {"results": RESULT_CACHE.stats(), "members": MEMBER_CACHE.stats(),
+                  "manifests": MANIFESTS.stats()},
+    }
+
+@app.get('/ready')
+async def get_ready():
+    status = startup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get('/metrics')
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.post("/extract")
 async def extract(repo_zip: Optional[UploadFile] = File(default=None)):
-    analyzed = False
-    files_list: List[str] = []
-    root_dir: Optional[str] = None
-
-    if repo_zip:
-        with tempfile.TemporaryDirectory() as td:
-            zip_path = os.path.join(td, "repo.zip")
-            with open(zip_path, "wb") as f:
-                f.write(await repo_zip.read())
-            with zipfile.ZipFile(zip_path) as z:
-                z.extractall(os.path.join(td, "repo"))
-            root_dir = os.path.join(td, "repo")
-            files_list = scan_files(root_dir)
-            analyzed = True
-
-            languages = detect_languages(files_list)
-            pkg_managers = detect_pkg_managers(files_list)
-            app_type = detect_app_type(files_list)
-            architecture = detect_architecture(root_dir, files_list)
-            containerization = detect_containerization(files_list)
-            env_vars = collect_env_vars(files_list)
-            network = parse_network(files_list)
-    else:
-        languages = {}
-        pkg_managers = []
-        app_type = ["unspecified"]
-        architecture = "unspecified"
-        containerization = {"dockerfile": False, "compose": False, "kubernetes": False}
-        env_vars = {"variables": []}
-        network = {"compose_ports": []}
+    if not repo_zip:
+        return {"analyzed": False, **DETECTORS.run([]), "file_count": 0}
 
-    return {
-        "analyzed": analyzed,
-        "languages": languages,
-        "package_managers": pkg_managers,
-        "application_type": app_type,
-        "architecture": architecture,
-        "containerization": containerization,
-        "env": env_vars,
-        "network": network,
-        "file_count": len(files_list)
-    }
+    # Hashing, reading the archive and scanning contents all block, so they
+    # run off the event loop and other requests keep being served meanwhile.
+    body = await run_in_threadpool(extract_json, repo_zip.file)
+    return Response(content=body, media_type="application/json")
+
+
+@app.post("/extract/incremental")
+async def extract_incremental(repo_id: str = Form(...),
+                              repo_zip: Optional[UploadFile] = File(default=None),
+                              delta: bool = Form(False),
+                              deleted: Optional[str] = Form(None)):
+    """Re-analyze a project already seen under ``repo_id``, redoing only what changed.
+
+    Send the whole archive, or set ``delta`` and send only the added and
+    changed files, with ``deleted`` as a JSON list of removed paths. The
+    response is that of ``/extract`` plus an ``incremental`` section.
+    """
+    if not repo_id or len(repo_id) > 200:
+        raise HTTPException(status_code=400, detail="repo_id must be 1-200 characters")
+    try:
+        deleted_paths = json.loads(deleted) if deleted else []
+    except ValueError:
+        deleted_paths = None
+    if not isinstance(deleted_paths, list) or not all(isinstance(p, str) for p in deleted_paths):
+        raise HTTPException(status_code=400, detail="deleted must be a JSON list of paths")
+
+    body = await run_in_threadpool(analyze_incremental, repo_id, repo_zip.file if repo_zip else None,
+                                   delta, deleted_paths)
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,196 @@
+"""Result caches for codebase-context.
+
+Two levels are kept:
+
+* ``ResultCache`` maps the digest of an uploaded archive to the full
+  ``/extract`` response, in memory and on disk, so a re-submitted ZIP is
+  answered without opening it.
+* ``LRUCache`` on its own is used as the member cache, mapping a member's
+  CRC32 and size (from the ZIP central directory) to what a content
+  detector parsed out of it, so near-identical archives skip re-reading
+  unchanged files.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, Optional
+import hashlib, json, os, tempfile, threading, time
+
+CHUNK_SIZE = 1024 * 1024
+JSON_SLICE = 4096
+
+
+def iter_json(value: Any, slice_size: int = JSON_SLICE) -> Iterator[str]:
+    """Encode ``value`` as compact JSON, in pieces.
+
+    ``json.dumps`` holds the GIL for a whole document; encoding long lists
+    a slice at a time lets other threads, such as the event loop, run in
+    between.
+    """
+    if isinstance(value, dict):
+        yield "{"
+        for i, (k, v) in enumerate(value.items()):
+            yield ("," if i else "") + _dumps(str(k)) + ":"
+            yield from iter_json(v, slice_size)
+        yield "}"
+    elif isinstance(value, list) and len(value) > slice_size:
+        yield "["
+        for i in range(0, len(value), slice_size):
+            yield ("," if i else "") + _dumps(value[i:i + slice_size])[1:-1]
+        yield "]"
+    else:
+        yield _dumps(value)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def digest_stream(stream, chunk_size: int = CHUNK_SIZE) -> str:
+    """SHA-256 of a binary stream, read in fixed-size chunks from its start."""
+    h = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+
+class LRUCache:
+    """Bounded in-memory LRU mapping with optional TTL, safe across threads."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl is not None and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._data)}
+
+
+class DiskCache:
+    """Directory of JSON documents named by key, bounded by count and age.
+
+    File modification times double as LRU and TTL clocks: a hit touches
+    the file, and eviction removes the oldest files first.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 4096, ttl: Optional[float] = None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> Any:
+        path = self._path(key)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.writelines(iter_json(value))
+            os.replace(tmp, self._path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for e in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+    def __len__(self) -> int:
+        try:
+            return sum(1 for e in os.scandir(self.directory) if e.name.endswith(".json"))
+        except OSError:
+            return 0
+
+
+class ResultCache:
+    """Archive digest -> JSON result, memory first, then disk."""
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = None,
+                 directory: Optional[str] = None, disk_max_entries: int = 4096):
+        self.memory = LRUCache(max_entries, ttl)
+        self.disk = DiskCache(directory, disk_max_entries, ttl) if directory else None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+        }
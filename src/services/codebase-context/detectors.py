@@ -0,0 +1,486 @@
+"""Single-pass detector engine for codebase-context.
+
+Each detector declares the basenames, extensions and top-level directory
+names it cares about. A registry turns those declarations into dict
+indexes once, and the dispatcher looks up each distinct basename and
+directory of the repository's ``FileIndex`` a single time, routing it
+only to the detectors that asked for it. Adding a detector therefore
+adds index entries, not another pass over the repo.
+
+Files whose contents matter are read afterwards, in a separate content
+stage: each is read whole (up to a byte cap) and parsed with compiled
+regexes over the buffer, optionally on a thread pool.
+"""
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type, Union
+import os, re, threading
+
+from file_index import FileIndex
+from shared import entrypoints, metrics
+
+# --- Helper Constants ---
+LANG_BY_EXT = {
+    ".py": "Python",
+    ".js": "JavaScript",
+    ".ts": "TypeScript",
+    ".java": "Java",
+    ".go": "Go",
+    ".rb": "Ruby",
+    ".php": "PHP",
+    ".rs": "Rust",
+    ".cpp": "C++",
+    ".c": "C",
+    ".cs": "C#",
+    ".html": "HTML",
+    ".css": "CSS",
+    ".sh": "Shell",
+    ".yml": "YAML",
+    ".yaml": "YAML",
+    ".json": "JSON",
+}
+
+PKG_MANAGERS = {
+    "package.json": "npm/yarn",
+    "requirements.txt": "pip",
+    "Pipfile": "pipenv",
+    "pyproject.toml": "poetry",
+    "Gemfile": "bundler",
+    "go.mod": "go modules",
+    "Cargo.toml": "cargo",
+    "pom.xml": "maven",
+    "build.gradle": "gradle",
+}
+
+CONTAINER_FILES = {
+    "Dockerfile": "dockerfile",
+    "docker-compose.yml": "compose",
+    "docker-compose.yaml": "compose",
+    "k8s.yaml": "kubernetes",
+    "k8s.yml": "kubernetes",
+}
+
+COMPOSE_FILES = ("docker-compose.yml", "docker-compose.yaml")
+
+# First "host:container" pair on each line.
+COMPOSE_PORT_RE = re.compile(r"^.*?(\d{2,5}):\d{2,5}", re.M)
+# Name left of the first "=" on each line that is not a comment.
+ENV_VAR_RE = re.compile(r"^(?![^\S\n]*#)([^=\n]*)=", re.M)
+
+
+def decode_text(data: bytes, truncated: bool = False) -> str:
+    """Decode like a text-mode read: UTF-8 ignoring errors, universal newlines.
+
+    A truncated buffer is cut back to its last complete line so a partial
+    line at the cap is not parsed.
+    """
+    text = data.decode("utf-8", "ignore")
+    if truncated:
+        text = text[:text.rfind("\n") + 1]
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+class ByteBudget:
+    """Bytes a single analysis may still read, shared by reader threads."""
+
+    def __init__(self, limit: Optional[int] = None):
+        self.remaining = limit
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    def take(self, n: int) -> bool:
+        if self.remaining is None:
+            return True
+        with self._lock:
+            if n > self.remaining:
+                self.refused += 1
+                return False
+            self.remaining -= n
+            return True
+
+
+class FileSource:
+    """Gives detectors access to file contents; this one reads from disk.
+
+    Each file is read in one piece, at most ``max_file_bytes`` of it, and
+    all reads together are charged against ``max_total_bytes``; a file that
+    no longer fits the budget is skipped. Content detectors go through
+    ``parse`` rather than ``read`` so that a source can answer from a cache
+    instead of reading the file again.
+    """
+
+    def __init__(self, max_file_bytes: Optional[int] = None, max_total_bytes: Optional[int] = None):
+        self.max_file_bytes = max_file_bytes
+        self.budget = ByteBudget(max_total_bytes)
+
+    def size(self, path: str) -> int:
+        return os.path.getsize(path)
+
+    def read(self, path: str, limit: int) -> bytes:
+        with open(path, "rb") as f:
+            return f.read(limit)
+
+    def text(self, path: str) -> Optional[str]:
+        """Contents of ``path`` within the byte caps, or None if over budget."""
+        size = self.size(path)
+        limit = size if self.max_file_bytes is None else min(size, self.max_file_bytes)
+        if not self.budget.take(limit):
+            return None
+        data = self.read(path, limit)
+        return decode_text(data, truncated=limit < size)
+
+    def parse(self, detector: str, path: str, parser: Callable[[str], List[str]]) -> List[str]:
+        text = self.text(path)
+        return parser(text) if text is not None else []
+
+
+class ContentScanner:
+    """Runs content detectors' parsers over their files.
+
+    With an ``executor`` the reads are spread over its threads, but no more
+    than ``max_pending`` files of one analysis are queued at a time, so a
+    huge repository cannot flood a pool that other requests share. Results
+    come back in submission order.
+    """
+
+    def __init__(self, executor: Optional[Executor] = None, max_pending: int = 32):
+        self.executor = executor
+        self.max_pending = max(1, max_pending)
+
+    def map(self, source: FileSource, jobs: Sequence[Tuple["ContentDetector", str]]) -> List[List[str]]:
+        if self.executor is None or len(jobs) < 2:
+            return [source.parse(d.name, path, d.parse_text) for d, path in jobs]
+        results: List[List[str]] = []
+        pending: deque = deque()
+        for d, path in jobs:
+            if len(pending) >= self.max_pending:
+                results.append(pending.popleft().result())
+            pending.append(self.executor.submit(source.parse, d.name, path, d.parse_text))
+        while pending:
+            results.append(pending.popleft().result())
+        return results
+
+
+# --- Detector Base ---
+
+class Detector:
+    """A stateful detector, instantiated once per analysis.
+
+    ``basenames`` match file names exactly, ``basenames_ci`` match them
+    case-insensitively (declare them lowercase), ``extensions`` match the
+    lowercased extension and ``dirnames`` match lowercased directory names
+    directly under the repository root. ``visit_count`` receives each key
+    that matched with the number of files behind it (``visit`` gets single
+    files); ``result`` returns the detector's output section and may read
+    the files it collected through ``source``.
+    """
+    name: str = ""
+    basenames: Iterable[str] = ()
+    basenames_ci: Iterable[str] = ()
+    extensions: Iterable[str] = ()
+    dirnames: Iterable[str] = ()
+
+    def visit(self, path: str, key: str) -> None:
+        raise NotImplementedError
+
+    def visit_count(self, key: str, count: int) -> None:
+        """Account for ``count`` matched files with ``key`` at once, paths unknown.
+
+        Visiting once is right for detectors that only record which keys
+        were seen; detectors that count files override it.
+        """
+        self.visit("", key)
+
+    def result(self, source: FileSource) -> Any:
+        raise NotImplementedError
+
+
+class ContentDetector(Detector):
+    """A detector that parses the contents of every file it matched.
+
+    Unlike other detectors it is visited once per file, with the path.
+    Subclasses implement ``parse_text`` for the decoded text of a single
+    file and ``combine`` for the concatenated values of all matched files.
+    ``parse_text`` may run on a worker thread and must not touch ``self``
+    beyond class attributes. The registry's content stage fills ``values``.
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self.values: List[str] = []
+
+    def visit(self, path, key):
+        self.paths.append(path)
+
+    def parse_text(self, text: str) -> List[str]:
+        raise NotImplementedError
+
+    def combine(self, values: List[str]) -> Any:
+        raise NotImplementedError
+
+    def result(self, source):
+        return self.combine(self.values)
+
+
+class DetectorRegistry:
+    """Ordered collection of detector classes and their routing indexes."""
+
+    def __init__(self, detectors: Iterable[Type[Detector]] = ()):
+        self._detectors: List[Type[Detector]] = list(detectors)
+        self._index: Optional[Tuple[Dict[str, Tuple[int, ...]], ...]] = None
+
+    @property
+    def detectors(self) -> List[Type[Detector]]:
+        return list(self._detectors)
+
+    def register(self, cls: Type[Detector]) -> Type[Detector]:
+        """Add a detector class; usable as a class decorator."""
+        self._detectors.append(cls)
+        self._index = None
+        return cls
+
+    def _build_index(self) -> Tuple[Dict[str, Tuple[int, ...]], ...]:
+        tables: Tuple[Dict[str, List[int]], ...] = ({}, {}, {}, {})
+        for i, cls in enumerate(self._detectors):
+            keys = (cls.basenames,
+                    [k.lower() for k in cls.basenames_ci],
+                    [k.lower() for k in cls.extensions],
+                    [k.lower() for k in cls.dirnames])
+            for table, table_keys in zip(tables, keys):
+                for k in table_keys:
+                    table.setdefault(k, []).append(i)
+        return tuple({k: tuple(v) for k, v in table.items()} for table in tables)
+
+    @property
+    def index(self) -> Tuple[Dict[str, Tuple[int, ...]], ...]:
+        if self._index is None:
+            self._index = self._build_index()
+        return self._index
+
+    def route(self, path: str) -> Tuple[Tuple[int, str], ...]:
+        """The ``(detector index, key)`` pairs a single ``path`` is routed to."""
+        by_name, by_name_ci, by_ext, by_dir = self.index
+        head, _, name = path.rpartition("/")
+        hits: List[Tuple[int, str]] = [(i, name) for i in by_name.get(name, ())]
+        lname = name.lower()
+        hits += [(i, lname) for i in by_name_ci.get(lname, ())]
+        ext = os.path.splitext(name)[1].lower()
+        hits += [(i, ext) for i in by_ext.get(ext, ())]
+        if head:
+            ltop = path.partition("/")[0].lower()
+            hits += [(i, ltop) for i in by_dir.get(ltop, ())]
+        return tuple(hits)
+
+    def run(self, files: Union[FileIndex, Iterable[str]], source: Optional[FileSource] = None,
+            scanner: Optional[ContentScanner] = None) -> Dict[str, Any]:
+        """Route the repository's files to interested detectors and collect results.
+
+        ``files`` is a ``FileIndex`` or paths relative to the repository
+        root, using ``/``. Routing is done once per distinct basename and
+        top-level directory, with the number of files behind each key;
+        only content detectors are visited per file, and the files they
+        matched are then parsed through ``scanner`` (serially by default).
+        """
+        index = files if isinstance(files, FileIndex) else FileIndex.from_paths(files)
+        source = source or FileSource()
+        detectors = [cls() for cls in self._detectors]
+        with metrics.stage("detect_route"):
+            self._route(index, detectors)
+
+        jobs = [(d, path) for d in detectors if isinstance(d, ContentDetector) for path in d.paths]
+        with metrics.stage("detect_scan"):
+            parsed = (scanner or ContentScanner()).map(source, jobs)
+        for (d, _), values in zip(jobs, parsed):
+            d.values.extend(values)
+        results = {}
+        for d in detectors:
+            with metrics.stage("detect_" + d.name):
+                results[d.name] = d.result(source)
+        return results
+
+    def _route(self, index: FileIndex, detectors: List[Detector]) -> None:
+        by_name, by_name_ci, by_ext, by_dir = self.index
+        per_file = [isinstance(d, ContentDetector) for d in detectors]
+        name_hits: Dict[int, List[Tuple[int, str]]] = {}
+        dir_hits: Dict[int, List[Tuple[int, str]]] = {}
+
+        name_counts, dir_counts = index.counts()
+        for name_id, count in enumerate(name_counts):
+            name = index.names[name_id]
+            for table, key in ((by_name, name), (by_name_ci, name.lower()),
+                               (by_ext, index.exts[index.name_ext[name_id]])):
+                for i in table.get(key, ()):
+                    if per_file[i]:
+                        name_hits.setdefault(name_id, []).append((i, key))
+                    else:
+                        detectors[i].visit_count(key, count)
+        if by_dir:
+            tops: Dict[int, int] = {}
+            for dir_id, count in enumerate(dir_counts):
+                if dir_id and count:
+                    top = index.dir_top[dir_id]
+                    tops[top] = tops.get(top, 0) + count
+            for top, count in tops.items():
+                ltop = index.segments[top].lower()
+                for i in by_dir.get(ltop, ()):
+                    if per_file[i]:
+                        dir_hits.setdefault(top, []).append((i, ltop))
+                    else:
+                        detectors[i].visit_count(ltop, count)
+
+        # Per-file visits, in file order, for the few files content detectors want.
+        visits = [(pos, hit) for name_id, positions in index.positions(set(name_hits)).items()
+                  for pos in positions for hit in name_hits[name_id]]
+        if dir_hits:
+            for pos, dir_id in enumerate(index.file_dir):
+                if dir_id:
+                    visits.extend((pos, hit) for hit in dir_hits.get(index.dir_top[dir_id], ()))
+        visits.sort(key=lambda visit: visit[0])
+        for pos, (i, key) in visits:
+            detectors[i].visit(index.path(pos), key)
+
+
+DETECTORS = DetectorRegistry()
+
+
+# --- Detectors ---
+
+@DETECTORS.register
+class LanguageDetector(Detector):
+    """Count files by programming language based on extension."""
+    name = "languages"
+    extensions = tuple(LANG_BY_EXT)
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    def visit(self, path, key):
+        lang = LANG_BY_EXT[key]
+        self.counts[lang] = self.counts.get(lang, 0) + 1
+
+    def visit_count(self, key, count):
+        lang = LANG_BY_EXT[key]
+        self.counts[lang] = self.counts.get(lang, 0) + count
+
+    def result(self, source):
+        return self.counts
+
+
+@DETECTORS.register
+class PackageManagerDetector(Detector):
+    """Detect package managers present in the repo."""
+    name = "package_managers"
+    basenames = tuple(PKG_MANAGERS)
+
+    def __init__(self):
+        self.managers: Dict[str, None] = {}
+
+    def visit(self, path, key):
+        self.managers.setdefault(PKG_MANAGERS[key])
+
+    def result(self, source):
+        return list(self.managers)
+
+
+@DETECTORS.register
+class AppTypeDetector(Detector):
+    """Rudimentary detection of app type."""
+    name = "application_type"
+    basenames_ci = ("manage.py", "package.json", "requirements.txt", "pyproject.toml")
+
+    def __init__(self):
+        self.seen = set()
+
+    def visit(self, path, key):
+        self.seen.add(key)
+
+    def result(self, source):
+        types = []
+        if "manage.py" in self.seen:
+            types.append("Django")
+        if "package.json" in self.seen:
+            types.append("Node.js")
+        if "requirements.txt" in self.seen or "pyproject.toml" in self.seen:
+            types.append("Python")
+        if not types:
+            types.append("unspecified")
+        return types
+
+
+@DETECTORS.register
+class ArchitectureDetector(Detector):
+    """Rudimentary detection based on presence of certain top-level folders."""
+    name = "architecture"
+    dirnames = ("src", "tests", "app")
+
+    def __init__(self):
+        self.dirs = set()
+
+    def visit(self, path, key):
+        self.dirs.add(key)
+
+    def result(self, source):
+        if "src" in self.dirs and "tests" in self.dirs:
+            return "standard multi-folder structure"
+        elif "app" in self.dirs:
+            return "single-app"
+        return "unspecified"
+
+
+@DETECTORS.register
+class ContainerizationDetector(Detector):
+    """Detect presence of container-related files."""
+    name = "containerization"
+    basenames = tuple(CONTAINER_FILES)
+
+    def __init__(self):
+        self.found = {"dockerfile": False, "compose": False, "kubernetes": False}
+
+    def visit(self, path, key):
+        self.found[CONTAINER_FILES[key]] = True
+
+    def result(self, source):
+        return self.found
+
+
+@DETECTORS.register
+class EnvVarsDetector(ContentDetector):
+    """Scan for .env files and collect variable names."""
+    name = "env"
+    basenames = (".env",)
+
+    def parse_text(self, text):
+        return [name.strip() for name in ENV_VAR_RE.findall(text)]
+
+    def combine(self, values):
+        return {"variables": values}
+
+
+@DETECTORS.register
+class NetworkDetector(ContentDetector):
+    """Detect ports in docker-compose files."""
+    name = "network"
+    basenames = COMPOSE_FILES
+
+    def parse_text(self, text):
+        return COMPOSE_PORT_RE.findall(text)
+
+    def combine(self, values):
+        return {"compose_ports": values}
+
+
+@DETECTORS.register
+class EntrypointDetector(ContentDetector):
+    """Find what starts the service, and the ports it binds, in likely entry files."""
+    name = "entrypoints"
+    basenames = entrypoints.CANDIDATE_NAMES
+
+    def parse_text(self, text):
+        finding = entrypoints.scan(text)
+        return ([finding.kind] if finding.kind else []) + [str(port) for port in finding.ports]
+
+    def combine(self, values):
+        kinds, ports = {}, {}
+        for value in values:
+            (ports if value.isdigit() else kinds).setdefault(value)
+        return {"kinds": list(kinds), "ports": list(ports)}
@@ -0,0 +1,323 @@
+"""Compact file index for codebase-context.
+
+A repository listing is held as a few integer arrays instead of one
+string (or ``ZipInfo``) per file: directory names and basenames are
+interned once into tables, every basename carries the ID of its
+lowercased extension, and each file is a row of integers. Detectors are
+routed per distinct basename and directory rather than per file, so
+building paths is left to the few files whose contents are read.
+
+``ZipIndex`` builds the index straight from an archive's central
+directory, read in chunks, without creating a ``ZipInfo`` per member.
+"""
+from array import array
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import os, struct, threading, zipfile, zlib
+
+from shared.ingest import ZipGuard
+
+CHUNK_SIZE = 1024 * 1024
+READ_SIZE = 64 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+
+
+class FileIndex:
+    """Interned paths of a repository, one row of integers per file.
+
+    Paths are relative to the repository root and use ``/``. Directories
+    form a tree of interned segment names: directory 0 is the root, and
+    each other one is its parent's ID plus a segment ID, with the ID of its
+    top-level segment kept alongside. Segment 0 is the empty string.
+
+    The lookup tables used while adding files are dropped by ``freeze``;
+    ``from_paths`` and ``ZipIndex.from_zip`` return frozen indexes.
+    """
+    __slots__ = ("segments", "names", "exts", "name_ext", "dir_parent", "dir_segment", "dir_top",
+                 "file_dir", "file_name", "file_size", "file_crc",
+                 "_segment_ids", "_dir_ids", "_name_ids", "_ext_ids", "_found", "_last_dir", "_positions")
+
+    def __init__(self):
+        self.segments: List[str] = [""]
+        self.names: List[str] = []
+        self.exts: List[str] = []
+        self.name_ext = array("I")
+        self.dir_parent = array("I", [0])
+        self.dir_segment = array("I", [0])
+        self.dir_top = array("I", [0])
+        self.file_dir = array("I")
+        self.file_name = array("I")
+        self.file_size = array("Q")
+        self.file_crc = array("I")
+        self._segment_ids: Dict[str, int] = {"": 0}
+        # (parent << 32 | segment) -> directory ID
+        self._dir_ids: Optional[Dict[int, int]] = {}
+        self._name_ids: Optional[Dict[str, int]] = {}
+        self._ext_ids: Dict[str, int] = {}
+        self._found: Dict[str, Optional[int]] = {}
+        self._last_dir: Tuple[str, int] = ("", 0)
+        self._positions: Dict[int, List[int]] = {}
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str]) -> "FileIndex":
+        index = cls()
+        for path in paths:
+            index.add(path)
+        index.freeze()
+        return index
+
+    def freeze(self) -> None:
+        """Release the build-time lookup tables; no files can be added afterwards."""
+        self._dir_ids = self._name_ids = None
+        self._last_dir = ("", 0)
+
+    def add(self, path: str, size: int = 0, crc: int = 0) -> int:
+        """Append a file and return its position."""
+        if self._name_ids is None:
+            raise ValueError("the index is frozen")
+        head, _, name = path.rpartition("/")
+        # Archives list a directory's files together; skip the walk for them.
+        if head == self._last_dir[0]:
+            dir_id = self._last_dir[1]
+        else:
+            dir_id = self._intern_dir(head)
+            self._last_dir = (head, dir_id)
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+            ext = os.path.splitext(name)[1].lower()
+            ext_id = self._ext_ids.get(ext)
+            if ext_id is None:
+                ext_id = self._ext_ids[ext] = len(self.exts)
+                self.exts.append(ext)
+            self.name_ext.append(ext_id)
+        self.file_dir.append(dir_id)
+        self.file_name.append(name_id)
+        self.file_size.append(size)
+        self.file_crc.append(crc)
+        self._positions.clear()
+        return len(self.file_name) - 1
+
+    def _intern_dir(self, head: str) -> int:
+        dir_id = 0
+        for segment in head.split("/") if head else ():
+            seg_id = self._segment_ids.get(segment)
+            if seg_id is None:
+                seg_id = self._segment_ids[segment] = len(self.segments)
+                self.segments.append(segment)
+            key = dir_id << 32 | seg_id
+            child = self._dir_ids.get(key)
+            if child is None:
+                child = self._dir_ids[key] = len(self.dir_parent)
+                self.dir_parent.append(dir_id)
+                self.dir_segment.append(seg_id)
+                self.dir_top.append(self.dir_top[dir_id] if dir_id else seg_id)
+            dir_id = child
+        return dir_id
+
+    def __len__(self) -> int:
+        return len(self.file_name)
+
+    def dir_path(self, dir_id: int) -> str:
+        parts = []
+        while dir_id:
+            parts.append(self.segments[self.dir_segment[dir_id]])
+            dir_id = self.dir_parent[dir_id]
+        return "/".join(reversed(parts))
+
+    def path(self, pos: int) -> str:
+        head, name = self.dir_path(self.file_dir[pos]), self.names[self.file_name[pos]]
+        return head + "/" + name if head else name
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.path(pos) for pos in range(len(self)))
+
+    def counts(self) -> Tuple[array, array]:
+        """Number of files per basename ID and per directory ID."""
+        names, dirs = array("I", bytes(4 * len(self.names))), array("I", bytes(4 * len(self.dir_parent)))
+        for name_id, dir_id in zip(self.file_name, self.file_dir):
+            names[name_id] += 1
+            dirs[dir_id] += 1
+        return names, dirs
+
+    def positions(self, name_ids: Set[int]) -> Dict[int, List[int]]:
+        """Positions of the files with the given basename IDs, from one pass; cached."""
+        missing: Dict[int, List[int]] = {n: [] for n in name_ids if n not in self._positions}
+        if missing:
+            for pos, n in enumerate(self.file_name):
+                if n in missing:
+                    missing[n].append(pos)
+            # Published whole, so concurrent readers never see a partial list.
+            self._positions.update(missing)
+        return {n: self._positions[n] for n in name_ids}
+
+    def name_id(self, name: str) -> Optional[int]:
+        if self._name_ids is not None:
+            return self._name_ids.get(name)
+        # Frozen: a scan of the table, remembered per name. Only files whose
+        # contents are read are looked up, and those share a few names.
+        if name not in self._found:
+            try:
+                self._found[name] = self.names.index(name)
+            except ValueError:
+                self._found[name] = None
+        return self._found[name]
+
+    def find(self, path: str) -> Optional[int]:
+        """Position of ``path``; the last one if the name is repeated, as in zipfile."""
+        head, _, name = path.rpartition("/")
+        name_id = self.name_id(name)
+        if name_id is None:
+            return None
+        for pos in reversed(self.positions({name_id})[name_id]):
+            if self.dir_path(self.file_dir[pos]) == head:
+                return pos
+        return None
+
+
+class ZipIndex(FileIndex):
+    """A ``FileIndex`` of an archive's members, with where to find their data."""
+    __slots__ = ("file_offset", "file_csize", "file_method", "file_flags")
+
+    def __init__(self):
+        super().__init__()
+        self.file_offset = array("Q")
+        self.file_csize = array("Q")
+        self.file_method = array("H")
+        self.file_flags = array("H")
+
+    @classmethod
+    def from_zip(cls, fp: BinaryIO, chunk_size: int = CHUNK_SIZE, guard: Optional[ZipGuard] = None) -> "ZipIndex":
+        """Index the file members of the archive in ``fp``; raises ``zipfile.BadZipFile``.
+
+        With a ``guard``, the end record and then each entry are checked as
+        they are read (``ZipRejected`` on a violation), and only the entries
+        it admits are indexed.
+        """
+        if guard is not None:
+            guard.check_archive(fp)
+        endrec = zipfile._EndRecData(fp)
+        if not endrec:
+            raise zipfile.BadZipFile("File is not a zip file")
+        size_cd, offset_cd = endrec[zipfile._ECD_SIZE], endrec[zipfile._ECD_OFFSET]
+        # Bytes prepended to the archive (e.g. a self-extractor stub).
+        concat = endrec[zipfile._ECD_LOCATION] - size_cd - offset_cd
+        if endrec[zipfile._ECD_SIGNATURE] == zipfile.stringEndArchive64:
+            concat -= zipfile.sizeEndCentDir64 + zipfile.sizeEndCentDir64Locator
+        if concat < 0:
+            raise zipfile.BadZipFile("Bad offset for central directory")
+
+        index = cls()
+        fp.seek(offset_cd + concat)
+        for centdir, filename, extra in _central_directory(fp, size_cd, chunk_size):
+            flags = centdir[zipfile._CD_FLAG_BITS]
+            name = filename.decode("utf-8" if flags & 0x800 else "cp437")
+            name = name.split("\x00", 1)[0]
+            size, csize, offset = _zip64_sizes(centdir, extra)
+            if guard is not None and not guard.admit(name, size, csize):
+                continue
+            if name.endswith("/"):
+                continue
+            index.add(name, size, centdir[zipfile._CD_CRC])
+            index.file_offset.append(offset + concat)
+            index.file_csize.append(csize)
+            index.file_method.append(centdir[zipfile._CD_COMPRESS_TYPE])
+            index.file_flags.append(flags)
+        index.freeze()
+        return index
+
+    def read_member(self, fp: BinaryIO, pos: int, limit: int, lock: threading.Lock) -> bytes:
+        """Up to ``limit`` decompressed bytes of the member at ``pos``.
+
+        Handles stored and deflated members, which is nearly every archive;
+        others (and encrypted ones) raise NotImplementedError. ``lock``
+        guards ``fp``, which concurrent readers share.
+        """
+        method = self.file_method[pos]
+        if self.file_flags[pos] & 0x1 or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise NotImplementedError(f"compression method {method}")
+        offset = self.file_offset[pos]
+        with lock:
+            fp.seek(offset)
+            header = fp.read(zipfile.sizeFileHeader)
+        if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile("Bad magic number for file header")
+        fields = struct.unpack(zipfile.structFileHeader, header)
+        offset += (zipfile.sizeFileHeader + fields[zipfile._FH_FILENAME_LENGTH]
+                   + fields[zipfile._FH_EXTRA_FIELD_LENGTH])
+
+        decompressor = zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None
+        left, got, out = self.file_csize[pos], 0, []
+        while got < limit and left:
+            with lock:
+                fp.seek(offset)
+                chunk = fp.read(min(left, READ_SIZE))
+            if not chunk:
+                raise zipfile.BadZipFile("Truncated member data")
+            offset += len(chunk)
+            left -= len(chunk)
+            while chunk and got < limit:
+                if decompressor is None:
+                    piece, chunk = chunk[:limit - got], b""
+                else:
+                    # Never inflate more than was asked for, whatever the ratio.
+                    piece = decompressor.decompress(chunk, limit - got)
+                    chunk = decompressor.unconsumed_tail
+                out.append(piece)
+                got += len(piece)
+        data = b"".join(out)
+        if got == self.file_size[pos] <= limit and zlib.crc32(data) != self.file_crc[pos]:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for file {self.path(pos)!r}")
+        return data
+
+
+def _central_directory(fp: BinaryIO, size: int, chunk_size: int) -> Iterator[Tuple[tuple, bytes, bytes]]:
+    """Central directory records as ``(fields, filename, extra)``, read ``chunk_size`` at a time."""
+    buf, start, remaining = b"", 0, size
+
+    def fill(n: int) -> bool:
+        nonlocal buf, start, remaining
+        while len(buf) - start < n and remaining:
+            data = fp.read(min(remaining, max(chunk_size, n)))
+            if not data:
+                break
+            remaining -= len(data)
+            buf, start = buf[start:] + data, 0
+        return len(buf) - start >= n
+
+    unpack, fixed = struct.Struct(zipfile.structCentralDir).unpack_from, zipfile.sizeCentralDir
+    while len(buf) - start >= fixed or fill(fixed):
+        centdir = unpack(buf, start)
+        if centdir[zipfile._CD_SIGNATURE] != zipfile.stringCentralDir:
+            raise zipfile.BadZipFile("Bad magic number for central directory")
+        name_len = centdir[zipfile._CD_FILENAME_LENGTH]
+        extra_len = centdir[zipfile._CD_EXTRA_FIELD_LENGTH]
+        total = fixed + name_len + extra_len + centdir[zipfile._CD_COMMENT_LENGTH]
+        if len(buf) - start < total and not fill(total):
+            raise zipfile.BadZipFile("Truncated central directory")
+        name_start = start + fixed
+        yield (centdir, buf[name_start:name_start + name_len],
+               buf[name_start + name_len:name_start + name_len + extra_len])
+        start += total
+
+
+def _zip64_sizes(centdir: tuple, extra: bytes) -> Tuple[int, int, int]:
+    """``(file size, compressed size, header offset)``, taking ZIP64 extra fields into account."""
+    values = [centdir[zipfile._CD_UNCOMPRESSED_SIZE], centdir[zipfile._CD_COMPRESSED_SIZE],
+              centdir[zipfile._CD_LOCAL_HEADER_OFFSET]]
+    if ZIP64_LIMIT not in values:
+        return values[0], values[1], values[2]
+    pos = 0
+    while pos + 4 <= len(extra):
+        kind, length = struct.unpack_from("<HH", extra, pos)
+        if kind == 0x0001:
+            field = extra[pos + 4:pos + 4 + length]
+            for i in range(3):
+                if values[i] == ZIP64_LIMIT:
+                    if len(field) < 8:
+                        raise zipfile.BadZipFile("Corrupt ZIP64 extra field")
+                    values[i], = struct.unpack_from("<Q", field)
+                    field = field[8:]
+            break
+        pos += 4 + length
+    return values[0], values[1], values[2]
@@ -0,0 +1,298 @@
+"""Incremental re-analysis for codebase-context.
+
+A ``Manifest`` remembers, for one repository, every file's size and CRC32
+(from the ZIP central directory) and the detector keys it was routed to,
+and keeps each detector's aggregate as counts per key, plus the values
+parsed out of each file for content detectors. An update, with the whole
+new archive or with a delta archive of added and changed files plus the
+deleted paths, touches only the files that differ and recomputes only
+the detector sections they fed. With a delta its cost follows the size
+of the change, not the size of the repository.
+
+``ManifestStore`` keeps manifests in SQLite, so every worker process of
+the service continues from the same one.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+import fcntl, hashlib, json, os, sqlite3, threading, time
+
+from cache import LRUCache, iter_json
+from detectors import ContentDetector, ContentScanner, DetectorRegistry, FileSource
+from file_index import FileIndex
+
+Hits = Tuple[Tuple[int, str], ...]
+
+
+class UpdateStats(NamedTuple):
+    added: int
+    changed: int
+    removed: int
+    unchanged: int
+
+
+class Manifest:
+    """Per-file routing and per-detector aggregates of one repository.
+
+    Entries are ``path -> (size, crc, hits)``; identical ``hits`` tuples are
+    shared, so most files cost a path and a small tuple. A CRC of None
+    means the contents were not read (over the byte budget) and the file is
+    parsed again on the next update. Updates are serialized per manifest.
+    """
+
+    def __init__(self, registry: DetectorRegistry):
+        self.registry = registry
+        self.classes = registry.detectors
+        self.files: Dict[str, Tuple[int, Optional[int], Hits]] = {}
+        self.counts: List[Counter] = [Counter() for _ in self.classes]
+        # Content detectors only: path -> parsed values, in upload order.
+        self.values: List[Dict[str, List[str]]] = [{} for _ in self.classes]
+        self.parsers = {i: cls() for i, cls in enumerate(self.classes) if issubclass(cls, ContentDetector)}
+        self.sections: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+        self._dirty: Set[int] = set(range(len(self.classes)))
+        self._interned: Dict[Hits, Hits] = {}
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-compatible snapshot, for ``from_state``."""
+        with self.lock:
+            return {
+                "detectors": [cls.name for cls in self.classes],
+                "files": [[path, size, crc, hits] for path, (size, crc, hits) in self.files.items()],
+                "values": {str(i): self.values[i] for i in self.parsers},
+                "sections": {} if self._dirty else self.sections,
+            }
+
+    @classmethod
+    def from_state(cls, registry: DetectorRegistry, state: Dict[str, Any]) -> Optional["Manifest"]:
+        """Rebuild a manifest saved by ``to_state``; None if the detectors have changed since."""
+        manifest = cls(registry)
+        if state.get("detectors") != [c.name for c in manifest.classes]:
+            return None
+        for path, size, crc, hits in state["files"]:
+            hits = tuple((i, key) for i, key in hits)
+            hits = manifest._interned.setdefault(hits, hits)
+            manifest.files[path] = (size, crc, hits)
+            for i, key in hits:
+                manifest.counts[i][key] += 1
+        for i, values in state["values"].items():
+            manifest.values[int(i)] = values
+        if state["sections"]:
+            manifest.sections = state["sections"]
+            manifest._dirty.clear()
+        return manifest
+
+    def update(self, index: Optional[FileIndex], source: FileSource,
+               scanner: Optional[ContentScanner] = None, delta: bool = False,
+               deleted: Iterable[str] = ()) -> Tuple[Dict[str, Any], UpdateStats]:
+        """Apply an archive's index and return the detector sections with what changed.
+
+        Without ``delta`` the archive is the whole repository, and files it
+        no longer has are removed. With ``delta`` it holds only added and
+        changed files, and ``deleted`` lists the paths removed.
+        """
+        members = [(index.path(pos), index.file_size[pos], index.file_crc[pos])
+                   for pos in range(len(index))] if index is not None else []
+        with self.lock:
+            if delta:
+                gone = [path for path in deleted if path in self.files]
+            else:
+                present = {path for path, _, _ in members}
+                gone = [path for path in self.files if path not in present]
+            for path in gone:
+                self._remove(path)
+
+            added = changed = unchanged = 0
+            jobs: List[Tuple[int, str]] = []
+            for path, size, crc in members:
+                old = self.files.get(path)
+                if old is not None and old[0] == size and old[1] == crc:
+                    unchanged += 1
+                    continue
+                if old is None:
+                    hits = self._add(path)
+                    added += 1
+                else:
+                    # Routing depends on the path only: just the contents are redone.
+                    hits = old[2]
+                    changed += 1
+                self.files[path] = (size, crc, hits)
+                jobs.extend((i, path) for i, _ in hits if i in self.parsers)
+
+            self._parse(jobs, source, scanner or ContentScanner())
+            return self._sections(source), UpdateStats(added, changed, len(gone), unchanged)
+
+    def _add(self, path: str) -> Hits:
+        hits = self.registry.route(path)
+        hits = self._interned.setdefault(hits, hits)
+        for i, key in hits:
+            self.counts[i][key] += 1
+            self._dirty.add(i)
+        return hits
+
+    def _remove(self, path: str) -> None:
+        _, _, hits = self.files.pop(path)
+        for i, key in hits:
+            counts = self.counts[i]
+            counts[key] -= 1
+            if not counts[key]:
+                del counts[key]
+            self.values[i].pop(path, None)
+            self._dirty.add(i)
+
+    def _parse(self, jobs: List[Tuple[int, str]], source: FileSource, scanner: ContentScanner) -> None:
+        if not jobs:
+            return
+        refused = source.budget.refused
+        parsed = scanner.map(source, [(self.parsers[i], path) for i, path in jobs])
+        for (i, path), values in zip(jobs, parsed):
+            self.values[i][path] = values
+            self._dirty.add(i)
+        if source.budget.refused > refused:
+            # Which files were skipped is not known; read all of them next time.
+            for _, path in jobs:
+                size, _, hits = self.files[path]
+                self.files[path] = (size, None, hits)
+
+    def _sections(self, source: FileSource) -> Dict[str, Any]:
+        for i in sorted(self._dirty):
+            detector = self.classes[i]()
+            if i in self.parsers:
+                for values in self.values[i].values():
+                    detector.values.extend(values)
+            else:
+                for key, count in self.counts[i].items():
+                    detector.visit_count(key, count)
+            self.sections[detector.name] = detector.result(source)
+        self._dirty.clear()
+        return {cls.name: self.sections[cls.name] for cls in self.classes}
+
+
+class ManifestStore:
+    """repo_id -> ``Manifest``, shared by every worker process through SQLite.
+
+    Each manifest is one JSON row with a version number. A process keeps
+    the manifests it used last in memory and reloads one only when another
+    process has written a newer version. Updates of a repo_id run inside
+    ``locked``, which holds a thread lock and a POSIX record lock on one
+    byte of ``<path>.lock`` chosen by the repo_id's hash, so two updates of
+    the same repository never start from the same base. Without a path,
+    manifests live in this process's memory only.
+    """
+
+    STRIPES = 64
+
+    def __init__(self, registry: DetectorRegistry, path: Optional[str] = None, max_entries: int = 1024,
+                 memory_entries: int = 64, ttl: Optional[float] = None, version: str = ""):
+        self.registry = registry
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        # repo_id -> (row version, Manifest)
+        self.memory = LRUCache(memory_entries, None if path else ttl)
+        self._locks = [threading.Lock() for _ in range(self.STRIPES)]
+        self._path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lockfile: Optional[int] = None
+        self._pid = os.getpid()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = self._connect()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifests ("
+                "repo_id TEXT PRIMARY KEY, version INTEGER NOT NULL, updated REAL NOT NULL, state TEXT NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        self._lockfile = os.open(self._path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._pid = os.getpid()
+        return db
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        # Reopened in a worker forked from a preloaded master. Record locks
+        # are per process, so the lock file's descriptor is never closed
+        # while a process may hold one.
+        if self._conn is not None and self._pid != os.getpid():
+            self._conn = self._connect()
+        return self._conn
+
+    @contextmanager
+    def locked(self, repo_id: str) -> Iterator[None]:
+        """Serialize ``get`` and ``put`` of one repo_id across threads and processes.
+
+        If the block raises, this process's copy is dropped: the manifest
+        may have been changed half-way, and the stored row is reloaded.
+        """
+        h = int(hashlib.sha256(repo_id.encode("utf-8")).hexdigest()[:15], 16)
+        with self._locks[h % self.STRIPES]:
+            db = self._db
+            if db is not None:
+                fcntl.lockf(self._lockfile, fcntl.LOCK_EX, 1, h % (1 << 30))
+            try:
+                yield
+            except BaseException:
+                self.memory.pop(repo_id)
+                raise
+            finally:
+                if db is not None:
+                    fcntl.lockf(self._lockfile, fcntl.LOCK_UN, 1, h % (1 << 30))
+
+    def get(self, repo_id: str) -> Optional[Manifest]:
+        manifest = self._get(repo_id)
+        if manifest is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return manifest
+
+    def _get(self, repo_id: str) -> Optional[Manifest]:
+        cached = self.memory.get(repo_id)
+        db = self._db
+        if db is None:
+            return cached[1] if cached is not None else None
+        row = db.execute("SELECT version, updated FROM manifests WHERE repo_id = ?", (repo_id,)).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+            self.memory.pop(repo_id)
+            return None
+        if cached is not None and cached[0] == row[0]:
+            return cached[1]
+        (state,) = db.execute("SELECT state FROM manifests WHERE repo_id = ?", (repo_id,)).fetchone()
+        state = json.loads(state)
+        manifest = Manifest.from_state(self.registry, state) if state.get("version") == self.version else None
+        if manifest is not None:
+            self.memory.put(repo_id, (row[0], manifest))
+        return manifest
+
+    def put(self, repo_id: str, manifest: Manifest) -> None:
+        db = self._db
+        if db is None:
+            self.memory.put(repo_id, (0, manifest))
+            return
+        state = manifest.to_state()
+        state["version"] = self.version
+        now = time.time()
+        row = db.execute("SELECT version FROM manifests WHERE repo_id = ?", (repo_id,)).fetchone()
+        version = row[0] + 1 if row is not None else 1
+        db.execute("INSERT OR REPLACE INTO manifests VALUES (?, ?, ?, ?)",
+                   (repo_id, version, now, "".join(iter_json(state))))
+        self.memory.put(repo_id, (version, manifest))
+        count = db.execute("SELECT COUNT(*) FROM manifests").fetchone()[0]
+        if count > self.max_entries:
+            db.execute("DELETE FROM manifests WHERE repo_id IN "
+                       "(SELECT repo_id FROM manifests ORDER BY updated LIMIT ?)",
+                       (count - self.max_entries,))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+            "persistent": self._conn is not None,
+        }
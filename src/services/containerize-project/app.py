@@ -1,27 +1,156 @@
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from typing import Optional, Dict, Any
-import tempfile, zipfile, os, shutil, pathlib, yaml, io, uuid
-
-app = FastAPI(title="Containerize Project", version="0.1.0")
-
-def write_file(path, content):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w") as f:
-        f.write(content)
-
-def simple_dockerfile_for_language(lang_names):
-    # Very small heuristics for common languages
-    if not lang_names:
-        return "FROM alpine:3.18\nCMD [\"/bin/sh\"]\n"
-    primary = lang_names[0].lower()
-    if "python" in primary:
-        return "FROM python:3.12-slim\nWORKDIR /app\nCOPY . /app\nRUN pip install --no-cache-dir -r requirements.txt || true\nCMD [\"python\", \"main.py\"]\n"
-    if "node" in primary or "javascript" in primary or "typescript" in primary:
-        return "FROM node:20-alpine\nWORKDIR /app\nCOPY package*.json ./\nRUN npm install || true\nCOPY . .\nCMD [\"npm\", \"start\"]\n"
-    if "go" in primary:
-        return "FROM golang:1.21-alpine\nWORKDIR /app\nCOPY . .\nRUN go build -o app ./...\nCMD [\"/app/app\"]\n"
-    return "FROM alpine:3.18\nCOPY . /app\nCMD [\"/bin/sh\"]\n"
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, BinaryIO, List, Sequence, Tuple
+import logging, os, posixpath, uuid, zipfile, zlib
+
+import stacks, templates
+from shared import entrypoints, metrics, startup
+from shared.artifact import ArtifactBuilder
+from shared.ingest import ZipLimits, ZipRejected, open_zip
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start()
+    yield
+
+
+app = FastAPI(title="Containerize Project", version="0.1.0", lifespan=lifespan)
+metrics.instrument_fastapi(app)
+
+# Where finished artifacts are written so the user can download them.
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "/mnt/data")
+# Caps on uploaded archives (ZIP_MAX_* variables), checked on the central
+# directory before anything is decompressed.
+ZIP_LIMITS = ZipLimits.from_env()
+
+# Entry points and ports are found by reading a stack's likely entry
+# files: at most CONTAINERIZE_SCAN_FILES of them per upload, each up to
+# ENTRYPOINT_SCAN_FILE_BYTES. Findings are kept by a digest of the bytes
+# read, so a file seen in an earlier upload is not parsed again.
+SCAN_MAX_FILES = int(os.environ.get("CONTAINERIZE_SCAN_FILES", 64))
+FINDINGS = entrypoints.FindingCache(int(os.environ.get("CONTAINERIZE_SCAN_CACHE_SIZE", 4096)))
+
+def read_project(upload: BinaryIO) -> Tuple[List[str], List[stacks.Stack]]:
+    """Paths of the files in an uploaded archive and the stacks they make up.
+
+    Paths are relative to the project, without the directory an archive
+    often wraps it in. Stacks are detected from the central directory's
+    names; only their candidate entry files are then decompressed, to
+    be analyzed. Vendored trees are left out, and over-limit or unsafe
+    archives refused.
+    """
+    with metrics.stage("zip_read"):
+        try:
+            z, infos, _ = open_zip(upload, ZIP_LIMITS)
+        except ZipRejected as e:
+            raise HTTPException(status_code=e.status, detail=e.to_dict())
+    with z:
+        names = [info.filename for info in infos]
+        files = stacks.relative(names, stacks.project_root(names))
+        with metrics.stage("detect"):
+            found = stacks.detect(files)
+        with metrics.stage("analyze"):
+            candidates = {p: info for p, info in zip(files, infos) if p.rpartition("/")[2] in stacks.SOURCE_NAMES}
+            wanted = [p for stack in found for p in stacks.sources(stack, candidates)][:SCAN_MAX_FILES]
+            findings = {path: analyze_member(z, candidates[path]) for path in wanted}
+            found = [stacks.refine(stack, findings) for stack in found]
+    return files, found
+
+def analyze_member(z: zipfile.ZipFile, info: zipfile.ZipInfo) -> entrypoints.Finding:
+    limit = min(info.file_size, entrypoints.MAX_FILE_BYTES)
+    try:
+        with z.open(info) as f:
+            data = f.read(limit)
+    except (OSError, RuntimeError, NotImplementedError, zipfile.BadZipFile, zlib.error) as e:
+        logging.warning("Could not read %s for analysis: %s", info.filename, e)
+        data = b""
+    return FINDINGS.get(data, truncated=limit < info.file_size)
+
+def in_dir(path: str, name: str) -> str:
+    return posixpath.join(path, name) if path else name
+
+
+def add_dockerfile(artifacts: Dict[str, str], stack: stacks.Stack) -> None:
+    artifacts[in_dir(stack.path, "Dockerfile")] = templates.render_dockerfile(stack)
+    artifacts[in_dir(stack.path, ".dockerignore")] = templates.render_dockerignore(stack.language)
+
+
+def render_artifacts(suggestion_type: Optional[str], suggestion_text: Optional[str],
+                     found: Sequence[stacks.Stack], dockerfiles: Sequence[str]) -> Dict[str, str]:
+    """The files to generate for the requested deployment, from the detected stacks.
+
+    The project's main stack is the shallowest one; with none detected a
+    generic Dockerfile stands in for it.
+    """
+    artifacts: Dict[str, str] = {}
+    main = found[0] if found else stacks.Stack("", "unknown", "none", "", "", (8000,))
+    port = main.ports[0] if main.ports else 8000
+
+    if suggestion_type == "kubernetes-minikube" or (suggestion_text and "minikube" in suggestion_text.lower()):
+        deployment, service = templates.render_k8s("app", "app-image:latest", port)
+        artifacts["k8s/deployment.yaml"] = deployment
+        artifacts["k8s/service.yaml"] = service
+        if not dockerfiles:
+            add_dockerfile(artifacts, main)
+        artifacts["README.md"] = ("Use `minikube image build -t app-image:latest %s` and `kubectl apply -f k8s/` "
+                                  "to test locally.\n" % (main.path or "."))
+    elif suggestion_type == "multi-microservice":
+        services = []
+        if dockerfiles:
+            # Each Dockerfile's directory is a service; a Dockerfile at the
+            # root is named after the directory it used to be extracted to.
+            for df in dockerfiles:
+                reldir = posixpath.dirname(df)
+                name = stacks.service_name(reldir, (s.name for s in services), default="repo")
+                services.append(templates.ComposeService(name, reldir or ".", ()))
+        else:
+            # A Dockerfile per detected stack, each its own service.
+            for stack in found or [main]:
+                add_dockerfile(artifacts, stack)
+                name = stacks.service_name(stack.path, (s.name for s in services))
+                services.append(templates.ComposeService(name, stack.path or ".", stack.ports))
+        artifacts["docker-compose.yml"] = templates.render_compose(tuple(services))
+        artifacts["README.md"] = "docker-compose generated for multi-microservice local orchestration.\n"
+    else:
+        # single-container: a Dockerfile for the main stack, built from its directory
+        add_dockerfile(artifacts, main)
+        artifacts["docker-compose.yml"] = templates.render_compose(
+            (templates.ComposeService("app", main.path or ".", main.ports),))
+        artifacts["README.md"] = "Generated simple Dockerfile + docker-compose for single-container deployment.\n"
+    return artifacts
+
+def write_artifact(artifacts: Dict[str, str]) -> str:
+    """Path of a new ZIP of ``artifacts`` in ARTIFACT_DIR, where it is downloaded from.
+
+    Written from the in-memory strings and renamed into place once complete.
+    """
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    out_path = os.path.join(ARTIFACT_DIR, f"artifact_{uuid.uuid4().hex}.zip")
+    with metrics.stage("zip_assembly"):
+        with open(out_path + ".part", "wb") as f, ArtifactBuilder(f) as builder:
+            for name, content in artifacts.items():
+                builder.add(name, content)
+        os.replace(out_path + ".part", out_path)
+    return out_path
+
+@startup.warmup("templates")
+def warm_templates():
+    """Render every stack's Dockerfile once, so a broken template shows at startup."""
+    for language in stacks.LANGUAGES:
+        for manifest, manager in language.manifests:
+            templates.render_dockerfile(stacks.Stack("", language.name, manager, manifest, "", (language.port,)))
+
+@app.get("/ready")
+async def get_ready():
+    status = startup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.post("/")
 async def apply(suggestion_text: Optional[str] = Form(None),
@@ -30,114 +159,14 @@ async def apply(suggestion_text: Optional[str] = Form(None),
     if repo_zip is None:
         raise HTTPException(status_code=400, detail="repo_zip is required")
 
-    # Save and extract zip
-    tmpdir = tempfile.mkdtemp(prefix="repo_")
-    try:
-        zip_path = os.path.join(tmpdir, repo_zip.filename)
-        with open(zip_path, "wb") as f:
-            f.write(await repo_zip.read())
-        extract_dir = os.path.join(tmpdir, "repo")
-        os.makedirs(extract_dir, exist_ok=True)
-        with zipfile.ZipFile(zip_path) as z:
-            z.extractall(extract_dir)
-
-        # Inspect repo to decide actions
-        files = []
-        for base, _, fnames in os.walk(extract_dir):
-            for fn in fnames:
-                files.append(os.path.join(base, fn))
-
-        # detect existing dockerfiles
-        dockerfiles = [p for p in files if os.path.basename(p).lower() == "dockerfile"]
-        compose_files = [p for p in files if os.path.basename(p).lower() in ("docker-compose.yml","docker-compose.yaml","compose.yml","compose.yaml")]
-
-        # Default behavior: create artifacts in a new folder `generated_artifacts/`
-        gen_dir = os.path.join(tmpdir, "generated_artifacts")
-        os.makedirs(gen_dir, exist_ok=True)
-
-        # Create actions based on suggestion_type
-        if suggestion_type == "kubernetes-minikube" or (suggestion_text and "minikube" in suggestion_text.lower()):
-            # Create k8s manifests + Makefile
-            k8s_dir = os.path.join(gen_dir, "k8s")
-            os.makedirs(k8s_dir, exist_ok=True)
-            deployment_yaml = {
-                "apiVersion": "apps/v1",
-                "kind": "Deployment",
-                "metadata": {"name":"app-deployment"},
-                "spec": {
-                    "replicas": 1,
-                    "selector":{"matchLabels":{"app":"app"}},
-                    "template":{"metadata":{"labels":{"app":"app"}},
-                    "spec":{"containers":[{"name":"app","image":"app-image:latest","ports":[{"containerPort":8000}]}]}
-                    }
-                }
-            }
-            service_yaml = {
-                "apiVersion":"v1",
-                "kind":"Service",
-                "metadata":{"name":"app-service"},
-                "spec":{"selector":{"app":"app"},"ports":[{"protocol":"TCP","port":80,"targetPort":8000}],"type":"NodePort"}
-            }
-            write_file(os.path.join(k8s_dir,"deployment.yaml"), yaml.safe_dump(deployment_yaml))
-            write_file(os.path.join(k8s_dir,"service.yaml"), yaml.safe_dump(service_yaml))
-            write_file(os.path.join(gen_dir,"README.md"), "Use `minikube image build -t app-image:latest .` and `kubectl apply -f k8s/` to test locally.\n")
-        elif suggestion_type == "multi-microservice":
-            # If multiple Dockerfiles exist, create docker-compose listing them. Otherwise, try to create a Dockerfile per folder with obvious entry points.
-            comp = {"version":"3.9","services":{}}
-            if dockerfiles:
-                # Make each Dockerfile's directory a service
-                for df in dockerfiles:
-                    service_name = os.path.basename(os.path.dirname(df)) or "service"
-                    reldir = os.path.relpath(os.path.dirname(df), extract_dir)
-                    comp["services"][service_name] = {"build":{"context": "./" + reldir}, "ports":[]}
-                write_file(os.path.join(gen_dir,"docker-compose.yml"), yaml.safe_dump(comp))
-            else:
-                # attempt simple single service compose as fallback
-                comp["services"]["app"] = {"build":{"context":"./"}, "ports":["8000:8000"]}
-                write_file(os.path.join(gen_dir,"docker-compose.yml"), yaml.safe_dump(comp))
-            write_file(os.path.join(gen_dir,"README.md"), "docker-compose generated for multi-microservice local orchestration.\n")
-        else:
-            # single-container: ensure root Dockerfile exists in generated artifacts
-            # detect primary language from common files
-            lang = None
-            for p in files:
-                if p.endswith("requirements.txt"):
-                    lang = "python"
-                    break
-                if p.endswith("package.json"):
-                    lang = "node"
-                    break
-                if p.endswith("go.mod"):
-                    lang = "go"
-                    break
-            dockerfile_content = simple_dockerfile_for_language([lang] if lang else [])
-            write_file(os.path.join(gen_dir,"Dockerfile"), dockerfile_content)
-            compose = {
-                "version": "3.9",
-                "services": {
-                    "app": {
-                        "build": {"context": "./"},
-                        "ports": ["8000:8000"],
-                        "environment": ["ENV=production"]
-                    }
-                }
-            }
-            write_file(os.path.join(gen_dir,"docker-compose.yml"), yaml.safe_dump(compose))
-            write_file(os.path.join(gen_dir,"README.md"), "Generated simple Dockerfile + docker-compose for single-container deployment.\n")
-
-        # create zip artifact
-        artifact_path = os.path.join(tmpdir, f"artifact_{uuid.uuid4().hex}.zip")
-        with zipfile.ZipFile(artifact_path, "w", zipfile.ZIP_DEFLATED) as z:
-            for base, dirs, fnames in os.walk(gen_dir):
-                for fn in fnames:
-                    full = os.path.join(base, fn)
-                    rel = os.path.relpath(full, gen_dir)
-                    z.write(full, rel)
-
-        # return artifact as downloadable file path (we'll save to /mnt/data so user can download)
-        out_path = os.path.join("/mnt/data", os.path.basename(artifact_path))
-        shutil.copyfile(artifact_path, out_path)
-        return {"artifact_zip": out_path, "message":"artifact created"}
-    finally:
-        # don't delete tmpdir so the artifact remains available for debugging
-        pass
+    # Inspect repo to decide actions
+    files, found = await run_in_threadpool(read_project, repo_zip.file)
+    dockerfiles = [p for p in files if posixpath.basename(p).lower() == "dockerfile"]
+
+    # Generated artifacts, archive path -> content; rendered from templates.
+    with metrics.stage("render"):
+        artifacts = render_artifacts(suggestion_type, suggestion_text, found, dockerfiles)
+
+    out_path = await run_in_threadpool(write_artifact, artifacts)
+    return {"artifact_zip": out_path, "message":"artifact created",
+            "stacks": [stack._asdict() for stack in found]}
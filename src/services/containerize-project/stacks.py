@@ -0,0 +1,242 @@
+"""Stack detection from a repository's file names.
+
+A directory holding a known manifest (``requirements.txt``,
+``package.json``, ``go.mod``, ...) is a stack: its language, package
+manager, entry point and the ports it listens on are what the templates
+are rendered from. As in codebase-context, detection is table driven:
+each language lists the files that decide its package manager, in order
+of precedence (a lockfile beats the manifest it locks), and the file
+names that are likely entry points.
+
+Detection looks at names only. Each language also lists the source
+files worth reading; what static analysis finds in them
+(``shared.entrypoints``) then ``refine``s the stack: the file that
+really starts the service, how it is served and the ports it binds.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import fnmatch, posixpath
+
+from shared.entrypoints import NOTHING, Finding
+
+
+class Stack(NamedTuple):
+    path: str              # directory of the stack, relative to the project root ("" for the root)
+    language: str
+    package_manager: str
+    manifest: str          # the file that decided the package manager
+    entrypoint: str        # entry file or package relative to ``path``; "" to use the start script
+    ports: Tuple[int, ...]
+    server: str = ""       # "asgi"/"wsgi" to serve ``app`` from the entry module, "node" to run it; "" as a script
+    app: str = ""          # attribute of the entry module holding the ASGI/WSGI app
+
+
+class Language(NamedTuple):
+    name: str
+    # (file name, package manager), in order of precedence.
+    manifests: Tuple[Tuple[str, str], ...]
+    # Entry point candidates relative to the stack directory, in order of preference.
+    entrypoints: Tuple[str, ...]
+    port: int
+    # Files read for static analysis, relative to the stack directory (glob
+    # patterns), in order of preference for the entry point.
+    sources: Tuple[str, ...] = ()
+
+
+LANGUAGES: Tuple[Language, ...] = (
+    Language("python",
+             (("poetry.lock", "poetry"), ("uv.lock", "uv"), ("Pipfile.lock", "pipenv"), ("Pipfile", "pipenv"),
+              ("requirements.txt", "pip"), ("pyproject.toml", "pip"), ("setup.py", "pip")),
+             ("manage.py", "main.py", "app.py", "server.py", "run.py", "wsgi.py", "app/main.py", "src/main.py"),
+             8000,
+             ("main.py", "app.py", "server.py", "run.py", "wsgi.py", "asgi.py", "app/main.py", "src/main.py",
+              "src/app.py", "app/__init__.py")),
+    Language("node",
+             (("pnpm-lock.yaml", "pnpm"), ("yarn.lock", "yarn"), ("package-lock.json", "npm"), ("package.json", "npm")),
+             (), 3000,
+             ("package.json",) + tuple(d + base + ext for d in ("", "src/") for base in ("server", "index", "app", "main")
+                                       for ext in (".js", ".mjs", ".cjs", ".ts"))),
+    Language("go", (("go.mod", "go"),), (), 8080, ("main.go", "server.go", "cmd/*/main.go")),
+    Language("java", (("pom.xml", "maven"), ("build.gradle.kts", "gradle"), ("build.gradle", "gradle")), (), 8080),
+    Language("ruby", (("Gemfile.lock", "bundler"), ("Gemfile", "bundler")),
+             ("config/application.rb", "config.ru", "app.rb", "main.rb"), 3000),
+)
+
+# A project with no manifest anywhere is served as a static site from
+# the shallowest directory holding this.
+STATIC_INDEX = "index.html"
+STATIC_PORT = 80
+# Manifests under these directories belong to tooling, not to a service.
+IGNORED_DIRS = frozenset({"docs", "doc", "test", "tests", "example", "examples", "fixtures", "testdata"})
+
+_BY_NAME = {lang.name: lang for lang in LANGUAGES}
+# Base names of every language's sources: a file named otherwise is never analyzed.
+SOURCE_NAMES = frozenset(posixpath.basename(p) for lang in LANGUAGES for p in lang.sources)
+_BY_MANIFEST: Dict[str, Tuple[Language, int, str]] = {
+    name: (lang, rank, manager)
+    for lang in LANGUAGES for rank, (name, manager) in enumerate(lang.manifests)
+}
+# Manifests that only lock another one: they never start a stack of their own.
+_LOCKFILES = {"poetry.lock", "uv.lock", "Pipfile.lock", "pnpm-lock.yaml", "yarn.lock", "package-lock.json",
+              "Gemfile.lock"}
+
+
+def project_root(files: Sequence[str]) -> str:
+    """The directory every file is under when the archive wraps the project in one, else ""."""
+    first = None
+    for path in files:
+        head, sep, _ = path.partition("/")
+        if not sep or (first is not None and head != first):
+            return ""
+        first = head
+    return first + "/" if first else ""
+
+
+def relative(files: Iterable[str], root: str) -> List[str]:
+    return [p[len(root):] for p in files] if root else list(files)
+
+
+def detect(files: Sequence[str]) -> List[Stack]:
+    """Stacks found in ``files`` (paths relative to the project root), shallowest first."""
+    by_dir: Dict[str, Dict[str, None]] = {}
+    for path in files:
+        head, _, name = path.rpartition("/")
+        by_dir.setdefault(head, {})[name] = None
+
+    stacks = []
+    for directory, names in by_dir.items():
+        if directory and IGNORED_DIRS.intersection(directory.lower().split("/")):
+            continue
+        stack = _stack(directory, names, by_dir)
+        if stack is not None:
+            stacks.append(stack)
+    if not stacks:
+        stacks = [Stack(directory, "static", "none", STATIC_INDEX, STATIC_INDEX, (STATIC_PORT,))
+                  for directory, names in by_dir.items() if STATIC_INDEX in names]
+    stacks.sort(key=_depth)
+    return stacks[:1] if stacks and stacks[0].language == "static" else stacks
+
+
+def _depth(stack: Stack) -> Tuple[int, str]:
+    return stack.path.count("/") + bool(stack.path), stack.path
+
+
+def _stack(directory: str, names: Dict[str, None], by_dir: Dict[str, Dict[str, None]]) -> Optional[Stack]:
+    found = [_BY_MANIFEST[n] + (n,) for n in names if n in _BY_MANIFEST]
+    if not any(n not in _LOCKFILES for *_, n in found):
+        return None
+    # The language of the most specific manifest wins (a lockfile over its manifest).
+    lang, _, manager, manifest = min(found, key=lambda f: (LANGUAGES.index(f[0]), f[1]))
+    return Stack(directory, lang.name, manager, manifest, _entrypoint(lang, directory, names, by_dir), (lang.port,))
+
+
+def _entrypoint(lang: Language, directory: str, names: Dict[str, None],
+                by_dir: Dict[str, Dict[str, None]]) -> str:
+    prefix = directory + "/" if directory else ""
+    for candidate in lang.entrypoints:
+        head, _, name = candidate.rpartition("/")
+        if name in by_dir.get(prefix + head if head else directory, ()):
+            return candidate
+    if lang.name == "go":
+        # The package to build: the stack's own directory, or else a main
+        # package under cmd/, the usual layout for several binaries.
+        if "main.go" in names:
+            return "."
+        commands = sorted(d[len(prefix):] for d, files in by_dir.items()
+                          if d.startswith(prefix + "cmd/") and "main.go" in files)
+        return "./" + commands[0] if commands else "."
+    return ""
+
+
+def sources(stack: Stack, files: Iterable[str]) -> List[str]:
+    """Files of ``files`` to analyze for ``stack``, in the order of its language's ``sources``.
+
+    Pass only the files named in ``SOURCE_NAMES``, found in one pass, when
+    there are several stacks.
+    """
+    lang = _BY_NAME.get(stack.language)
+    if lang is None or not lang.sources:
+        return []
+    prefix = stack.path + "/" if stack.path else ""
+    ranked = []
+    for path in files:
+        if path.startswith(prefix):
+            rank = _source_rank(lang, path[len(prefix):])
+            if rank is not None:
+                ranked.append((rank, path))
+    ranked.sort()
+    return [path for _, path in ranked]
+
+
+def _source_rank(lang: Language, path: str) -> Optional[int]:
+    for rank, pattern in enumerate(lang.sources):
+        if path == pattern or ("*" in pattern and fnmatch.fnmatchcase(path, pattern)):
+            return rank
+    return None
+
+
+def refine(stack: Stack, findings: Dict[str, Finding]) -> Stack:
+    """``stack`` with the entry point and ports found in its sources.
+
+    ``findings`` maps paths relative to the project root, as listed by
+    ``sources``, to what static analysis found in them. Ports of the entry
+    file come first, then those of the other sources; the language's
+    default port is kept when none binds one.
+    """
+    lang = _BY_NAME.get(stack.language)
+    prefix = stack.path + "/" if stack.path else ""
+    found = [(path[len(prefix):], findings.get(path, NOTHING)) for path in sources(stack, findings)]
+    if lang is None or not found:
+        return stack
+
+    entry = _entry(stack, found)
+    ports: Dict[int, None] = {}
+    for path, finding in sorted(found, key=lambda f: f[0] != (entry[0] if entry else None)):
+        ports.update(dict.fromkeys(finding.ports))
+    stack = stack._replace(ports=tuple(ports) or stack.ports)
+    if entry is None:
+        return stack
+    path, finding = entry
+    if stack.language == "python":
+        server = finding.kind if finding.kind in ("asgi", "wsgi") else ""
+        return stack._replace(entrypoint=path, server=server, app=finding.app if server else "")
+    if stack.language == "node":
+        return stack._replace(entrypoint="", server="") if finding.kind == "script" else \
+            stack._replace(entrypoint=path, server="node")
+    if stack.language == "go":
+        head = posixpath.dirname(path)
+        return stack._replace(entrypoint="./" + head if head else ".")
+    return stack
+
+
+def _entry(stack: Stack, found: List[Tuple[str, Finding]]) -> Optional[Tuple[str, Finding]]:
+    """The source that starts ``stack``, or None to keep the one guessed from names."""
+    if stack.language == "python":
+        # Django is started through manage.py, whatever its modules hold.
+        if stack.entrypoint == "manage.py":
+            return None
+        kinds = ("main", "asgi", "wsgi")
+    elif stack.language == "node":
+        # A start script says how to start the project; otherwise the
+        # first plain JavaScript file that starts a server is run with node.
+        found = [f for f in found if f[0] == "package.json" or not f[0].endswith(".ts")]
+        kinds = ("script", "server")
+    else:
+        # Of several main packages, the one that binds a port is the service.
+        found = sorted(found, key=lambda f: not f[1].ports)
+        kinds = ("main",)
+    for kind in kinds:
+        for path, finding in found:
+            if finding.kind == kind:
+                return path, finding
+    return None
+
+
+def service_name(path: str, taken: Iterable[str] = (), default: str = "app") -> str:
+    """A compose/Kubernetes-safe name for a stack at ``path``, not in ``taken``."""
+    base = posixpath.basename(path.rstrip("/")).lower()
+    name = "".join(c if c.isascii() and c.isalnum() else "-" for c in base).strip("-") or default
+    taken = set(taken)
+    unique, n = name, 2
+    while unique in taken:
+        unique, n = "%s-%d" % (name, n), n + 1
+    return unique
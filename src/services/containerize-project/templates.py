@@ -0,0 +1,315 @@
+"""Dockerfile, compose and Kubernetes templates, rendered from detected stacks.
+
+Dockerfiles are looked up by ``(language, package manager, manifest)``,
+then ``(language, package manager)``, then language; the generic one
+covers the rest. Compose and Kubernetes files are the same few lines
+for every stack, parameterized by service names, build contexts and
+ports. Renders are memoized on their parameters, up to
+``CONTAINERIZE_TEMPLATE_CACHE_SIZE`` entries per kind: most uploads are
+one of a handful of common stacks, so most renders are cache hits.
+"""
+from functools import lru_cache
+from string import Template
+from typing import Dict, List, NamedTuple, Tuple
+import json, os
+
+from stacks import Stack
+
+TEMPLATE_CACHE_SIZE = int(os.environ.get("CONTAINERIZE_TEMPLATE_CACHE_SIZE", 1024))
+
+_PYTHON_RUN = """\
+COPY . .
+ENV PORT=${port}
+EXPOSE ${port}
+CMD ${cmd}
+"""
+
+_NODE_RUN = """\
+COPY . .
+ENV PORT=${port} NODE_ENV=production
+EXPOSE ${port}
+CMD ${cmd}
+"""
+
+DOCKERFILES: Dict[Tuple[str, ...], str] = {
+    ("python", "pip", "requirements.txt"): """\
+FROM python:3.12-slim
+WORKDIR /app
+COPY requirements.txt ./
+RUN pip install --no-cache-dir -r requirements.txt
+""" + _PYTHON_RUN,
+    # pyproject.toml or setup.py: the project installs itself.
+    ("python", "pip"): """\
+FROM python:3.12-slim
+WORKDIR /app
+COPY . .
+RUN pip install --no-cache-dir .
+ENV PORT=${port}
+EXPOSE ${port}
+CMD ${cmd}
+""",
+    ("python", "poetry"): """\
+FROM python:3.12-slim
+WORKDIR /app
+RUN pip install --no-cache-dir poetry && poetry config virtualenvs.create false
+COPY pyproject.toml poetry.lock ./
+RUN poetry install --no-root --only main --no-interaction
+""" + _PYTHON_RUN,
+    ("python", "uv"): """\
+FROM python:3.12-slim
+WORKDIR /app
+RUN pip install --no-cache-dir uv
+COPY pyproject.toml uv.lock ./
+RUN uv sync --frozen --no-dev --no-install-project
+ENV PATH="/app/.venv/bin:$$PATH"
+""" + _PYTHON_RUN,
+    ("python", "pipenv"): """\
+FROM python:3.12-slim
+WORKDIR /app
+RUN pip install --no-cache-dir pipenv
+COPY Pipfile Pipfile.lock* ./
+RUN pipenv install --system --deploy --ignore-pipfile || pipenv install --system
+""" + _PYTHON_RUN,
+    ("node", "npm", "package-lock.json"): """\
+FROM node:20-alpine
+WORKDIR /app
+COPY package.json package-lock.json ./
+RUN npm ci
+""" + _NODE_RUN,
+    ("node", "npm"): """\
+FROM node:20-alpine
+WORKDIR /app
+COPY package.json ./
+RUN npm install
+""" + _NODE_RUN,
+    ("node", "yarn"): """\
+FROM node:20-alpine
+WORKDIR /app
+RUN corepack enable
+COPY package.json yarn.lock ./
+RUN yarn install --frozen-lockfile
+""" + _NODE_RUN,
+    ("node", "pnpm"): """\
+FROM node:20-alpine
+WORKDIR /app
+RUN corepack enable
+COPY package.json pnpm-lock.yaml ./
+RUN pnpm install --frozen-lockfile
+""" + _NODE_RUN,
+    ("go",): """\
+FROM golang:1.22-alpine AS build
+WORKDIR /src
+COPY go.mod go.sum* ./
+RUN go mod download
+COPY . .
+RUN CGO_ENABLED=0 go build -o /out/app ${entry}
+
+FROM alpine:3.20
+COPY --from=build /out/app /app/app
+ENV PORT=${port}
+EXPOSE ${port}
+CMD ${cmd}
+""",
+    ("java", "maven"): """\
+FROM maven:3.9-eclipse-temurin-21 AS build
+WORKDIR /src
+COPY pom.xml ./
+RUN mvn -q -B dependency:go-offline
+COPY . .
+RUN mvn -q -B package -DskipTests \\
+ && cp "$$(ls target/*.jar | grep -v -e '-sources' -e '-plain' | head -n 1)" /app.jar
+
+FROM eclipse-temurin:21-jre
+COPY --from=build /app.jar /app/app.jar
+ENV PORT=${port}
+EXPOSE ${port}
+CMD ${cmd}
+""",
+    ("java", "gradle"): """\
+FROM gradle:8-jdk21 AS build
+WORKDIR /src
+COPY . .
+RUN gradle build -x test --no-daemon \\
+ && cp "$$(ls build/libs/*.jar | grep -v -e '-sources' -e '-plain' | head -n 1)" /app.jar
+
+FROM eclipse-temurin:21-jre
+COPY --from=build /app.jar /app/app.jar
+ENV PORT=${port}
+EXPOSE ${port}
+CMD ${cmd}
+""",
+    ("ruby",): """\
+FROM ruby:3.3-slim
+WORKDIR /app
+RUN apt-get update && apt-get install -y --no-install-recommends build-essential \\
+ && rm -rf /var/lib/apt/lists/*
+COPY Gemfile Gemfile.lock* ./
+RUN bundle install
+COPY . .
+ENV PORT=${port}
+EXPOSE ${port}
+CMD ${cmd}
+""",
+    ("static",): """\
+FROM nginx:1.27-alpine
+COPY . /usr/share/nginx/html
+EXPOSE ${port}
+""",
+    (): """\
+FROM alpine:3.20
+WORKDIR /app
+COPY . /app
+CMD ["/bin/sh"]
+""",
+}
+
+DOCKERIGNORE: Dict[str, str] = {
+    "python": "__pycache__/\n*.pyc\n.venv/\nvenv/\n.pytest_cache/\n",
+    "node": "node_modules/\nnpm-debug.log*\n.next/\ndist/\n",
+    "go": "bin/\n",
+    "java": "target/\nbuild/\n.gradle/\n",
+    "ruby": "vendor/bundle/\nlog/\ntmp/\n",
+}
+_DOCKERIGNORE_COMMON = ".git/\n.env\nDockerfile\n.dockerignore\n"
+
+COMPOSE_SERVICE = Template("""\
+  ${name}:
+    build:
+      context: ${context}
+${ports}    environment:
+      - ENV=production
+${env}""")
+
+K8S_DEPLOYMENT = Template("""\
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: ${name}-deployment
+spec:
+  replicas: 1
+  selector:
+    matchLabels:
+      app: ${name}
+  template:
+    metadata:
+      labels:
+        app: ${name}
+    spec:
+      containers:
+        - name: ${name}
+          image: ${image}
+          ports:
+            - containerPort: ${port}
+""")
+
+K8S_SERVICE = Template("""\
+apiVersion: v1
+kind: Service
+metadata:
+  name: ${name}-service
+spec:
+  type: NodePort
+  selector:
+    app: ${name}
+  ports:
+    - protocol: TCP
+      port: 80
+      targetPort: ${port}
+""")
+
+
+class ComposeService(NamedTuple):
+    name: str
+    context: str             # build context relative to the compose file, "." for its directory
+    ports: Tuple[int, ...]   # published as the same port on the host; none for an existing Dockerfile
+
+
+def command(stack: Stack) -> List[str]:
+    """The container's command for ``stack``."""
+    port = str(stack.ports[0]) if stack.ports else ""
+    if stack.language == "python":
+        if stack.entrypoint == "manage.py":
+            return ["python", "manage.py", "runserver", "0.0.0.0:" + port]
+        if stack.server == "asgi":
+            return ["uvicorn", _module(stack.entrypoint) + ":" + stack.app, "--host", "0.0.0.0", "--port", port]
+        if stack.server == "wsgi":
+            return ["flask", "--app", _module(stack.entrypoint) + ":" + stack.app,
+                    "run", "--host", "0.0.0.0", "--port", port]
+        return ["python", stack.entrypoint or "main.py"]
+    if stack.language == "node":
+        if stack.server == "node":
+            return ["node", stack.entrypoint]
+        return [stack.package_manager, "start"]
+    if stack.language == "go":
+        return ["/app/app"]
+    if stack.language == "java":
+        return ["java", "-jar", "/app/app.jar"]
+    if stack.language == "ruby":
+        if stack.entrypoint == "config.ru":
+            return ["bundle", "exec", "rackup", "--host", "0.0.0.0", "--port", port]
+        if stack.entrypoint == "config/application.rb":
+            return ["bundle", "exec", "rails", "server", "-b", "0.0.0.0", "-p", port]
+        return ["bundle", "exec", "ruby", stack.entrypoint or "app.rb"]
+    return []
+
+
+def _module(path: str) -> str:
+    """The dotted module name of a Python file: ``app/main.py`` -> ``app.main``."""
+    module = path[:-3].replace("/", ".") if path.endswith(".py") else path
+    return module[:-len(".__init__")] if module.endswith(".__init__") else module
+
+
+def dockerfile_template(stack: Stack) -> Tuple[str, ...]:
+    """The key of the Dockerfile template used for ``stack``."""
+    for key in ((stack.language, stack.package_manager, stack.manifest),
+                (stack.language, stack.package_manager), (stack.language,)):
+        if key in DOCKERFILES:
+            return key
+    return ()
+
+
+def render_dockerfile(stack: Stack) -> str:
+    # Where the stack sits does not change its Dockerfile.
+    return _render_dockerfile(stack._replace(path=""))
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _render_dockerfile(stack: Stack) -> str:
+    return Template(DOCKERFILES[dockerfile_template(stack)]).substitute(
+        port=stack.ports[0] if stack.ports else "",
+        cmd=json.dumps(command(stack)),
+        entry=stack.entrypoint or ".",
+    )
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def render_dockerignore(language: str) -> str:
+    return _DOCKERIGNORE_COMMON + DOCKERIGNORE.get(language, "")
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def render_compose(services: Tuple[ComposeService, ...]) -> str:
+    blocks = []
+    for s in services:
+        ports = "".join('      - "%d:%d"\n' % (p, p) for p in s.ports)
+        blocks.append(COMPOSE_SERVICE.substitute(
+            name=s.name,
+            # A JSON string is a valid YAML scalar, whatever the path holds.
+            context=json.dumps("./" + s.context if s.context != "." else "./"),
+            ports="    ports:\n" + ports if ports else "",
+            env="      - PORT=%d\n" % s.ports[0] if s.ports else "",
+        ))
+    return "services:\n" + "".join(blocks)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def render_k8s(name: str, image: str, port: int) -> Tuple[str, str]:
+    """Deployment and NodePort Service manifests for one container."""
+    params = dict(name=name, image=json.dumps(image), port=port)
+    return K8S_DEPLOYMENT.substitute(params), K8S_SERVICE.substitute(params)
+
+
+def cache_info() -> Dict[str, Dict[str, int]]:
+    return {name: func.cache_info()._asdict() for name, func in (
+        ("dockerfile", _render_dockerfile), ("dockerignore", render_dockerignore),
+        ("compose", render_compose), ("k8s", render_k8s))}
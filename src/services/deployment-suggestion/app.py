@@ -1,9 +1,20 @@
 import os
-from flask import Flask, request, jsonify, render_template
-import openai
-import logging
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 
-app = Flask(__name__)
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+
+from shared import metrics, startup
+from shared.jobs import JobQueue, QueueFull, format_sse
+from shared.llm_cache import LLMCache, bypass_requested, cache_key
+
+# Imported by the warm-up (before fork under gunicorn), not on startup.
+openai = startup.lazy_import("openai")
 
 openai_api_key = os.environ.get("OPENAI_API_KEY")
 if not openai_api_key:
@@ -14,42 +25,213 @@ if not openai_api_key:
     # You can also use python-dotenv for local development.
     pass
 
-openai.api_key = openai_api_key
+# Upstream calls allowed at once, and connections kept in the shared pool.
+MAX_CONCURRENCY = int(os.environ.get("SUGGESTION_MAX_CONCURRENCY", 16))
+HTTP_POOL_SIZE = int(os.environ.get("SUGGESTION_HTTP_POOL_SIZE", 64))
 
+_client: "Optional[openai.AsyncOpenAI]" = None
+_limiter = asyncio.Semaphore(MAX_CONCURRENCY)
+_inflight: Dict[str, "asyncio.Task[str]"] = {}
 
-@app.route('/')
-def index():
-    return jsonify({"message": "Deployment Suggestion Service is running."})
+LLM_CACHE = LLMCache.from_env()
 
+# Suggestion jobs: workers per process and how many may wait in the queue.
+JOB_WORKERS = int(os.environ.get("SUGGESTION_JOB_WORKERS", MAX_CONCURRENCY))
+JOB_QUEUE_SIZE = int(os.environ.get("SUGGESTION_JOB_QUEUE_SIZE", 256))
+JOBS = JobQueue.from_env()
 
-@app.route('/suggest', methods=['POST'])
-def generate_text():
-    """Handles the API call to OpenAI."""
 
-    data = request.json
+def get_client() -> "openai.AsyncOpenAI":
+    """The process-wide OpenAI client, sharing one HTTP connection pool.
+
+    Created in each worker, never before fork: its connections must not
+    be shared between processes.
+    """
+    global _client
+    if _client is None:
+        _client = openai.AsyncOpenAI(
+            api_key=openai_api_key,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=HTTP_POOL_SIZE,
+                                    max_keepalive_connections=HTTP_POOL_SIZE),
+                timeout=httpx.Timeout(600.0, connect=10.0),
+            ),
+        )
+    return _client
+
+
+@startup.warmup("openai")
+def warm_openai():
+    startup.warm_openai()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start()
+    if openai_api_key and startup.ready():
+        # openai was imported before fork; otherwise the first call creates the client.
+        get_client()
+    JOBS.start(asyncio.get_running_loop())
+    yield
+    JOBS.stop()
+    if _client is not None:
+        await _client.close()
+
+
+app = FastAPI(title="Deployment Suggestion", version="0.2.0", lifespan=lifespan)
+metrics.instrument_fastapi(app)
+
+
+async def single_flight(key: str, call: Callable[[], Awaitable[str]]) -> str:
+    """Run ``call`` once per ``key`` at a time; concurrent callers share its result.
+
+    The shared task is shielded so a caller that disconnects does not cancel
+    the upstream call for everyone else waiting on it.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(call())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def call_model(prompt: str) -> str:
+    async with _limiter:
+        start = time.perf_counter()
+        response = await get_client().responses.create(
+            model="gpt-5",
+            input=prompt,
+            reasoning={"effort": "minimal"},
+        )
+        metrics.observe_llm("gpt-5", "suggest", time.perf_counter() - start, response.usage)
+    return response.output_text
+
+
+async def call_and_cache(key: str, prompt: str) -> str:
+    output_text = await call_model(prompt)
+    await run_in_threadpool(LLM_CACHE.put, key, output_text)
+    return output_text
+
+
+def read_contexts(data) -> Optional[Tuple[dict, dict]]:
+    if not isinstance(data, dict):
+        return None
     language_context = data.get('language_context')
     codebase_context = data.get('codebase_context')
-
     if not language_context or not codebase_context:
-        return jsonify({'error': 'No prompt provided'}), 400
+        return None
+    return language_context, codebase_context
+
 
+async def suggest(language_context, codebase_context, use_cache: bool = True) -> str:
     prompt = f"JSON with keys 'language', 'type', 'architecture',\
         'is_containerized', 'env_variables', 'network_settings', \
         'cloud_provider', 'infrastructure', generate best deployment\
         strategy for the following programming language context:\
         {language_context} and codebase: {codebase_context}"
 
-    # Call the OpenAI Chat API
-    response = openai.OpenAI().responses.create(
-        model="gpt-5",
-        input=prompt,
-        reasoning={"effort": "minimal"},
-    )
+    # Repeated contexts are answered from the cache unless the client sends
+    # "Cache-Control: no-cache"; identical contexts in flight at the same
+    # time share one upstream call. The cache may be backed by SQLite, so it
+    # is read and written off the event loop.
+    key = cache_key("suggest", "gpt-5", language_context, codebase_context)
+    output_text = await run_in_threadpool(LLM_CACHE.get, key) if use_cache else None
+    if output_text is None:
+        output_text = await single_flight(key, lambda: call_and_cache(key, prompt))
+    return output_text
+
+
+@JOBS.stage("suggest", workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE)
+async def suggest_job(payload, job):
+    job.progress("generating suggestion")
+    return await suggest(payload["language_context"], payload["codebase_context"], payload["use_cache"])
+
+
+@app.get('/')
+async def index():
+    return {"message": "Deployment Suggestion Service is running.", "llm_cache": LLM_CACHE.stats(),
+            "jobs": JOBS.stats()}
+
+
+@app.get('/ready')
+async def get_ready():
+    status = startup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get('/metrics')
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.post('/suggest')
+async def generate_text(request: Request):
+    """Handles the API call to OpenAI."""
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    contexts = read_contexts(data)
+    if contexts is None:
+        return JSONResponse({'error': 'No prompt provided'}, status_code=400)
+
+    output_text = await suggest(*contexts, not bypass_requested(request.headers.get("cache-control")))
 
     # Extract the generated text
-    return response.output_text
+    return PlainTextResponse(output_text)
+
+
+# --- Job API ---
+# The same work as /suggest, without holding the connection: submit, then
+# poll /jobs/{id} or follow /jobs/{id}/events. The result is the
+# suggestion text.
+
+@app.post('/jobs', status_code=202)
+async def submit_job(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    contexts = read_contexts(data)
+    if contexts is None:
+        return JSONResponse({'error': 'No prompt provided'}, status_code=400)
+    payload = {"language_context": contexts[0], "codebase_context": contexts[1],
+               "use_cache": not bypass_requested(request.headers.get("cache-control"))}
+    try:
+        job = JOBS.submit("suggest", payload)
+    except QueueFull as e:
+        return JSONResponse({'error': str(e)}, status_code=429,
+                            headers={"Retry-After": str(e.retry_after)})
+    return JSONResponse(job, status_code=202, headers={"Location": f"/jobs/{job['id']}"})
+
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str, wait: float = 0):
+    """A job's status and, once finished, its result; ``wait`` long-polls up to that many seconds."""
+    if wait > 0:
+        job = await run_in_threadpool(JOBS.wait, job_id, min(wait, 60.0))
+    else:
+        job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse({'error': 'Unknown job'}, status_code=404)
+    return job
+
+
+@app.get('/jobs/{job_id}/events')
+async def job_events(job_id: str, request: Request, after: int = 0):
+    """Server-sent events for a job, from ``after`` or the Last-Event-ID header."""
+    if JOBS.get(job_id) is None:
+        return JSONResponse({'error': 'Unknown job'}, status_code=404)
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after = int(last_event_id)
+    return StreamingResponse((format_sse(e) for e in JOBS.iter_events(job_id, after)),
+                             media_type="text/event-stream")
 
 
 if __name__ == '__main__':
+    import uvicorn
     # Use 0.0.0.0 for public access in a production environment
-    app.run(host='0.0.0.0', port=8080)
+    uvicorn.run(app, host='0.0.0.0', port=8080)
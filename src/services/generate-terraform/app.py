@@ -1,130 +1,843 @@
-from flask import Flask, request, send_file, jsonify
-import tempfile
-import zipfile
+from flask import Flask, Response, request, jsonify, stream_with_context
 import os
-import io
 import json
+import re
 import datetime
+import io
 import logging
-import openai
+import shutil
+import tempfile
+import time
+import uuid
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from shared import metrics, startup
+from shared.artifact import ArtifactBuilder, iter_archive
+from shared.ingest import ZipGuard, ZipLimits, ZipRejected
+from shared.jobs import JobQueue, QueueFull, format_sse
+from shared.llm_cache import LLMCache, bypass_requested, cache_key
+import hcl
+
+# Imported by the warm-up (before fork under gunicorn), not on startup.
+openai = startup.lazy_import("openai")
 
 logging.basicConfig(level=logging.INFO)
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB upload limit
-openai.api_key = os.getenv("OPENAI_API_KEY")
+metrics.instrument_flask(app)
+# Caps on an uploaded project (ZIP_MAX_* variables), as for the other
+# services; a request may carry the suggestion besides the archive.
+ZIP_LIMITS = ZipLimits.from_env()
+MAX_FORM_BYTES = int(os.getenv("TERRAFORM_MAX_FORM_BYTES", str(16 * 1024 * 1024)))
+app.config['MAX_CONTENT_LENGTH'] = ZIP_LIMITS.max_archive_bytes + MAX_FORM_BYTES
+LLM_CACHE = LLMCache.from_env()
+
+TF_FILES = ("main.tf", "provider.tf", "variables.tf", "outputs.tf")
+# Per-file syntax errors and undeclared references, added to every archive.
+VALIDATION_FILE = "terraform_validation.json"
+MAX_PARALLEL_FILES = int(os.getenv("TERRAFORM_MAX_PARALLEL", "4"))
+# Model calls spent on one file that fails its checks before it is kept as is.
+FILE_RETRIES = int(os.getenv("TERRAFORM_FILE_RETRIES", "2"))
+
+FILE_RETRIES_TOTAL = metrics.REGISTRY.register(metrics.Counter(
+    "terraform_file_retries_total", "Files re-requested alone because they failed their checks.", ("file",)))
+FILE_INVALID_TOTAL = metrics.REGISTRY.register(metrics.Counter(
+    "terraform_file_invalid_total", "Files kept though still failing their checks after every retry.", ("file",)))
+
+# Terraform jobs: workers per process, queue bound, and where uploaded
+# projects wait until their job's result has been purged.
+JOB_WORKERS = int(os.getenv("TERRAFORM_JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("TERRAFORM_JOB_QUEUE_SIZE", "64"))
+JOB_UPLOAD_DIR = os.getenv("TERRAFORM_JOB_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "terraform-jobs"))
+JOBS = JobQueue.from_env()
 
 # -------------------------------
 # OpenAI helper
 # -------------------------------
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> "openai.OpenAI":
+    """The process-wide OpenAI client, created in each worker (never before fork).
+
+    The client is thread-safe; sharing it keeps one connection pool per
+    process instead of one per call.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+@startup.warmup("openai")
+def warm_openai():
+    startup.warm_openai(stream=True)
+
 
-def call_openai_for_infra(suggestion: dict):
-    prompt = f"""Generate Terraform config files (`main.tf`, `provider.tf`,
-    `variables.tf`, `outputs.tf`), docker-compose.yaml for local development,
-    and terraform_config.json echoing the input JSON.
 
-    ONLY valid file contents.
+def build_infra_prompt(suggestion: dict) -> str:
+    return f"""Generate Terraform config files (`main.tf`, `provider.tf`,
+    `variables.tf`, `outputs.tf`) for the suggestion below.
+
+    Answer with one JSON member per file, holding its complete contents:
+    valid HCL, without markdown fences or commentary.
 
     Suggestion JSON:
     {json.dumps(suggestion, indent=2)}
     """
 
-    response = openai.OpenAI().responses.create(
+
+# Structured output: a JSON object with exactly one string per file, so
+# files are told apart by the JSON syntax, never by what their text says.
+TF_FORMAT = {"format": {
+    "type": "json_schema",
+    "name": "terraform_files",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {name: {"type": "string"} for name in TF_FILES},
+        "required": list(TF_FILES),
+        "additionalProperties": False,
+    },
+}}
+
+
+def call_openai_for_infra(suggestion: dict, use_cache: bool = True):
+    key = cache_key("terraform-files", "gpt-5", suggestion)
+    if use_cache:
+        cached = LLM_CACHE.get(key)
+        if cached is not None:
+            logging.info("LLM cache hit for %s", key[:12])
+            return cached
+
+    start = time.perf_counter()
+    response = get_client().responses.create(
         model="gpt-5",
-        input=prompt,
+        input=build_infra_prompt(suggestion),
         reasoning={"effort": "minimal"},
+        text=TF_FORMAT,
     )
+    metrics.observe_llm("gpt-5", "terraform", time.perf_counter() - start, response.usage)
+    LLM_CACHE.put(key, response.output_text)
     return response.output_text
 
 
+def stream_openai_for_infra(suggestion: dict, use_cache: bool = True):
+    """Yield the model output as text deltas; a cache hit is yielded whole."""
+    key = cache_key("terraform-files", "gpt-5", suggestion)
+    if use_cache:
+        cached = LLM_CACHE.get(key)
+        if cached is not None:
+            logging.info("LLM cache hit for %s", key[:12])
+            yield cached
+            return
+
+    parts, usage = [], None
+    start = time.perf_counter()
+    with get_client().responses.create(
+        model="gpt-5",
+        input=build_infra_prompt(suggestion),
+        reasoning={"effort": "minimal"},
+        text=TF_FORMAT,
+        stream=True,
+    ) as stream:
+        for event in stream:
+            if event.type == "response.output_text.delta":
+                parts.append(event.delta)
+                yield event.delta
+            elif event.type == "response.completed":
+                usage = getattr(event.response, "usage", None)
+    metrics.observe_llm("gpt-5", "terraform-stream", time.perf_counter() - start, usage)
+    LLM_CACHE.put(key, "".join(parts))
+
+
+# -------------------------------
+# Parse structured model output
+# -------------------------------
+
+
+class TerraformJsonParser:
+    """Incremental parser for the structured model output, a JSON object of file name -> contents.
+
+    Text is fed in arbitrary pieces. ``feed`` returns ``(name, text)`` for
+    each member whose string closed in them, so a file can be checked while
+    the next ones are still being generated. Members not in ``names`` and
+    repeated members are ignored. Anything but a flat object of strings
+    raises ValueError, from ``feed`` or, if the object never closes, from
+    ``close``; members returned until then stand.
+    """
+
+    START, OPEN, KEY, COLON, VALUE, NEXT, END = range(7)
+    _SPECIAL = re.compile(r'["\\]')
+    _SPACE = re.compile(r"\s*")
+
+    def __init__(self, names=TF_FILES):
+        self.names = tuple(names)
+        self.done = set()
+        self.state = self.START
+        self._key = None
+        self._buf = ""
+        self._scan = 0  # where the search for the end of an open string resumes
+
+    def feed(self, text: str):
+        self._buf += text
+        completed = []
+        pos = 0
+        while True:
+            pos = self._SPACE.match(self._buf, pos).end()
+            if pos == len(self._buf):
+                break
+            char = self._buf[pos]
+            if self.state in (self.OPEN, self.KEY, self.VALUE) and char == '"':
+                end = self._string_end(pos)
+                if end is None:
+                    break
+                value = json.loads(self._buf[pos:end + 1])
+                pos, self._scan = end + 1, 0
+                if self.state != self.VALUE:
+                    self._key, self.state = value, self.COLON
+                else:
+                    completed.extend(self._member(self._key, value))
+                    self.state = self.NEXT
+            elif self.state == self.START and char == "{":
+                pos, self.state = pos + 1, self.OPEN
+            elif self.state == self.COLON and char == ":":
+                pos, self.state = pos + 1, self.VALUE
+            elif self.state == self.NEXT and char == ",":
+                pos, self.state = pos + 1, self.KEY
+            elif self.state in (self.OPEN, self.NEXT) and char == "}":
+                pos, self.state = pos + 1, self.END
+            else:
+                raise ValueError(f"unexpected {char!r} in structured output")
+        self._buf = self._buf[pos:]
+        self._scan = max(self._scan - pos, 0)
+        return completed
+
+    def close(self):
+        if self.state != self.END:
+            raise ValueError("structured output ended before its closing brace")
+        return []
+
+    def _string_end(self, start: int):
+        """Index of the quote closing the string opened at ``start``, or None if not fed yet."""
+        i = max(self._scan, start + 1)
+        while True:
+            match = self._SPECIAL.search(self._buf, i)
+            if match is None:
+                self._scan = len(self._buf)
+                return None
+            i = match.start()
+            if self._buf[i] == '"':
+                return i
+            if i + 1 == len(self._buf):
+                self._scan = i
+                return None
+            i += 2
+
+    def _member(self, name, text):
+        if name not in self.names or name in self.done:
+            logging.warning("Ignoring structured output member %r", name)
+            return []
+        self.done.add(name)
+        return [(name, text)]
+
+
+def readme_text() -> str:
+    return f"# Auto-generated Terraform files\nGenerated {datetime.datetime.utcnow().isoformat()}Z\n"
+
+
 # -------------------------------
 # Generate Terraform files
 # -------------------------------
-def generate_terraform_files(suggestion: dict, outdir: str):
-    os.makedirs(outdir, exist_ok=True)
-    content = call_openai_for_infra(suggestion)
-
-    files = {
-        "main.tf": "",
-        "provider.tf": "",
-        "variables.tf": "",
-        "outputs.tf": "",
-        "terraform_config.json": json.dumps(suggestion, indent=2),
-    }
+def generate_terraform_files(suggestion: dict, use_cache: bool = True) -> Dict[str, str]:
+    """Generate the Terraform files with a single model call, as name -> text.
 
-    current_file = None
-    for line in content.splitlines():
-        if line.strip().startswith("```") and current_file:
-            current_file = None
-            continue
-        if line.strip().startswith("```"):
-            continue
-
-        if "main.tf" in line:
-            current_file = "main.tf"
-            continue
-        if "provider.tf" in line:
-            current_file = "provider.tf"
-            continue
-        if "variables.tf" in line:
-            current_file = "variables.tf"
-            continue
-        if "outputs.tf" in line:
-            current_file = "outputs.tf"
-            continue
-
-        if current_file:
-            files[current_file] += line + "\n"
-
-    for fname, text in files.items():
-        fpath = os.path.join(outdir, fname)
-        os.makedirs(os.path.dirname(fpath), exist_ok=True)
-        with open(fpath, "w") as f:
-            f.write(text)
+    Files that fail their checks are re-requested one by one.
+    """
+    content = call_openai_for_infra(suggestion, use_cache)
+
+    files = {name: "" for name in TF_FILES}
+    files["terraform_config.json"] = json.dumps(suggestion, indent=2)
+    with metrics.stage("check_output"):
+        for fname, text in iter_checked_files(suggestion, [content], use_cache):
+            files[fname] = text
 
     # optional README
-    with open(os.path.join(outdir, "README.md"), "w") as f:
-        f.write(
-            f"# Auto-generated Terraform files\nGenerated {datetime.datetime.utcnow().isoformat()}Z\n")
+    files["README.md"] = readme_text()
+    return files
+
+
+# -------------------------------
+# Parallel per-file generation
+# -------------------------------
+
+
+class FileTask(NamedTuple):
+    name: str
+    deps: Tuple[str, ...]
+    instructions: str
+
+
+FILE_TASKS = (
+    FileTask("provider.tf", (), "the terraform block with required_providers and the provider configuration"),
+    FileTask("variables.tf", (), "input variable declarations with descriptions, types and sensible defaults"),
+    FileTask("main.tf", (), "the resources that deploy the application"),
+    FileTask("outputs.tf", ("main.tf",), "outputs exposing the useful attributes of the resources in main.tf"),
+    FileTask("docker-compose.yaml", (), "a docker-compose file for running the application locally"),
+)
+FILE_TASKS_BY_NAME = {task.name: task for task in FILE_TASKS}
+
+def build_file_prompt(task: FileTask, suggestion: dict, deps: Dict[str, str],
+                      previous: str = "", problems: Sequence[str] = ()) -> str:
+    prompt = f"""Generate only the file `{task.name}`: {task.instructions}.
+
+    ONLY the file contents, without markdown fences or commentary.
+
+    Suggestion JSON:
+    {json.dumps(suggestion, indent=2)}
+    """
+    for name, text in deps.items():
+        prompt += f"\n    Existing `{name}`:\n{text}\n"
+    if problems:
+        prompt += "\n    A previous attempt was rejected:\n" + "".join(f"    - {p}\n" for p in problems)
+        if previous:
+            prompt += f"\n    Previous `{task.name}`:\n{previous}\n"
+    return prompt
+
+
+def strip_fences(text: str) -> str:
+    """Drop a markdown fence wrapped around a whole file, if the model added one."""
+    lines = text.strip("\n").splitlines()
+    if len(lines) >= 2 and lines[0].strip().startswith("```") and lines[-1].strip().startswith("```"):
+        lines = lines[1:-1]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def call_openai_for_file(client, task: FileTask, suggestion: dict, deps: Dict[str, str],
+                         use_cache: bool = True, previous: str = "", problems: Sequence[str] = ()) -> str:
+    """One file from its own model call; ``previous`` and ``problems`` describe a rejected attempt."""
+    key = cache_key("terraform-file", "gpt-5", task.name, suggestion, deps,
+                    *((previous, list(problems)) if problems else ()))
+    if use_cache:
+        cached = LLM_CACHE.get(key)
+        if cached is not None:
+            return cached
+    start = time.perf_counter()
+    response = client.responses.create(
+        model="gpt-5",
+        input=build_file_prompt(task, suggestion, deps, previous, problems),
+        reasoning={"effort": "minimal"},
+    )
+    metrics.observe_llm("gpt-5", "terraform-file", time.perf_counter() - start, response.usage)
+    text = strip_fences(response.output_text)
+    LLM_CACHE.put(key, text)
+    return text
+
+
+# -------------------------------
+# Check and repair files
+# -------------------------------
+
+# Top-level blocks a file must hold at least one of.
+REQUIRED_BLOCKS = {
+    "provider.tf": ("terraform", "provider"),
+    "main.tf": ("resource", "module"),
+}
+
+
+def check_file(name: str, text: str) -> List[str]:
+    """Problems that make a generated file unusable; empty if it is valid.
+
+    Only ``.tf`` files are checked, by parsing them (``hcl.analyze``,
+    cached by content, so checking a file again costs nothing).
+    """
+    if not name.endswith(".tf"):
+        return []
+    if not text.strip():
+        return ["the file is empty"] if name in REQUIRED_BLOCKS else []
+    if text.lstrip().startswith(("```", "{")):
+        return ["the file must be plain HCL, without markdown fences or JSON"]
+    analysis = hcl.analyze(text)
+    if analysis.errors:
+        return ["invalid HCL: " + e for e in analysis.errors]
+    required = REQUIRED_BLOCKS.get(name)
+    if required and not set(analysis.blocks) & set(required):
+        return ["no " + " or ".join(f"`{b}`" for b in required) + " block"]
+    return []
+
+
+def format_file(name: str, text: str) -> str:
+    """``text`` laid out as ``terraform fmt`` would, if it is a .tf file that parses."""
+    return hcl.analyze(text).formatted if name.endswith(".tf") else text
+
+
+def validation_report(files: Dict[str, str], repair_failures: Optional[Dict[str, str]] = None) -> str:
+    """JSON report of the .tf files: syntax errors, and references nothing declares.
+
+    Run on the files as generated, before ``reconcile_variables``: the
+    undeclared ``var.*`` references it will declare are reported, and
+    listed under "declared_variables". The files are valid if nothing
+    else is wrong. ``repair_failures`` maps files whose repair failed,
+    and were kept as they were, to the error. Provider schemas are not
+    checked: this is what can be told offline.
+    """
+    repair_failures = repair_failures or {}
+    analyses = {name: hcl.analyze(text) for name, text in files.items() if name.endswith(".tf")}
+    errors = {name: list(a.errors) for name, a in analyses.items() if a.errors}
+    undeclared = hcl.undeclared(analyses)
+    for name, refs in undeclared.items():
+        logging.warning("%s references undeclared %s", name, ", ".join(refs))
+    refs = {r for file_refs in undeclared.values() for r in file_refs}
+    declared = sorted(r[len("var."):] for r in refs if r.startswith("var."))
+    return json.dumps({"valid": not errors and not repair_failures and len(declared) == len(refs),
+                       "errors": errors, "undeclared": undeclared, "declared_variables": declared,
+                       "repair_failures": repair_failures}, indent=2)
+
+
+def repair_file(client, task: FileTask, suggestion: dict, deps: Dict[str, str], text: str,
+                use_cache: bool = True, problems: Optional[List[str]] = None) -> str:
+    """``text`` if it passes ``check_file``, else the file re-requested alone until it does.
+
+    ``problems`` are those of ``text``, when already known. At most
+    ``FILE_RETRIES`` calls are made; after that the last attempt is kept,
+    and logged, rather than failing the whole generation.
+    """
+    if problems is None:
+        problems = check_file(task.name, text)
+    for attempt in range(1, FILE_RETRIES + 1):
+        if not problems:
+            break
+        FILE_RETRIES_TOTAL.inc(task.name)
+        logging.warning("Re-requesting %s (attempt %d): %s", task.name, attempt, "; ".join(problems))
+        text = call_openai_for_file(client, task, suggestion, deps, use_cache, text, problems)
+        problems = check_file(task.name, text)
+    if problems:
+        FILE_INVALID_TOTAL.inc(task.name)
+        logging.error("%s still invalid after %d retries: %s", task.name, FILE_RETRIES, "; ".join(problems))
+    return text
+
+
+def iter_checked_files(suggestion: dict, chunks: Iterable[str], use_cache: bool = True):
+    """Yield ``(name, text)`` for each Terraform file of a structured model response, checked.
+
+    Files are parsed out of ``chunks`` and validated as soon as they
+    complete, while the rest is still streaming. A valid file is yielded
+    at once, formatted; an invalid one, or one the response lacks, is
+    re-requested alone on a pool, once the files it depends on are
+    settled, and yielded once repaired. A malformed response only costs
+    the files it did not deliver, and a failed repair only that file: it
+    is kept as it was, and the failure recorded in the validation report.
+    variables.tf comes last, with the variables the others use declared,
+    then the report.
+    """
+    parser = TerraformJsonParser()
+    client = get_client()
+    pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL_FILES, thread_name_prefix="repair")
+    repairs = {}   # future -> (name, text before the repair)
+    waiting: Dict[str, Tuple[str, List[str]]] = {}  # name -> (text, problems), until its deps are settled
+    failed: Dict[str, str] = {}
+    checked: Dict[str, str] = {}
+
+    def submit_ready(force: bool = False):
+        for name, (text, problems) in list(waiting.items()):
+            task = FILE_TASKS_BY_NAME[name]
+            if force or all(d in checked for d in task.deps):
+                del waiting[name]
+                deps = {d: checked[d] for d in task.deps if d in checked}
+                fut = pool.submit(repair_file, client, task, suggestion, deps, text, use_cache, problems)
+                repairs[fut] = name, text
+
+    def accept(name, text):
+        checked[name] = format_file(name, text)
+        if name != "variables.tf":
+            yield name, checked[name]
+
+    def settle(completed):
+        for name, text, problems in completed:
+            if problems:
+                waiting[name] = text, problems
+            else:
+                yield from accept(name, text)
+        submit_ready()
+
+    def check(completed):
+        return ((name, text, check_file(name, text)) for name, text in completed)
+
+    def repaired(block: bool):
+        while repairs or (block and waiting):
+            if not repairs:
+                # Nothing left that could settle the deps of what waits.
+                submit_ready(force=True)
+            if block:
+                done, _ = wait(list(repairs), return_when=FIRST_COMPLETED)
+            else:
+                done = [f for f in repairs if f.done()]
+            for fut in done:
+                name, text = repairs.pop(fut)
+                try:
+                    text = fut.result()
+                except Exception as e:
+                    FILE_INVALID_TOTAL.inc(name)
+                    logging.exception("Repairing %s failed, keeping it as it was", name)
+                    failed[name] = str(e) or type(e).__name__
+                yield from accept(name, text)
+            submit_ready()
+            if not block:
+                return
+
+    try:
+        try:
+            for chunk in chunks:
+                yield from settle(check(parser.feed(chunk)))
+                yield from repaired(block=False)
+            yield from settle(check(parser.close()))
+        except ValueError as e:
+            logging.warning("Malformed structured output, re-requesting the missing files: %s", e)
+        yield from settle((name, "", ["the file was missing from the response"])
+                          for name in TF_FILES if name not in parser.done)
+        yield from repaired(block=True)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    report = validation_report(checked, failed)
+    checked = reconcile_variables(checked)
+    yield "variables.tf", checked["variables.tf"]
+    yield VALIDATION_FILE, report
+
+
+def run_task_graph(tasks, run: Callable[[FileTask, Dict[str, str]], str],
+                   max_workers: int = MAX_PARALLEL_FILES) -> Dict[str, str]:
+    """Run tasks concurrently, each as soon as all of its dependencies finished.
+
+    ``run`` receives the task and the results of its dependencies. At most
+    ``max_workers`` tasks run at once; the first failure is raised.
+    """
+    pending = {t.name: t for t in tasks}
+    results: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while pending or running:
+            for name, task in list(pending.items()):
+                if all(d in results for d in task.deps):
+                    running[pool.submit(run, task, {d: results[d] for d in task.deps})] = name
+                    del pending[name]
+            if not running:
+                raise ValueError(f"unsatisfiable dependencies: {sorted(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                results[running.pop(fut)] = fut.result()
+    return results
+
+
+def reconcile_variables(files: Dict[str, str]) -> Dict[str, str]:
+    """Declare every ``var.x`` referenced by the .tf files but declared nowhere.
+
+    Files are generated independently, so variables.tf cannot know what
+    main.tf ended up using; missing declarations are appended to it.
+    """
+    analyses = [hcl.analyze(text) for name, text in files.items() if name.endswith(".tf")]
+    referenced = {r[len("var."):] for a in analyses for r in a.referenced if r.startswith("var.")}
+    declared = {d[len("var."):] for a in analyses for d in a.declared if d.startswith("var.")}
+    missing = sorted(referenced - declared)
+    unused = sorted(declared - referenced)
+    if unused:
+        logging.info("Declared but unreferenced variables: %s", ", ".join(unused))
+    if missing:
+        logging.warning("Declaring missing variables: %s", ", ".join(missing))
+        extra = "".join(f'\nvariable "{name}" {{\n  type = string\n}}\n' for name in missing)
+        files = dict(files, **{"variables.tf": files.get("variables.tf", "") + extra})
+    return files
+
+
+def generate_terraform_files_parallel(suggestion: dict, use_cache: bool = True,
+                                     on_file: Optional[Callable[[str], None]] = None) -> Dict[str, str]:
+    """Generate each file with its own model call, fanned out across threads.
+
+    ``on_file`` is called with each file's name as soon as it is generated.
+    """
+    client = get_client()
+
+    def run(task, deps):
+        text = call_openai_for_file(client, task, suggestion, deps, use_cache)
+        text = format_file(task.name, repair_file(client, task, suggestion, deps, text, use_cache))
+        if on_file is not None:
+            on_file(task.name)
+        return text
+
+    files = run_task_graph(FILE_TASKS, run)
+    report = validation_report(files)
+    files = reconcile_variables(files)
+    files[VALIDATION_FILE] = report
+    files["terraform_config.json"] = json.dumps(suggestion, indent=2)
+    files["README.md"] = readme_text()
+    return files
+
+
+def iter_terraform_files(suggestion: dict, use_cache: bool = True):
+    """Yield ``(name, text)`` for each file as soon as the model output completes it.
+
+    Files re-requested after failing their checks come as they are
+    repaired; variables.tf and the validation report once every file is
+    in, then the echoed suggestion and the README.
+    """
+    yield from iter_checked_files(suggestion, stream_openai_for_infra(suggestion, use_cache), use_cache)
+    yield "terraform_config.json", json.dumps(suggestion, indent=2)
+    yield "README.md", readme_text()
+
+
+def stream_terraform_zip(suggestion: dict, use_cache: bool = True,
+                         bundle: Optional[zipfile.ZipFile] = None):
+    """Yield a ZIP archive in pieces, one piece per completed file.
+
+    Nothing is yielded before the first model file is complete, so a
+    failed model call can still be reported before any bytes are sent.
+    Members of ``bundle`` are copied in last.
+    """
+    builder = ArtifactBuilder()
+    for fname, text in iter_terraform_files(suggestion, use_cache):
+        builder.add(fname, text)
+        yield builder.drain()
+    if bundle is not None:
+        yield from builder.iter_copy(bundle, skip=set(builder.names))
+    yield builder.close()
 
 # -------------------------------
 # Flask endpoint
 # -------------------------------
 
 
+def read_request():
+    """Return ``(suggestion, bundle)`` from a JSON or multipart request.
+
+    A multipart request carries the suggestion as a JSON form field and the
+    original project as ``repo_zip``; the project is then bundled into the
+    output archive. Raises ValueError with a client-facing message, or
+    ZipRejected for an archive over ``ZIP_LIMITS``.
+    """
+    upload = request.files.get("repo_zip")
+    if upload is None:
+        data = request.get_json(silent=True)
+        if not data or "suggestion" not in data:
+            raise ValueError("Missing 'suggestion' field")
+        return data["suggestion"], None
+
+    if "suggestion" not in request.form:
+        raise ValueError("Missing 'suggestion' field")
+    try:
+        suggestion = json.loads(request.form["suggestion"])
+    except ValueError:
+        raise ValueError("'suggestion' must be valid JSON")
+    # Take the spooled upload over: Flask closes request.files when the view
+    # returns, before a streamed body is generated.
+    stream, upload.stream = upload.stream, io.BytesIO()
+    try:
+        # Only the central directory is read here; member data is copied
+        # later without being decompressed.
+        with metrics.stage("zip_read"):
+            ZipGuard(ZIP_LIMITS).check_archive(stream)
+            bundle = zipfile.ZipFile(stream)
+    except ZipRejected:
+        stream.close()
+        raise
+    except zipfile.BadZipFile:
+        stream.close()
+        raise ValueError("'repo_zip' is not a valid ZIP archive")
+    return suggestion, bundle
+
+
+@app.errorhandler(413)
+def request_too_large(e):
+    # Bodies over MAX_CONTENT_LENGTH, refused before the archive is read.
+    return jsonify({"error": "archive_too_large", "message": "The request is too large",
+                    "limit": app.config["MAX_CONTENT_LENGTH"]}), 413
+
+
 @app.route("/terraform", methods=["POST"])
 def generate_terraform():
-    data = request.get_json()
-    if not data or "suggestion" not in data:
-        return jsonify({"error": "Missing 'suggestion' field"}), 400
+    try:
+        suggestion, bundle = read_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ZipRejected as e:
+        return jsonify(e.to_dict()), e.status
+
+    use_cache = not bypass_requested(request.headers.get("Cache-Control"))
+
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        # Streaming mode: the ZIP is sent with chunked transfer as files
+        # complete. The first piece is produced here so that a failing model
+        # call still turns into an error status instead of a truncated body.
+        chunks = stream_terraform_zip(suggestion, use_cache, bundle)
+        first = next(chunks)
+
+        def body():
+            yield first
+            yield from chunks
+
+        return zip_response(body(), bundle)
+
+    if request.args.get("parallel", "").lower() in ("1", "true", "yes"):
+        # Parallel mode: one model call per file, scheduled by dependency.
+        files = generate_terraform_files_parallel(suggestion, use_cache)
+    else:
+        files = generate_terraform_files(suggestion, use_cache)
+
+    # The generated strings go straight into ZIP entries, streamed out one
+    # entry at a time, followed by the original project if one was uploaded.
+    return zip_response(iter_archive(files.items(), bundle=bundle), bundle)
+
+
+def zip_response(chunks, bundle: Optional[zipfile.ZipFile] = None) -> Response:
+    # Entries are assembled as the body is sent, so "zip_send" covers both.
+    response = Response(
+        stream_with_context(metrics.timed_iter("zip_send", chunks)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=terraformed.zip"},
+    )
+    if bundle is not None:
+        response.call_on_close(bundle.fp.close)
+    return response
+
+
+# -------------------------------
+# Job API
+# -------------------------------
+# The same work as /terraform without holding the connection: submit to
+# /jobs, then poll /jobs/<id> or follow /jobs/<id>/events, and download
+# /jobs/<id>/result once the job succeeded.
+
 
-    suggestion = data["suggestion"]
+def remove_upload(payload: dict):
+    if payload.get("repo_zip"):
+        try:
+            os.remove(payload["repo_zip"])
+        except FileNotFoundError:
+            pass
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        generate_terraform_files(suggestion, tmpdir)
 
-        # create ZIP in memory
-        zip_stream = io.BytesIO()
-        with zipfile.ZipFile(zip_stream, "w") as zipf:
-            for root, _, files in os.walk(tmpdir):
-                for f in files:
-                    full_path = os.path.join(root, f)
-                    arcname = os.path.relpath(full_path, tmpdir)
-                    zipf.write(full_path, arcname)
-        zip_stream.seek(0)
+@JOBS.stage("terraform", workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, cleanup=remove_upload)
+def terraform_job(payload: dict, job):
+    suggestion, use_cache = payload["suggestion"], payload["use_cache"]
+    if payload["parallel"]:
+        files = generate_terraform_files_parallel(
+            suggestion, use_cache, on_file=lambda name: job.progress("generated " + name, file=name))
+    else:
+        files = {}
+        for fname, text in iter_terraform_files(suggestion, use_cache):
+            files[fname] = text
+            job.progress("generated " + fname, file=fname)
+    return {"files": files, "repo_zip": payload["repo_zip"]}
 
-        return send_file(
-            zip_stream,
-            mimetype="application/zip",
-            as_attachment=True,
-            download_name="terraformed.zip",
-        )
+
+def save_upload(bundle: zipfile.ZipFile) -> str:
+    """Copy an uploaded project to disk, where any worker process can read it."""
+    os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(JOB_UPLOAD_DIR, uuid.uuid4().hex + ".zip")
+    with bundle.fp as src, open(path, "wb") as dst:
+        src.seek(0)
+        shutil.copyfileobj(src, dst)
+    return path
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    try:
+        suggestion, bundle = read_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ZipRejected as e:
+        return jsonify(e.to_dict()), e.status
+
+    payload = {
+        "suggestion": suggestion,
+        "use_cache": not bypass_requested(request.headers.get("Cache-Control")),
+        "parallel": request.args.get("parallel", "").lower() in ("1", "true", "yes"),
+        "repo_zip": save_upload(bundle) if bundle is not None else None,
+    }
+    try:
+        job = JOBS.submit("terraform", payload)
+    except QueueFull as e:
+        remove_upload(payload)
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
+    return jsonify(job), 202, {"Location": f"/jobs/{job['id']}"}
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """A job's status; ``?wait=N`` long-polls up to N seconds for it to finish."""
+    wait = min(request.args.get("wait", 0, type=float), 60.0)
+    job = JOBS.wait(job_id, wait) if wait > 0 else JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["result"] is not None:
+        # The archive itself is served by /result.
+        job["result"] = {"files": sorted(job["result"]["files"])}
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Server-sent events for a job, from ``?after=N`` or the Last-Event-ID header."""
+    if JOBS.get(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+    after = request.headers.get("Last-Event-ID", request.args.get("after", "0"))
+    after = int(after) if after.isdigit() else 0
+    events = (format_sse(e) for e in JOBS.iter_events(job_id, after))
+    return Response(events, mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] != "succeeded":
+        return jsonify({"error": job["error"] or "Job has not finished", "status": job["status"]}), 409
+
+    result = job["result"]
+    bundle = None
+    if result["repo_zip"]:
+        try:
+            bundle = zipfile.ZipFile(result["repo_zip"])
+        except FileNotFoundError:
+            return jsonify({"error": "The uploaded project has expired"}), 410
+    return zip_response(iter_archive(result["files"].items(), bundle=bundle), bundle)
+
+
+@app.route("/ready", methods=["GET"])
+def get_ready():
+    status = startup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.route("/", methods=["GET"])
 def index():
-    return jsonify({"message": "Terraform Generation Service is running."})
+    return jsonify({"message": "Terraform Generation Service is running.",
+                    "llm_cache": LLM_CACHE.stats(), "hcl_cache": hcl.cache_info(), "jobs": JOBS.stats()})
+
+
+# Each gunicorn worker process runs its own job workers, started after
+# fork: threads started in a preloading master would not survive it.
+startup.after_fork(JOBS.start)
+
+
+@app.before_request
+def ensure_started():
+    # Covers servers run without shared.gunicorn_conf; a no-op once this
+    # process has started.
+    startup.start()
 
 
 if __name__ == "__main__":
+    startup.start()
     app.run(host="0.0.0.0", port=8080)
@@ -0,0 +1,712 @@
+"""Offline parsing, validation and formatting of generated Terraform (HCL).
+
+A pure-Python reading of the HCL native syntax, enough to tell whether a
+generated file would load: a lexer (quoted templates with their ``${}``
+and ``%{}`` sequences, heredocs, comments), a parser for bodies of
+attributes and blocks with the whole expression grammar, and a formatter
+normalizing indentation, spacing around ``=`` and the alignment of
+consecutive attributes the way ``terraform fmt`` does. Nothing is sent
+anywhere and no provider plugins are needed, so provider schemas are
+not checked: a resource type or argument that does not exist passes.
+
+``analyze`` gives one file's syntax errors, formatted text and what it
+declares and references; results are cached by the SHA-256 of the text,
+so an identical file is never parsed twice. ``undeclared`` checks the
+references of a module's files against their declarations.
+"""
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Set, Tuple
+import hashlib, os, re, threading
+
+CACHE_SIZE = int(os.getenv("TERRAFORM_HCL_CACHE_SIZE", "1024"))
+
+# Top-level blocks and the number of labels each takes.
+TOP_LEVEL_LABELS = {
+    "terraform": 0, "locals": 0, "provider": 1, "variable": 1, "output": 1, "module": 1,
+    "resource": 2, "data": 2, "ephemeral": 2, "moved": 0, "import": 0, "removed": 0, "check": 1,
+}
+# Roots of references that are not declared by the configuration.
+BUILTIN_ROOTS = frozenset({"each", "count", "self", "path", "terraform"})
+_KEYWORDS = frozenset({"true", "false", "null"})
+
+_NAME_RE = re.compile(r"[A-Za-z_][\w-]*", re.ASCII)
+_NUMBER_RE = re.compile(r"[0-9]+(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+_HEREDOC_RE = re.compile(r"<<(-?)([A-Za-z_][\w-]*)[ \t]*\r?\n")
+_OPERATORS = ("...", "==", "!=", "<=", ">=", "&&", "||", "=>", "::")
+_PUNCTUATION = "{}[]()=,.:?!+-*/%<>"
+_BINARY = {"||": 1, "&&": 2, "==": 3, "!=": 3, "<": 4, ">": 4, "<=": 4, ">=": 4,
+           "+": 5, "-": 5, "*": 6, "/": 6, "%": 6}
+_OPEN, _CLOSE = "{[(", "}])"
+
+
+class HCLError(ValueError):
+    def __init__(self, message: str, line: int):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+class Token(NamedTuple):
+    kind: str   # NAME, NUMBER, STRING, HEREDOC, OP, NL or EOF
+    value: str
+    line: int
+    # Templates only: the ``${...}``/``%{...}`` sequences inside, as
+    # ("$" or "%", their tokens ending with EOF).
+    parts: Tuple[Tuple[str, Tuple["Token", ...]], ...] = ()
+
+
+class Analysis(NamedTuple):
+    errors: Tuple[str, ...]        # syntax errors, "line N: message"; empty if the file parses
+    formatted: str                 # normalized text; the text as given if it does not parse
+    blocks: Tuple[str, ...]        # types of the top-level blocks, in order
+    declared: FrozenSet[str]       # addresses: var.x, local.x, module.x, aws_instance.x, data.aws_ami.x
+    referenced: FrozenSet[str]     # addresses of the same kinds used in expressions
+
+
+# --- Lexer ---
+
+class _Lexer:
+    """Splits a file into tokens; lines inside heredocs and block comments are kept aside."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.line = 1
+        # Lines whose text is content rather than syntax: heredoc bodies and
+        # the continuation lines of block comments. They are never reformatted.
+        self.verbatim: Set[int] = set()
+
+    def tokens(self, interpolation: bool = False) -> List[Token]:
+        """Tokens up to the end of the text, or of the interpolation being read."""
+        text, out, depth = self.text, [], 0
+        while True:
+            if self.pos >= len(text):
+                if interpolation:
+                    raise HCLError("unterminated template sequence", self.line)
+                out.append(Token("EOF", "", self.line))
+                return out
+            c = text[self.pos]
+            if c in " \t\r":
+                self.pos += 1
+            elif c == "\n":
+                if interpolation:
+                    raise HCLError("newline inside a template sequence", self.line)
+                out.append(Token("NL", "\n", self.line))
+                self.pos += 1
+                self.line += 1
+            elif c == "#" or text.startswith("//", self.pos):
+                end = text.find("\n", self.pos)
+                self.pos = len(text) if end < 0 else end
+            elif text.startswith("/*", self.pos):
+                end = text.find("*/", self.pos + 2)
+                if end < 0:
+                    raise HCLError("unterminated comment", self.line)
+                lines = text.count("\n", self.pos, end)
+                self.verbatim.update(range(self.line + 1, self.line + lines + 1))
+                self.line += lines
+                self.pos = end + 2
+            elif c == "~" and interpolation and (text.startswith("~}", self.pos) or out == []):
+                self.pos += 1  # whitespace strip marker
+            elif c == "}" and interpolation and depth == 0:
+                self.pos += 1
+                out.append(Token("EOF", "", self.line))
+                return out
+            elif c == '"':
+                out.append(self._string())
+            elif text.startswith("<<", self.pos) and _HEREDOC_RE.match(text, self.pos):
+                out.append(self._heredoc())
+            elif "0" <= c <= "9":
+                match = _NUMBER_RE.match(text, self.pos)
+                out.append(Token("NUMBER", match.group(), self.line))
+                self.pos = match.end()
+            elif _NAME_RE.match(text, self.pos):
+                match = _NAME_RE.match(text, self.pos)
+                out.append(Token("NAME", match.group(), self.line))
+                self.pos = match.end()
+            else:
+                op = next((o for o in _OPERATORS if text.startswith(o, self.pos)), c if c in _PUNCTUATION else None)
+                if op is None:
+                    raise HCLError(f"unexpected character {c!r}", self.line)
+                if interpolation and op == "{":
+                    depth += 1
+                elif interpolation and op == "}":
+                    depth -= 1
+                out.append(Token("OP", op, self.line))
+                self.pos += len(op)
+
+    def _template_part(self, parts: list) -> None:
+        """Read the ``${`` or ``%{`` sequence at ``pos`` into ``parts``."""
+        kind = self.text[self.pos]
+        self.pos += 2
+        parts.append((kind, tuple(self.tokens(interpolation=True))))
+
+    def _string(self) -> Token:
+        text, start, line, parts = self.text, self.pos, self.line, []
+        self.pos += 1
+        while True:
+            if self.pos >= len(text) or text[self.pos] == "\n":
+                raise HCLError("unterminated string", line)
+            c = text[self.pos]
+            if c == "\\":
+                self.pos += 2
+            elif c == '"':
+                self.pos += 1
+                return Token("STRING", text[start:self.pos], line, tuple(parts))
+            elif text.startswith(("$${", "%%{"), self.pos):
+                self.pos += 3
+            elif text.startswith(("${", "%{"), self.pos):
+                self._template_part(parts)
+            else:
+                self.pos += 1
+
+    def _heredoc(self) -> Token:
+        match = _HEREDOC_RE.match(self.text, self.pos)
+        marker, start, line, parts = match.group(2), self.pos, self.line, []
+        self.pos = match.end()
+        self.line += 1
+        while True:
+            if self.pos >= len(self.text):
+                raise HCLError(f"heredoc {marker} is never closed", line)
+            end = self.text.find("\n", self.pos)
+            end = len(self.text) if end < 0 else end
+            self.verbatim.add(self.line)
+            if self.text[self.pos:end].strip() == marker:
+                self.pos = end
+                return Token("HEREDOC", self.text[start:end], line, tuple(parts))
+            while self.pos < end:
+                if self.text.startswith(("$${", "%%{"), self.pos):
+                    self.pos += 3
+                elif self.text.startswith(("${", "%{"), self.pos):
+                    self._template_part(parts)
+                else:
+                    self.pos += 1
+            self.pos = end + 1
+            self.line += 1
+
+
+# --- Parser ---
+
+class _Parser:
+    """Recursive-descent parser collecting what the formatter and the checks need."""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.i = 0
+        self.last = tokens[0]
+        self.nesting = 0              # open (, [ and { of expressions: newlines do not count there
+        self.scopes: List[Set[str]] = []
+        self.ignored: Set[str] = set()  # roots that are iterators, not declarations
+        self.references: List[Tuple[str, ...]] = []
+        self.declared: Set[str] = set()
+        self.blocks: List[str] = []
+        # First line of each attribute -> (body, name, whether it fits on that line)
+        self.attributes: Dict[int, Tuple[int, str, bool]] = {}
+        self._bodies = 0
+
+    # Token access
+
+    def peek(self) -> Token:
+        if self.nesting:
+            while self.tokens[self.i].kind == "NL":
+                self.i += 1
+        return self.tokens[self.i]
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token.kind != "EOF":
+            self.i += 1
+        self.last = token
+        return token
+
+    def at(self, value: str) -> bool:
+        token = self.peek()
+        return token.kind == "OP" and token.value == value
+
+    def expect(self, value: str, what: str = "") -> Token:
+        token = self.next()
+        if token.kind != "OP" or token.value != value:
+            raise HCLError(f"expected {value!r}{what}, found {_describe(token)}", token.line)
+        return token
+
+    def skip_newlines(self) -> None:
+        while self.tokens[self.i].kind == "NL":
+            self.i += 1
+
+    # Structure
+
+    def file(self) -> None:
+        self.body(top=True)
+        token = self.peek()
+        if token.kind != "EOF":
+            raise HCLError(f"unexpected {_describe(token)}", token.line)
+
+    def body(self, top: bool = False, block: Tuple[str, ...] = ()) -> None:
+        body, self._bodies = self._bodies, self._bodies + 1
+        seen: Set[str] = set()
+        while True:
+            self.skip_newlines()
+            token = self.tokens[self.i]
+            if token.kind == "EOF" or (token.kind == "OP" and token.value == "}" and not top):
+                return
+            if token.kind != "NAME":
+                raise HCLError(f"expected an attribute or a block, found {_describe(token)}", token.line)
+            self.i += 1
+            if self.at("="):
+                if top:
+                    raise HCLError(f"unexpected attribute {token.value!r} outside a block", token.line)
+                self.i += 1
+                if token.value in seen:
+                    raise HCLError(f"duplicate attribute {token.value!r}", token.line)
+                seen.add(token.value)
+                self.attribute(token, body, block)
+                self.end_of_line()
+            else:
+                self.block(token, top, block)
+
+    def attribute(self, name: Token, body: int, block: Tuple[str, ...] = ()) -> None:
+        """The value of ``name =``, with the ``=`` just read."""
+        first_on_line = self.i < 3 or self.tokens[self.i - 3].kind == "NL"
+        start = len(self.references)
+        self.expression()
+        if name.value == "from" and block in (("moved",), ("removed",)):
+            # The address a refactor moves or removes is meant to be gone.
+            del self.references[start:]
+        if first_on_line:
+            self.attributes[name.line] = (body, name.value, self.last.line == name.line)
+        if block == ("locals",):
+            self.declared.add("local." + name.value)
+
+    def block(self, kind: Token, top: bool, outer: Tuple[str, ...]) -> None:
+        labels = []
+        while self.peek().kind in ("STRING", "NAME"):
+            label = self.next()
+            if label.parts:
+                raise HCLError("block labels cannot contain template sequences", label.line)
+            labels.append(label.value.strip('"'))
+        if not self.at("{"):
+            raise HCLError(f"expected '=' or a block body after {kind.value!r}, found {_describe(self.peek())}",
+                           self.peek().line)
+        if top:
+            wanted = TOP_LEVEL_LABELS.get(kind.value)
+            if wanted is None:
+                raise HCLError(f"unsupported block type {kind.value!r}", kind.line)
+            if len(labels) != wanted:
+                raise HCLError(f"a {kind.value} block takes {wanted} label{'s' if wanted != 1 else ''}, "
+                               f"found {len(labels)}", kind.line)
+            self.blocks.append(kind.value)
+            self.declare(kind.value, labels)
+        elif kind.value == "dynamic":
+            if len(labels) != 1:
+                raise HCLError("a dynamic block takes 1 label", kind.line)
+            self.ignored.add(labels[0])
+            iterator = self._iterator_name()
+            if iterator:
+                self.ignored.add(iterator)
+        self.i += 1
+        path = (kind.value,) if top else outer + (kind.value,)
+        if self.tokens[self.i].kind == "NL":
+            self.body(block=path)
+            self.expect("}", " to close the block")
+        elif not self.at("}"):
+            # A one-line block holds at most one attribute.
+            name = self.next()
+            if name.kind != "NAME":
+                raise HCLError(f"expected an attribute, found {_describe(name)}", name.line)
+            self.expect("=")
+            self.expression()
+            self.expect("}", " to close the one-line block")
+        else:
+            self.i += 1
+        self.end_of_line()
+
+    def _iterator_name(self) -> Optional[str]:
+        """The ``iterator = name`` of the dynamic block starting at the current token, if any."""
+        depth, i = 0, self.i
+        while i < len(self.tokens) - 2:
+            token = self.tokens[i]
+            if token.kind == "OP" and token.value in "{[(":
+                depth += 1
+            elif token.kind == "OP" and token.value in "}])":
+                depth -= 1
+                if depth == 0:
+                    return None
+            elif (depth == 1 and token.kind == "NAME" and token.value == "iterator"
+                  and self.tokens[i + 1].value == "=" and self.tokens[i + 2].kind == "NAME"):
+                return self.tokens[i + 2].value
+            i += 1
+        return None
+
+    def declare(self, kind: str, labels: List[str]) -> None:
+        if kind == "variable":
+            self.declared.add("var." + labels[0])
+        elif kind == "module":
+            self.declared.add("module." + labels[0])
+        elif kind == "resource":
+            self.declared.add(".".join(labels))
+        elif kind in ("data", "ephemeral"):
+            self.declared.add(".".join([kind] + labels))
+
+    def end_of_line(self) -> None:
+        token = self.tokens[self.i]
+        if token.kind == "NL":
+            self.i += 1
+        elif token.kind != "EOF" and not (token.kind == "OP" and token.value == "}"):
+            raise HCLError(f"expected a newline, found {_describe(token)}", token.line)
+
+    # Expressions
+
+    def expression(self) -> None:
+        self.binary(0)
+        if self.at("?"):
+            self.next()
+            self.expression()
+            self.expect(":", " in a conditional")
+            self.expression()
+
+    def binary(self, min_precedence: int) -> None:
+        self.unary()
+        while True:
+            token = self.peek()
+            precedence = _BINARY.get(token.value) if token.kind == "OP" else None
+            if precedence is None or precedence <= min_precedence:
+                return
+            self.next()
+            self.binary(precedence)
+
+    def unary(self) -> None:
+        if self.at("!") or self.at("-"):
+            self.next()
+            self.unary()
+            return
+        self.postfix()
+
+    def postfix(self) -> None:
+        traversal = self.primary()
+        while True:
+            if self.at("."):
+                self.next()
+                token = self.next()
+                if token.kind == "OP" and token.value == "*":
+                    traversal = self.reference(traversal)
+                elif token.kind in ("NAME", "NUMBER"):
+                    if traversal is not None:
+                        traversal.append(token.value)
+                else:
+                    raise HCLError(f"expected an attribute name after '.', found {_describe(token)}", token.line)
+            elif self.at("["):
+                traversal = self.reference(traversal)
+                self.next()
+                self.nesting += 1
+                if self.at("*"):
+                    self.next()
+                else:
+                    self.expression()
+                self.expect("]", " to close the index")
+                self.nesting -= 1
+            else:
+                break
+        self.reference(traversal)
+
+    def reference(self, traversal: Optional[List[str]]) -> None:
+        """Record a traversal; an index or splat ends it: aws_instance.web[0].id -> aws_instance.web."""
+        if not traversal:
+            return None
+        root = traversal[0]
+        if root not in BUILTIN_ROOTS and root not in self.ignored and not any(root in s for s in self.scopes):
+            self.references.append(tuple(traversal))
+        return None
+
+    def primary(self) -> Optional[List[str]]:
+        """Parse an operand; a variable name comes back as the start of a traversal."""
+        token = self.next()
+        if token.kind == "NUMBER":
+            return None
+        if token.kind in ("STRING", "HEREDOC"):
+            self.template(token)
+            return None
+        if token.kind == "NAME":
+            if token.value in _KEYWORDS:
+                return None
+            if self.at("::"):
+                # A provider-defined function: provider::aws::arn_parse(...)
+                while self.at("::"):
+                    self.next()
+                    name = self.next()
+                    if name.kind != "NAME":
+                        raise HCLError(f"expected a function name, found {_describe(name)}", name.line)
+                if not self.at("("):
+                    raise HCLError("expected '(' after a provider function name", self.peek().line)
+            if self.at("("):
+                self.call()
+                return None
+            return [token.value]
+        if token.kind == "OP" and token.value == "(":
+            self.nesting += 1
+            self.expression()
+            self.expect(")", " to close the parenthesis")
+            self.nesting -= 1
+            return None
+        if token.kind == "OP" and token.value == "[":
+            self.collection("]")
+            return None
+        if token.kind == "OP" and token.value == "{":
+            self.collection("}")
+            return None
+        raise HCLError(f"expected an expression, found {_describe(token)}", token.line)
+
+    def call(self) -> None:
+        self.next()
+        self.nesting += 1
+        while not self.at(")"):
+            self.expression()
+            if self.at("..."):
+                self.next()
+            if not self.at(")"):
+                self.expect(",", " between arguments")
+        self.next()
+        self.nesting -= 1
+
+    def collection(self, close: str) -> None:
+        """A tuple (``close`` is "]") or an object ("}"), or a for expression building one."""
+        self.nesting += 1
+        token = self.peek()
+        if token.kind == "NAME" and token.value == "for":
+            self.for_expression(close)
+        else:
+            # Objects written one item per line are laid out like bodies.
+            body, self._bodies = self._bodies, self._bodies + 1
+            while not self.at(close):
+                if close == "}":
+                    key = self.object_key()
+                    if not (self.at("=") or self.at(":")):
+                        raise HCLError(f"expected '=' or ':' after an object key, found {_describe(self.peek())}",
+                                       self.peek().line)
+                    if self.next().value == "=" and key is not None:
+                        self.attribute(key, body)
+                    else:
+                        self.expression()
+                else:
+                    self.expression()
+                # Items are separated by commas, or by newlines in objects.
+                if self.at(","):
+                    self.next()
+                elif not self.at(close) and not (close == "}" and self.tokens[self.i - 1].line < self.peek().line):
+                    raise HCLError(f"expected ',' or {close!r}, found {_describe(self.peek())}", self.peek().line)
+        self.expect(close)
+        self.nesting -= 1
+
+    def object_key(self) -> Optional[Token]:
+        """Read an object key; a bare name or a quoted key is returned, to be laid out as an attribute.
+
+        A bare name is a key, not a reference.
+        """
+        token = self.peek()
+        following = self.tokens[min(self.i + 1, len(self.tokens) - 1)]
+        if token.kind in ("NAME", "STRING") and following.kind == "OP" and following.value in ("=", ":"):
+            if token.kind == "STRING":
+                self.template(token)
+            return self.next()
+        self.expression()
+        return None
+
+    def for_expression(self, close: str) -> None:
+        self.next()
+        names = {self._name("an iterator name")}
+        if self.at(","):
+            self.next()
+            names.add(self._name("an iterator name"))
+        token = self.next()
+        if token.kind != "NAME" or token.value != "in":
+            raise HCLError(f"expected 'in' in a for expression, found {_describe(token)}", token.line)
+        self.expression()
+        self.expect(":", " in a for expression")
+        self.scopes.append(names)
+        self.expression()
+        if close == "}":
+            self.expect("=>", " in an object for expression")
+            self.expression()
+            if self.at("..."):
+                self.next()
+        if self.peek().kind == "NAME" and self.peek().value == "if":
+            self.next()
+            self.expression()
+        self.scopes.pop()
+
+    def _name(self, what: str) -> str:
+        token = self.next()
+        if token.kind != "NAME":
+            raise HCLError(f"expected {what}, found {_describe(token)}", token.line)
+        return token.value
+
+    def template(self, token: Token) -> None:
+        """Parse the sequences of a quoted template or heredoc."""
+        pushed = 0
+        for kind, tokens in token.parts:
+            sub = _Parser(list(tokens))
+            sub.scopes, sub.ignored, sub.references = self.scopes, self.ignored, self.references
+            sub.nesting = 1
+            first = sub.peek()
+            if kind == "$":
+                sub.expression()
+            elif first.kind == "NAME" and first.value == "if":
+                sub.next()
+                sub.expression()
+            elif first.kind == "NAME" and first.value == "for":
+                sub.next()
+                names = {sub._name("an iterator name")}
+                if sub.at(","):
+                    sub.next()
+                    names.add(sub._name("an iterator name"))
+                if sub._name("'in'") != "in":
+                    raise HCLError("expected 'in' in a template for directive", first.line)
+                sub.expression()
+                # The iterator names hold until the matching endfor.
+                self.scopes.append(names)
+                pushed += 1
+            elif first.kind == "NAME" and first.value == "endfor":
+                sub.next()
+                if pushed:
+                    self.scopes.pop()
+                    pushed -= 1
+            elif first.kind == "NAME" and first.value in ("else", "endif"):
+                sub.next()
+            else:
+                raise HCLError(f"unknown template directive {_describe(first)}", first.line)
+            end = sub.peek()
+            if end.kind != "EOF":
+                raise HCLError(f"unexpected {_describe(end)} in a template sequence", end.line)
+        del self.scopes[len(self.scopes) - pushed:]
+
+
+def _describe(token: Token) -> str:
+    if token.kind == "EOF":
+        return "the end of the file"
+    if token.kind == "NL":
+        return "a newline"
+    if token.kind in ("STRING", "HEREDOC"):
+        return "a string"
+    return repr(token.value)
+
+
+def _address(traversal: Tuple[str, ...]) -> Optional[str]:
+    """The declaration a reference needs: var.x, local.x, module.x, data.t.n or t.n."""
+    root = traversal[0]
+    if root in ("var", "local", "module"):
+        return ".".join(traversal[:2]) if len(traversal) >= 2 else None
+    if root in ("data", "ephemeral"):
+        return ".".join(traversal[:3]) if len(traversal) >= 3 else None
+    # Resource types are named <provider>_<type>; anything else is a
+    # name the configuration does not declare (an iterator, a builtin).
+    if "_" in root and len(traversal) >= 2:
+        return ".".join(traversal[:2])
+    return None
+
+
+# --- Formatter ---
+
+def _format(text: str, tokens: List[Token], verbatim: Set[int],
+            attributes: Dict[int, Tuple[int, str, bool]]) -> str:
+    """``text`` reindented by nesting, with ``name = value`` spacing and runs of attributes aligned."""
+    # Nesting depth before the first token of each line, and after its last.
+    start: Dict[int, int] = {}
+    end: Dict[int, int] = {}
+    depth = 0
+    for token in tokens:
+        if token.kind in ("NL", "EOF"):
+            continue
+        if token.line not in start:
+            start[token.line] = max(depth - (token.kind == "OP" and token.value in _CLOSE), 0)
+        if token.kind == "OP" and token.value in _OPEN:
+            depth += 1
+        elif token.kind == "OP" and token.value in _CLOSE:
+            depth = max(depth - 1, 0)
+        end[token.line] = depth
+
+    # (line of a single-line attribute or None, text) per output line.
+    out: List[Tuple[Optional[int], str]] = []
+    after = 0
+    for number, line in enumerate(text.replace("\r\n", "\n").split("\n"), 1):
+        stripped = line.strip()
+        if number in verbatim:
+            out.append((None, line.rstrip()))
+            continue
+        if not stripped:
+            if out and out[-1][1]:
+                out.append((None, ""))
+            continue
+        indent = start.get(number, after)
+        after = end.get(number, after)
+        attribute = attributes.get(number)
+        if attribute:
+            name = attribute[1]
+            stripped = name + " = " + stripped[len(name):].lstrip()[1:].strip()
+        out.append((number if attribute and attribute[2] else None, "  " * indent + stripped))
+    while out and not out[-1][1]:
+        out.pop()
+
+    # Align the "=" of consecutive single-line attributes of the same body.
+    lines = [line for _, line in out]
+    i = 0
+    while i < len(out):
+        j = i
+        body = attributes[out[i][0]][0] if out[i][0] is not None else None
+        while j < len(out) and out[j][0] is not None and attributes[out[j][0]][0] == body:
+            j += 1
+        if j - i > 1:
+            width = max(len(attributes[out[k][0]][1]) for k in range(i, j))
+            for k in range(i, j):
+                name = attributes[out[k][0]][1]
+                pad = len(lines[k]) - len(lines[k].lstrip())
+                lines[k] = lines[k][:pad] + name.ljust(width) + lines[k][pad + len(name):]
+        i = max(j, i + 1)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+# --- Analysis ---
+
+_cache: "OrderedDict[str, Analysis]" = OrderedDict()
+_cache_lock = threading.Lock()
+_hits = _misses = 0
+
+
+def analyze(text: str) -> Analysis:
+    """Errors, formatted text, declarations and references of one file, cached by content."""
+    global _hits, _misses
+    digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+    with _cache_lock:
+        result = _cache.get(digest)
+        if result is not None:
+            _cache.move_to_end(digest)
+            _hits += 1
+            return result
+        _misses += 1
+    result = _analyze(text)
+    if CACHE_SIZE > 0:
+        with _cache_lock:
+            _cache[digest] = result
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return result
+
+
+def _analyze(text: str) -> Analysis:
+    lexer = _Lexer(text)
+    try:
+        tokens = lexer.tokens()
+        parser = _Parser(tokens)
+        parser.file()
+    except HCLError as e:
+        return Analysis((str(e),), text, (), frozenset(), frozenset())
+    referenced = frozenset(filter(None, map(_address, parser.references)))
+    formatted = _format(text, tokens, lexer.verbatim, parser.attributes)
+    return Analysis((), formatted, tuple(parser.blocks), frozenset(parser.declared), referenced)
+
+
+def undeclared(analyses: Mapping[str, Analysis]) -> Dict[str, List[str]]:
+    """References of each file that no file of the module declares, by file name."""
+    declared = frozenset().union(*(a.declared for a in analyses.values()))
+    missing = {name: sorted(a.referenced - declared) for name, a in analyses.items()}
+    return {name: refs for name, refs in missing.items() if refs}
+
+
+def cache_info() -> Dict[str, int]:
+    return {"entries": len(_cache), "max_entries": CACHE_SIZE, "hits": _hits, "misses": _misses}
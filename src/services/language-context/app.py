@@ -1,9 +1,48 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
-import re
+from typing import Any, AsyncIterator, Deque, List, Dict, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from collections import deque
+from functools import partial
+import anyio, asyncio, json, os, re
 
-app = FastAPI(title="Language Context Extraction", version="0.1.0")
+from shared import metrics, startup
+
+# Batch items are processed in chunks; each chunk is one task in the pool.
+# Every gunicorn worker has its own pool, so by default the CPUs are split
+# between the WEB_CONCURRENCY workers (see shared/gunicorn_conf.py).
+BATCH_CHUNK_SIZE = int(os.environ.get("LANGUAGE_CONTEXT_BATCH_CHUNK", 256))
+BATCH_WORKERS = int(os.environ.get(
+    "LANGUAGE_CONTEXT_WORKERS",
+    max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get("WEB_CONCURRENCY", 2))))))
+
+# A batch item is an instruction to process, an error entry for it, or a
+# raw NDJSON line, decoded into one of those where the chunk is processed.
+BatchItem = Union[str, Dict[str, str], bytes]
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """Process pool for batch chunks, created on first use; None when single-worker."""
+    global _pool
+    if _pool is None and BATCH_WORKERS > 1:
+        _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+    return _pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start()
+    yield
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+
+
+app = FastAPI(title="Language Context Extraction", version="0.1.0", lifespan=lifespan)
+metrics.instrument_fastapi(app)
 
 class Instruction(BaseModel):
     instruction: str
@@ -54,30 +93,107 @@ NETWORKING = {
 
 CI_CD = ["github actions", "gitlab ci", "circleci", "argo", "argo cd", "flux", "jenkins", "travis"]
 
-def find_keys(text: str, mapping: Dict[str, List[str]]) -> List[str]:
-    res = []
-    t = text.lower()
-    for key, kws in mapping.items():
-        if any(re.search(r"\b" + re.escape(kw) + r"\b", t) for kw in kws):
-            res.append(key)
-    return sorted(set(res))
+_WORD_CHAR = re.compile(r"\w")
 
-def find_list(text: str, kws: List[str]) -> List[str]:
-    t = text.lower()
-    return sorted(set([kw for kw in kws if re.search(r"\b" + re.escape(kw) + r"\b", t)]))
 
-@app.post("/extract")
-def extract(inst: Instruction):
-    t = inst.instruction.strip()
-    providers = find_keys(t, CLOUD_KEYWORDS) or ["unspecified"]
-    targets = find_keys(t, DEPLOYMENT_TARGETS)
-    dbs = find_keys(t, DATABASES)
-    storage = find_keys(t, STORAGE)
-    networking = find_keys(t, NETWORKING)
-    cicd = find_list(t, CI_CD)
+def _word_boundary(s: str, i: int) -> bool:
+    """Whether ``\\b`` holds between ``s[i - 1]`` and ``s[i]``."""
+    return bool(_WORD_CHAR.match(s[i - 1])) != bool(_WORD_CHAR.match(s[i]))
+
+
+def _trie_regex(words: List[str]) -> str:
+    """Regex alternation of ``words`` factored by common prefixes."""
+    trie: Dict[str, dict] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, dict]) -> str:
+        ends = "" in node
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends:
+            return "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+class KeywordMatcher:
+    """All keyword tables compiled into one regex, matched in a single scan.
 
-    regions = re.findall(r"\b([a-z]{2}-[a-z]+-[0-9])\b", t, flags=re.IGNORECASE)  # e.g., us-east-1
-    scaling = "auto" if re.search(r"\bauto-?scal", t, re.I) else ("manual" if "scale" in t.lower() else "unspecified")
+    The alternation is factored into a prefix trie (so each position costs
+    the length of a keyword, not the number of keywords) and wrapped in a
+    lookahead so every start position is tried. Optional suffixes are
+    greedy, so the longest keyword at a position wins; shorter keywords
+    that are a word-bounded prefix of it (``argo`` in ``argo cd``) are
+    implied by the longer match. Results are therefore the same as
+    searching each keyword on its own.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, List[str]]]):
+        self.tables = list(tables)
+        self.hits_by_kw: Dict[str, List[Tuple[str, str]]] = {}
+        for table, mapping in tables.items():
+            for key, kws in mapping.items():
+                for kw in kws:
+                    self.hits_by_kw.setdefault(kw, []).append((table, key))
+        kws = sorted(self.hits_by_kw, key=len, reverse=True)
+        self.implied: Dict[str, List[str]] = {
+            kw: [p for p in kws if p != kw and kw.startswith(p) and _word_boundary(kw, len(p))]
+            for kw in kws
+        }
+        self.pattern = re.compile(r"(?=\b(" + _trie_regex(kws) + r")\b)")
+
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        """Sorted matching keys per table for an already lowercased text."""
+        found = set()
+        for m in self.pattern.finditer(text):
+            kw = m.group(1)
+            if kw in found:
+                continue
+            found.add(kw)
+            found.update(self.implied[kw])
+        res: Dict[str, set] = {table: set() for table in self.tables}
+        for kw in found:
+            for table, key in self.hits_by_kw[kw]:
+                res[table].add(key)
+        return {table: sorted(keys) for table, keys in res.items()}
+
+
+KEYWORDS = KeywordMatcher({
+    "cloud_provider": CLOUD_KEYWORDS,
+    "deployment_targets": DEPLOYMENT_TARGETS,
+    "databases": DATABASES,
+    "storage": STORAGE,
+    "networking": NETWORKING,
+    "ci_cd": {kw: [kw] for kw in CI_CD},
+})
+
+REGION_RE = re.compile(r"\b([a-z]{2}-[a-z]+-[0-9])\b", re.I)  # e.g., us-east-1
+AUTOSCALE_RE = re.compile(r"\bauto-?scal", re.I)
+COST_RE = re.compile(r"\bcost|budget|cheap|low\s*cost\b", re.I)
+HA_RE = re.compile(r"\bha|high\s*availability|multi-az|multi region|multi-region\b", re.I)
+COMPLIANCE_RE = re.compile(r"\b(gdpr|hipaa|pci(?:-dss)?)\b", re.I)
+
+def extract_context(instruction: str) -> Dict[str, Any]:
+    """Deployment context extracted from a free-text instruction."""
+    t = instruction.strip()
+    lowered = t.lower()
+    hits = KEYWORDS.scan(lowered)
+    providers = hits["cloud_provider"] or ["unspecified"]
+    targets = hits["deployment_targets"]
+    dbs = hits["databases"]
+    storage = hits["storage"]
+    networking = hits["networking"]
+    cicd = hits["ci_cd"]
+
+    regions = REGION_RE.findall(t)
+    scaling = "auto" if AUTOSCALE_RE.search(t) else ("manual" if "scale" in lowered else "unspecified")
 
     result = {
         "cloud_provider": providers,
@@ -94,9 +210,9 @@ def extract(inst: Instruction):
         "regions": regions or None,
         "scaling": scaling,
         "runtime_constraints": {
-            "cost_optimized": bool(re.search(r"\bcost|budget|cheap|low\s*cost\b", t, re.I)),
-            "high_availability": bool(re.search(r"\bha|high\s*availability|multi-az|multi region|multi-region\b", t, re.I)),
-            "compliance": [m.group(0).lower() for m in re.finditer(r"\b(gdpr|hipaa|pci(?:-dss)?)\b", t, re.I)],
+            "cost_optimized": bool(COST_RE.search(t)),
+            "high_availability": bool(HA_RE.search(t)),
+            "compliance": [m.group(0).lower() for m in COMPLIANCE_RE.finditer(t)],
         },
         "additional_context": {
             "raw_instruction": t
@@ -105,6 +221,207 @@ def extract(inst: Instruction):
     return result
 
 
+def extract_lines(items: List[BatchItem]) -> str:
+    """NDJSON lines for a chunk of batch items; error dicts are echoed as-is.
+
+    Raw NDJSON lines are decoded and results serialized here, in the
+    worker, so only bytes and one string per chunk cross the process
+    boundary.
+    """
+    out = []
+    for item in items:
+        if isinstance(item, bytes):
+            item = _decode_line(item)
+        out.append(json.dumps(item if isinstance(item, dict) else extract_context(item)))
+        out.append("\n")
+    return "".join(out)
+
+
+def _batch_item(obj: Any) -> BatchItem:
+    """The instruction of a decoded batch item, or an error entry for it.
+
+    A plain type check stands in for validating each item as an
+    ``Instruction`` model, which would dominate the cost of small items.
+    """
+    if isinstance(obj, dict) and isinstance(obj.get("instruction"), str):
+        return obj["instruction"]
+    return {"error": "item must be an object with a string 'instruction' field"}
+
+
+def _decode_line(line: bytes) -> BatchItem:
+    try:
+        return _batch_item(json.loads(line))
+    except ValueError:
+        return {"error": "line is not valid JSON"}
+
+
+_JSON_WS = re.compile(r"[ \t\n\r]*")
+
+
+def _array_items(body: bytes) -> Optional[List[BatchItem]]:
+    """The items of a JSON array body, or None if it is not one.
+
+    Run in a thread. Items are decoded one at a time rather than with a
+    single ``json.loads``, so the event loop gets the GIL back in between.
+    """
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    decoder = json.JSONDecoder()
+    pos = _JSON_WS.match(text).end()
+    if text[pos:pos + 1] != "[":
+        return None
+    items: List[BatchItem] = []
+    pos = _JSON_WS.match(text, pos + 1).end()
+    if text[pos:pos + 1] == "]":
+        pos = _JSON_WS.match(text, pos + 1).end()
+    else:
+        while True:
+            try:
+                obj, pos = decoder.raw_decode(text, pos)
+            except ValueError:
+                return None
+            items.append(_batch_item(obj))
+            pos = _JSON_WS.match(text, pos).end()
+            sep = text[pos:pos + 1]
+            pos = _JSON_WS.match(text, pos + 1).end()
+            if sep == "]":
+                break
+            if sep != ",":
+                return None
+    return items if pos == len(text) else None
+
+
+async def _batch_items(request: Request) -> AsyncIterator[BatchItem]:
+    """The items of a JSON array body, or the raw lines of an NDJSON body as they arrive.
+
+    Nothing is decoded on the event loop: a JSON array is parsed in a
+    thread once it has been received, and NDJSON lines are only split
+    here and decoded with the rest of their chunk.
+    """
+    stream = request.stream()
+    buf = b""
+    async for chunk in stream:
+        buf += chunk
+        if buf.strip():
+            break
+
+    if buf.lstrip().startswith(b"["):
+        parts = [buf]
+        async for chunk in stream:
+            parts.append(chunk)
+        items = await asyncio.to_thread(_array_items, b"".join(parts))
+        if items is None:
+            yield {"error": "body is not a valid JSON array"}
+            return
+        for item in items:
+            yield item
+        return
+
+    *lines, buf = buf.split(b"\n")
+    for line in lines:
+        if line.strip():
+            yield line
+    async for chunk in stream:
+        *lines, buf = (buf + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buf.strip():
+        yield buf
+
+
+async def _batch_results(request: Request, body_read: asyncio.Event) -> AsyncIterator[str]:
+    """Yield the NDJSON results of a batch body, chunk by chunk in input order.
+
+    Full chunks go to the process pool, and the tail (or every chunk, with
+    no pool) to a thread: never onto the event loop. A chunk's results are
+    yielded as soon as it and those before it are done, while the body is
+    still being received; at most two chunks per worker are in flight, so
+    a client that stops reading stops the body from being read too.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    pending: Deque[asyncio.Future] = deque()
+    chunk: List[BatchItem] = []
+    try:
+        async for item in _batch_items(request):
+            chunk.append(item)
+            if len(chunk) == BATCH_CHUNK_SIZE:
+                pending.append(loop.run_in_executor(pool, extract_lines, chunk))
+                chunk = []
+                while pending and (pending[0].done() or len(pending) > 2 * max(BATCH_WORKERS, 1)):
+                    yield await pending.popleft()
+        if chunk:
+            # The tail (or a whole small batch) is cheaper in a thread than a round trip to the pool.
+            pending.append(loop.run_in_executor(None, extract_lines, chunk))
+    finally:
+        body_read.set()
+    while pending:
+        yield await pending.popleft()
+
+
+class _BatchResponse(StreamingResponse):
+    """A streaming response sent while its request body is still being read.
+
+    StreamingResponse listens for a disconnect on ``receive`` from the
+    start, which would swallow the body's messages; this one only listens
+    once ``body_read`` is set. Until then a disconnect ends the body.
+    """
+
+    def __init__(self, content: AsyncIterator[str], body_read: asyncio.Event, **kwargs):
+        super().__init__(content, **kwargs)
+        self.body_read = body_read
+
+    async def __call__(self, scope, receive, send) -> None:
+        async with anyio.create_task_group() as task_group:
+            async def wrap(func) -> None:
+                await func()
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(wrap, partial(self.stream_response, send))
+            await self.body_read.wait()
+            await wrap(partial(self.listen_for_disconnect, receive))
+
+
+@startup.warmup("extract")
+def warm_extract():
+    extract_lines(["Deploy containers on aws eks with postgres, redis and s3 in us-east-1, autoscaling."])
+
+
+# --- FastAPI Endpoints ---
+
+@app.post("/extract")
+def extract(inst: Instruction):
+    with metrics.stage("extract"):
+        return extract_context(inst.instruction)
+
+
+@app.post("/extract/batch")
+async def extract_batch(request: Request):
+    """Extract many instructions in one request.
+
+    Accepts a JSON array or an NDJSON stream of ``Instruction`` objects and
+    streams back one NDJSON result per input item, in input order. Chunks
+    are extracted off the event loop while the body is still being
+    received, and each is sent as soon as it completes.
+    """
+    body_read = asyncio.Event()
+    return _BatchResponse(_batch_results(request, body_read), body_read, media_type="application/x-ndjson")
+
+
+@app.get('/ready')
+async def get_ready():
+    status = startup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get('/metrics')
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get('/')
 async def index():
     return {"message": "Codebase Context Extraction Service is running."}
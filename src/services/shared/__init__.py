@@ -0,0 +1 @@
+"""Modules shared by the Python services; copied into each image under ``/app/shared``."""
@@ -0,0 +1,162 @@
+"""In-memory ZIP assembly for generated artifacts.
+
+Generated files are strings, so they are written straight into ZIP
+entries with ``writestr`` instead of round-tripping through a temporary
+directory. The archive is written either to a file object (such as the
+final output path) or to an internal sink whose bytes can be drained
+piece by piece into a streaming HTTP response.
+
+Members of an existing archive can be bundled in as well. Those are
+copied as raw compressed bytes, located through the source's central
+directory, so bundling a large project costs about as much as copying it.
+"""
+from typing import BinaryIO, Container, Iterator, Optional, Union
+import io, struct, zipfile
+
+# Entries smaller than this are stored: deflating them saves a few bytes
+# at a comparatively high CPU cost.
+SMALL_FILE_THRESHOLD = 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+_DATA_DESCRIPTOR_FLAG = 0x08
+_ZIP64_EXTRA_ID = 0x0001
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only, unseekable sink collecting bytes until drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    """Drop the ZIP64 extra field; ``ZipInfo.FileHeader`` writes its own."""
+    kept, i = [], 0
+    while i + 4 <= len(extra):
+        field_id, size = struct.unpack("<HH", extra[i:i + 4])
+        if field_id != _ZIP64_EXTRA_ID:
+            kept.append(extra[i:i + 4 + size])
+        i += 4 + size
+    return b"".join(kept)
+
+
+def _raw_copy_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    """Metadata for re-emitting ``info`` with its compressed bytes unchanged.
+
+    CRC and sizes are known from the central directory, so they go into the
+    new local header and the data descriptor flag is cleared.
+    """
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    for attr in ("compress_type", "comment", "create_system", "create_version",
+                 "extract_version", "internal_attr", "external_attr",
+                 "CRC", "compress_size", "file_size"):
+        setattr(zinfo, attr, getattr(info, attr))
+    zinfo.flag_bits = info.flag_bits & ~_DATA_DESCRIPTOR_FLAG
+    zinfo.extra = _strip_zip64_extra(info.extra)
+    return zinfo
+
+
+class ArtifactBuilder:
+    """Builds a ZIP archive entry by entry, without touching the filesystem.
+
+    With ``fileobj`` the archive goes there; otherwise it is collected in
+    memory and handed out by ``drain``/``close``. Each entry is stored or
+    deflated depending on its size unless ``compress_type`` is given.
+    """
+
+    def __init__(self, fileobj: Optional[BinaryIO] = None,
+                 small_file_threshold: int = SMALL_FILE_THRESHOLD):
+        self._sink = ChunkSink() if fileobj is None else None
+        self._zip = zipfile.ZipFile(fileobj if fileobj is not None else self._sink, "w")
+        self.small_file_threshold = small_file_threshold
+        self.names = []
+        self.uncompressed_bytes = 0
+
+    def add(self, name: str, data: Union[str, bytes], compress_type: Optional[int] = None) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if compress_type is None:
+            compress_type = zipfile.ZIP_STORED if len(data) < self.small_file_threshold else zipfile.ZIP_DEFLATED
+        self._zip.writestr(name, data, compress_type=compress_type)
+        self.names.append(name)
+        self.uncompressed_bytes += len(data)
+
+    def add_raw(self, source: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+        """Copy member ``info`` of ``source`` without decompressing it."""
+        src = source.fp
+        src.seek(info.header_offset)
+        header = src.read(zipfile.sizeFileHeader)
+        if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad local file header for {info.filename!r}")
+        fields = struct.unpack(zipfile.structFileHeader, header)
+        src.seek(fields[10] + fields[11], io.SEEK_CUR)  # filename, extra
+
+        zinfo = _raw_copy_info(info)
+        zf = self._zip
+        zinfo.header_offset = zf.fp.tell()
+        zf.fp.write(zinfo.FileHeader(None))
+        remaining = info.compress_size
+        while remaining:
+            chunk = src.read(min(remaining, COPY_CHUNK_SIZE))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated data for {info.filename!r}")
+            zf.fp.write(chunk)
+            remaining -= len(chunk)
+        # Register the entry the way ZipFile.writestr would, so the central
+        # directory written on close includes it.
+        zf.start_dir = zf.fp.tell()
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+        zf._didModify = True
+        self.names.append(zinfo.filename)
+        self.uncompressed_bytes += zinfo.file_size
+
+    def iter_copy(self, source: zipfile.ZipFile, skip: Container[str] = ()) -> Iterator[bytes]:
+        """Raw-copy every member of ``source`` not named in ``skip``, yielding
+        the archive bytes produced after each one (empty with ``fileobj``)."""
+        for info in source.infolist():
+            if info.filename not in skip:
+                self.add_raw(source, info)
+                yield self.drain()
+
+    def drain(self) -> bytes:
+        """Archive bytes produced since the last drain (in-memory mode only)."""
+        return self._sink.drain() if self._sink is not None else b""
+
+    def close(self) -> bytes:
+        """Write the central directory and return the remaining bytes."""
+        self._zip.close()
+        return self.drain()
+
+    def __enter__(self) -> "ArtifactBuilder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._zip.close()
+
+
+def iter_archive(files, small_file_threshold: int = SMALL_FILE_THRESHOLD,
+                 bundle: Optional[zipfile.ZipFile] = None) -> Iterator[bytes]:
+    """Yield a ZIP of ``(name, data)`` pairs one entry at a time, for streaming responses.
+
+    Members of ``bundle`` are raw-copied after the files, except those whose
+    names were already written.
+    """
+    builder = ArtifactBuilder(small_file_threshold=small_file_threshold)
+    for name, data in files:
+        builder.add(name, data)
+        yield builder.drain()
+    if bundle is not None:
+        yield from builder.iter_copy(bundle, skip=set(builder.names))
+    yield builder.close()
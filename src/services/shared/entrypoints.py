@@ -0,0 +1,133 @@
+"""Entry points and listening ports, found by static analysis of source files.
+
+Which file starts a service and which port it binds are read off the
+source with a few compiled patterns instead of being guessed from file
+names: a ``__main__`` guard or Go's ``func main()``, a module-level
+ASGI/WSGI app object, ``app.run(port=...)``, ``.listen(...)``,
+``http.ListenAndServe(":...")``, ``PORT`` defaults and start scripts.
+Nothing is imported or executed. The patterns of Python, JavaScript and
+Go do not collide, so they all run over every file and a file's result
+depends on its contents alone: it can be memoized on a content key.
+
+Only likely entry files are worth reading at all: ``CANDIDATE_NAMES``
+are the usual names of a Python, Node or Go entry point. Callers without
+a read cap of their own read at most ``ENTRYPOINT_SCAN_FILE_BYTES`` of
+each (``MAX_FILE_BYTES``).
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NamedTuple, Tuple
+import hashlib, os, re, threading
+
+MAX_FILE_BYTES = int(os.environ.get("ENTRYPOINT_SCAN_FILE_BYTES", 256 * 1024))
+
+CANDIDATE_NAMES = (
+    "main.py", "app.py", "server.py", "run.py", "wsgi.py", "asgi.py", "manage.py", "__main__.py",
+    "package.json",
+    *(base + ext for base in ("server", "index", "app", "main") for ext in (".js", ".mjs", ".cjs", ".ts")),
+    "main.go", "server.go",
+)
+
+class Finding(NamedTuple):
+    # What starts the service, strongest first: "main" (a __main__ guard or
+    # func main), "asgi"/"wsgi" (an app object), "script" (a package.json
+    # start script), "server" (JavaScript listening); "" for none.
+    kind: str
+    app: str                # module attribute holding the ASGI/WSGI app, "" if none
+    ports: Tuple[int, ...]  # ports bound, in order of appearance
+
+
+NOTHING = Finding("", "", ())
+
+# A ``__main__`` guard, or Go's main function.
+_MAIN_RE = re.compile(r"""^if\s+__name__\s*==\s*['"]__main__['"]\s*:|^func\s+main\s*\(\s*\)""", re.M)
+# A module-level app object: ``app = FastAPI(...)``, ``app: Flask = Flask(__name__)``.
+_APP_RE = re.compile(r"^([A-Za-z_]\w*)\s*(?::\s*[\w.]+\s*)?=\s*(?:[\w.]+\.)?(FastAPI|Starlette|Quart|Flask)\(", re.M)
+_APP_KIND = {"FastAPI": "asgi", "Starlette": "asgi", "Quart": "asgi", "Flask": "wsgi"}
+# A package.json start script.
+_SCRIPT_RE = re.compile(r'"start"\s*:\s*"')
+_SERVER_RE = re.compile(r"\.listen\(|\bcreateServer\(")
+
+_PORT_RES = tuple(re.compile(p, re.M) for p in (
+    # app.run(port=5000), uvicorn.run(app, port=8000), web.run_app(app, port=8080)
+    r"\brun(?:_app)?\([^)]*?\bport\s*=\s*(\d{2,5})\b",
+    # A default for PORT from the environment: os.environ.get("PORT", 5000), process.env.PORT || 3000
+    r"""\bPORT['"]?\s*(?:,|\|\||\?\?)\s*['"]?(\d{2,5})\b""",
+    # server.listen(3000)
+    r"\.listen\(\s*(\d{2,5})\b",
+    # http.ListenAndServe(":8080", nil), router.Run(":8080"), net.Listen("tcp", ":8080")
+    r"""\b(?:ListenAndServe(?:TLS)?|Run|Start|Listen)\(\s*(?:"tcp"\s*,\s*)?"[\w.\-]*:(\d{2,5})\"""",
+    # port = 8080, const PORT = 3000, addr := ":8080", at the start of a line
+    r"""^[^\S\n]*(?:(?:const|let|var)\s+)?(?i:port|addr)\s*(?::=|=)\s*['"]?:?(\d{2,5})\b""",
+    # Start scripts and commands: next start -p 4000, --port=8000, PORT=3000 node server.js
+    r"(?:--port|\s-p)[= ](\d{2,5})\b",
+    r"\bPORT=(\d{2,5})\b",
+))
+
+
+def scan(text: str) -> Finding:
+    """What ``text``, a source file or package.json, starts and the ports it binds."""
+    # Position of each port's first mention, so they come out in file order.
+    ports: Dict[int, int] = {}
+    for regex in _PORT_RES:
+        for match in regex.finditer(text):
+            port = int(match.group(1))
+            if 0 < port < 65536 and match.start(1) < ports.get(port, len(text)):
+                ports[port] = match.start(1)
+    app = _APP_RE.search(text)
+    if _MAIN_RE.search(text):
+        kind = "main"
+    elif app:
+        kind = _APP_KIND[app.group(2)]
+    elif _SCRIPT_RE.search(text):
+        kind = "script"
+    elif _SERVER_RE.search(text):
+        kind = "server"
+    else:
+        kind = ""
+    return Finding(kind, app.group(1) if app else "", tuple(sorted(ports, key=ports.get)))
+
+
+def decode(data: bytes, truncated: bool = False) -> str:
+    """UTF-8 text of a file read up to the byte cap; a truncated one loses its partial last line."""
+    text = data.decode("utf-8", "ignore")
+    return text[:text.rfind("\n") + 1] if truncated else text
+
+
+class FindingCache:
+    """Bounded LRU of findings by SHA-256 of the bytes read, shared by request threads.
+
+    Keys are digests of a file's contents up to the byte cap, so a file
+    already seen in an earlier upload is decompressed again but not
+    parsed again. Metadata such as an archive member's CRC32 and size is
+    not used: it is supplied by the uploader and can collide.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Finding]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, data: bytes, truncated: bool = False) -> Finding:
+        """The finding for ``data``, read up to the byte cap, scanning it on a miss."""
+        key = (hashlib.sha256(data).digest(), truncated)
+        with self._lock:
+            finding = self._entries.get(key)
+            if finding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return finding
+            self.misses += 1
+        finding = scan(decode(data, truncated))
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = finding
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return finding
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "max_entries": self.max_entries,
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,30 @@
+"""Gunicorn settings shared by the services: ``gunicorn -c python:shared.gunicorn_conf``.
+
+The app is imported once in the master and warmed there (see
+``shared.startup``) before any worker is forked, so workers share its
+imported modules and prebuilt tables copy-on-write instead of each
+building their own, and a replacement worker is serving within
+milliseconds. Each worker then runs the app's ``after_fork`` hooks.
+Worker count comes from ``WEB_CONCURRENCY``; anything else can still be
+given on the command line.
+"""
+import gc, os
+
+from shared import metrics, startup
+
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+
+def when_ready(server):
+    startup.warm()
+    # Samples recorded by the warm-up would otherwise be reported by every worker.
+    metrics.REGISTRY.clear()
+    # Objects built so far live for the life of the process; keeping them out
+    # of the collector spares their pages the writes a collection would make.
+    gc.freeze()
+    server.log.info("Warmed up before fork: %s", startup.status()["warmup_ms"])
+
+
+def post_worker_init(worker):
+    startup.start(background=False)
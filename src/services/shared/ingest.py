@@ -0,0 +1,175 @@
+"""Bounded ingestion of uploaded ZIP archives.
+
+Every check runs on metadata, before anything is decompressed: the
+end-of-central-directory record is read first, so an archive claiming
+too many entries or too big a directory is refused without reading it,
+and each central directory entry is then checked as it is listed:
+
+* path safety: absolute paths, drive letters, ``..`` segments and NULs
+  are rejected;
+* caps on the number of entries, on each file's and on the total
+  uncompressed size, and on the compression ratio of large entries;
+* vendored trees (``node_modules/``, ``.git/``, ...) are skipped, so
+  they neither count against the byte caps nor reach the service.
+
+The first violation raises ``ZipRejected``, which carries a stable error
+code and the numbers involved for the HTTP response. The sizes checked
+are those the central directory declares; zipfile (and readers built on
+the same records) never return more than the declared size of a member,
+so the caps also bound what a request can decompress.
+"""
+from typing import Any, BinaryIO, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+import os, posixpath, re, zipfile
+
+DEFAULT_SKIP_DIRS = frozenset({"node_modules", ".git", "venv", ".venv"})
+# Largest central directory record: the fixed part and three 64 KiB fields.
+_MAX_ENTRY_BYTES = zipfile.sizeCentralDir + 3 * 0xFFFF
+_DRIVE_RE = re.compile(r"^[A-Za-z]:")
+
+
+class ZipRejected(Exception):
+    """An archive refused by ingestion, with a machine-readable reason.
+
+    ``status`` is the HTTP status to answer with: 413 when a cap was
+    exceeded, 400 for archives that are malformed or unsafe.
+    """
+
+    def __init__(self, code: str, message: str, status: int = 413, **detail: Any):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.detail = detail
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"error": self.code, "message": self.message, **self.detail}
+
+
+class ZipLimits(NamedTuple):
+    max_archive_bytes: int = 512 * 1024 * 1024
+    max_entries: int = 500_000
+    max_file_bytes: int = 512 * 1024 * 1024
+    max_total_bytes: int = 2 * 1024 * 1024 * 1024
+    max_ratio: float = 200.0
+    # Smaller entries are exempt from the ratio check: short, repetitive
+    # text files legitimately compress very well.
+    ratio_min_bytes: int = 1024 * 1024
+    skip_dirs: FrozenSet[str] = DEFAULT_SKIP_DIRS
+
+    @classmethod
+    def from_env(cls) -> "ZipLimits":
+        """Limits from ``ZIP_MAX_*`` variables, ``ZIP_RATIO_MIN_BYTES`` and ``ZIP_SKIP_DIRS``."""
+        default = cls()
+        skip = os.environ.get("ZIP_SKIP_DIRS")
+        return cls(
+            max_archive_bytes=int(os.environ.get("ZIP_MAX_ARCHIVE_BYTES", default.max_archive_bytes)),
+            max_entries=int(os.environ.get("ZIP_MAX_ENTRIES", default.max_entries)),
+            max_file_bytes=int(os.environ.get("ZIP_MAX_FILE_BYTES", default.max_file_bytes)),
+            max_total_bytes=int(os.environ.get("ZIP_MAX_TOTAL_BYTES", default.max_total_bytes)),
+            max_ratio=float(os.environ.get("ZIP_MAX_RATIO", default.max_ratio)),
+            ratio_min_bytes=int(os.environ.get("ZIP_RATIO_MIN_BYTES", default.ratio_min_bytes)),
+            skip_dirs=(frozenset(d.strip() for d in skip.split(",") if d.strip())
+                       if skip is not None else default.skip_dirs),
+        )
+
+
+def unsafe_reason(name: str) -> Optional[str]:
+    """Why a member name may not be used as a relative path, or None if it can."""
+    if "\x00" in name:
+        return "contains a NUL byte"
+    path = name.replace("\\", "/")
+    if path.startswith("/") or _DRIVE_RE.match(path):
+        return "is absolute"
+    if ".." in path.split("/"):
+        return "leaves the archive root"
+    return None
+
+
+class ZipGuard:
+    """Checks one archive's central directory against ``ZipLimits``, entry by entry."""
+
+    def __init__(self, limits: ZipLimits):
+        self.limits = limits
+        self.entries = 0
+        self.kept = 0
+        self.skipped = 0
+        self.total_bytes = 0
+
+    def check_archive(self, fp: BinaryIO) -> Tuple[int, int]:
+        """Check the archive's size and end record; returns ``(entries, directory bytes)``.
+
+        Raises ZipRejected before the central directory is read if the
+        archive declares more entries than allowed.
+        """
+        fp.seek(0, os.SEEK_END)
+        size = fp.tell()
+        if size > self.limits.max_archive_bytes:
+            raise ZipRejected("archive_too_large", "The archive is too large",
+                              limit=self.limits.max_archive_bytes, actual=size)
+        try:
+            endrec = zipfile._EndRecData(fp)
+        except OSError:
+            endrec = None
+        if not endrec:
+            raise ZipRejected("invalid_archive", "The upload is not a valid ZIP archive", status=400)
+        entries, directory = endrec[zipfile._ECD_ENTRIES_TOTAL], endrec[zipfile._ECD_SIZE]
+        # A directory bigger than that many maximal records cannot be honest either.
+        if entries > self.limits.max_entries or directory > self.limits.max_entries * _MAX_ENTRY_BYTES:
+            raise ZipRejected("too_many_entries", "The archive has too many entries",
+                              limit=self.limits.max_entries, actual=entries)
+        return entries, directory
+
+    def admit(self, name: str, file_size: int, compress_size: int) -> bool:
+        """Check one entry; False if it is to be left out (a directory or vendored tree)."""
+        limits = self.limits
+        self.entries += 1
+        if self.entries > limits.max_entries:
+            raise ZipRejected("too_many_entries", "The archive has too many entries",
+                              limit=limits.max_entries, actual=self.entries)
+        reason = unsafe_reason(name)
+        if reason is not None:
+            raise ZipRejected("unsafe_path", f"Entry name {reason}", status=400, entry=name)
+        if name.endswith("/") or self.vendored(name):
+            self.skipped += 1
+            return False
+        if file_size > limits.max_file_bytes:
+            raise ZipRejected("entry_too_large", "An entry is too large when uncompressed",
+                              entry=name, limit=limits.max_file_bytes, actual=file_size)
+        if file_size >= limits.ratio_min_bytes and file_size > limits.max_ratio * max(compress_size, 1):
+            raise ZipRejected("compression_ratio", "An entry is compressed suspiciously well",
+                              entry=name, limit=limits.max_ratio,
+                              actual=round(file_size / max(compress_size, 1), 1))
+        self.total_bytes += file_size
+        if self.total_bytes > limits.max_total_bytes:
+            raise ZipRejected("total_too_large", "The archive is too large when uncompressed",
+                              limit=limits.max_total_bytes, actual=self.total_bytes)
+        self.kept += 1
+        return True
+
+    def vendored(self, name: str) -> bool:
+        skip = self.limits.skip_dirs
+        return bool(skip) and any(part in skip for part in posixpath.dirname(name).split("/"))
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": self.entries, "kept": self.kept, "skipped": self.skipped,
+                "total_bytes": self.total_bytes}
+
+
+def open_zip(fp: BinaryIO, limits: ZipLimits) -> Tuple[zipfile.ZipFile, List[zipfile.ZipInfo], ZipGuard]:
+    """Open an uploaded archive after checking it; returns the archive, its admitted files and the guard.
+
+    The end record is checked before zipfile reads the central directory,
+    and every entry before any member is opened.
+    """
+    guard = ZipGuard(limits)
+    guard.check_archive(fp)
+    try:
+        z = zipfile.ZipFile(fp)
+    except (zipfile.BadZipFile, OSError):
+        raise ZipRejected("invalid_archive", "The upload is not a valid ZIP archive", status=400)
+    try:
+        infos = [info for info in z.infolist() if guard.admit(info.filename, info.file_size, info.compress_size)]
+    except ZipRejected:
+        z.close()
+        raise
+    return z, infos, guard
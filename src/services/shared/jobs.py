@@ -0,0 +1,419 @@
+"""Background job queue for the long-running model stages.
+
+A client submits work and gets a job id back at once, instead of holding
+an HTTP connection open for the minutes a model call can take. Each named
+stage has its own pool of worker threads and a bound on queued jobs; past
+it, submissions are refused with ``QueueFull`` so callers back off rather
+than pile up. Every job records an ordered list of events (``queued``,
+``started``, ``progress``, then ``succeeded`` or ``failed``) that clients
+can poll or follow as a stream.
+
+Jobs live in memory by default. With a path they are kept in SQLite,
+where they survive restarts and are shared by all worker processes of a
+service: running jobs hold a lease that their process keeps renewing, and
+a job whose lease lapses (its process died) is picked up again.
+"""
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import asyncio, json, logging, math, os, sqlite3, threading, time, uuid
+
+TERMINAL = frozenset({"succeeded", "failed"})
+
+
+class QueueFull(Exception):
+    """A stage has as many queued jobs as it accepts."""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"Job queue for {stage!r} is full")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    """A job event as a server-sent event; ``None`` gives a keep-alive comment."""
+    if event is None:
+        return ": keep-alive\n\n"
+    return "id: %d\nevent: %s\ndata: %s\n\n" % (event["seq"], event["type"], json.dumps(event))
+
+
+# --- Stores ---
+
+class MemoryJobStore:
+    """Jobs and events in process memory; callers hold the queue's lock."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._payloads: Dict[str, Any] = {}
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        self._queued: Dict[str, deque] = {}
+
+    def create(self, job_id: str, stage: str, payload: Any, now: float) -> None:
+        self._jobs[job_id] = {"id": job_id, "stage": stage, "status": "queued", "attempts": 0,
+                              "created": now, "started": None, "finished": None,
+                              "result": None, "error": None}
+        self._payloads[job_id] = payload
+        self._events[job_id] = []
+        self._queued.setdefault(stage, deque()).append(job_id)
+
+    def claim(self, stage: str, now: float, lease: float, max_attempts: int) -> Optional[Tuple[str, Any]]:
+        queue = self._queued.get(stage)
+        if not queue:
+            return None
+        job_id = queue.popleft()
+        job = self._jobs[job_id]
+        job.update(status="running", started=now, attempts=job["attempts"] + 1)
+        return job_id, self._payloads[job_id]
+
+    def renew(self, job_ids: List[str], until: float) -> None:
+        pass
+
+    def finish(self, job_id: str, status: str, result: Any, error: Optional[str], now: float) -> None:
+        self._jobs[job_id].update(status=status, result=result, error=error, finished=now)
+
+    def add_event(self, job_id: str, type: str, data: Dict[str, Any], now: float) -> None:
+        events = self._events[job_id]
+        events.append({"seq": len(events) + 1, "type": type, "time": now, "data": data})
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        return self._events.get(job_id, [])[after:]
+
+    def count(self, stage: str, status: str) -> int:
+        if status == "queued":
+            return len(self._queued.get(stage, ()))
+        return sum(1 for j in self._jobs.values() if j["stage"] == stage and j["status"] == status)
+
+    def purge(self, before: float) -> List[Tuple[str, Any]]:
+        expired = [j for j in self._jobs.values() if j["status"] in TERMINAL and j["finished"] < before]
+        for job in expired:
+            del self._jobs[job["id"]], self._events[job["id"]]
+        return [(job["stage"], self._payloads.pop(job["id"])) for job in expired]
+
+
+class SQLiteJobStore:
+    """Jobs and events in a SQLite database shared across processes."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._path = path
+        self._conn = self._connect()
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, stage TEXT NOT NULL, status TEXT NOT NULL, payload TEXT,"
+            " result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL,"
+            " started REAL, finished REAL, lease REAL);"
+            "CREATE INDEX IF NOT EXISTS jobs_by_stage ON jobs (stage, status, created);"
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            " job_id TEXT NOT NULL, seq INTEGER NOT NULL, type TEXT NOT NULL, data TEXT,"
+            " time REAL NOT NULL, PRIMARY KEY (job_id, seq));")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        self._pid = os.getpid()
+        return db
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Reopened in a process forked after the store was created.
+        if self._pid != os.getpid():
+            self._conn = self._connect()
+        return self._conn
+
+    def create(self, job_id, stage, payload, now):
+        self._db.execute("INSERT INTO jobs (id, stage, status, payload, created) VALUES (?, ?, 'queued', ?, ?)",
+                         (job_id, stage, json.dumps(payload), now))
+
+    def claim(self, stage, now, lease, max_attempts):
+        # Queued jobs, and running jobs whose process stopped renewing them.
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                "SELECT id, payload, attempts FROM jobs WHERE stage = ? AND"
+                " (status = 'queued' OR (status = 'running' AND lease < ?))"
+                " ORDER BY created LIMIT 1", (stage, now)).fetchone()
+            if row is None:
+                return None
+            job_id, payload, attempts = row
+            if attempts >= max_attempts:
+                error = "abandoned after %d attempts" % attempts
+                self._db.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                                 (error, now, job_id))
+                self.add_event(job_id, "failed", {"error": error}, now)
+                return None
+            self._db.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1,"
+                             " started = ?, lease = ? WHERE id = ?", (now, now + lease, job_id))
+            return job_id, json.loads(payload)
+        finally:
+            self._db.execute("COMMIT")
+
+    def renew(self, job_ids, until):
+        self._db.executemany("UPDATE jobs SET lease = ? WHERE id = ? AND status = 'running'",
+                             [(until, job_id) for job_id in job_ids])
+
+    def finish(self, job_id, status, result, error, now):
+        self._db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, lease = NULL"
+                         " WHERE id = ?", (status, json.dumps(result), error, now, job_id))
+
+    def add_event(self, job_id, type, data, now):
+        self._db.execute(
+            "INSERT INTO job_events SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM job_events WHERE job_id = ?",
+            (job_id, type, json.dumps(data), now, job_id))
+
+    def get(self, job_id):
+        row = self._db.execute(
+            "SELECT id, stage, status, attempts, created, started, finished, result, error"
+            " FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "stage", "status", "attempts", "created", "started", "finished", "result", "error")
+        job = dict(zip(keys, row))
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def events(self, job_id, after=0):
+        rows = self._db.execute("SELECT seq, type, time, data FROM job_events WHERE job_id = ? AND seq > ?"
+                                " ORDER BY seq", (job_id, after)).fetchall()
+        return [{"seq": seq, "type": type, "time": t, "data": json.loads(data)} for seq, type, t, data in rows]
+
+    def count(self, stage, status):
+        return self._db.execute("SELECT COUNT(*) FROM jobs WHERE stage = ? AND status = ?",
+                                (stage, status)).fetchone()[0]
+
+    def purge(self, before):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._db.execute("SELECT id, stage, payload FROM jobs WHERE status IN ('succeeded', 'failed')"
+                                    " AND finished < ?", (before,)).fetchall()
+            self._db.executemany("DELETE FROM job_events WHERE job_id = ?", [(r[0],) for r in rows])
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(r[0],) for r in rows])
+        finally:
+            self._db.execute("COMMIT")
+        return [(stage, json.loads(payload)) for _, stage, payload in rows]
+
+
+# --- Queue ---
+
+class Stage(NamedTuple):
+    name: str
+    handler: Callable
+    workers: int
+    max_queued: int
+    cleanup: Optional[Callable[[Any], None]]
+
+
+class JobContext:
+    """Handed to a stage handler: the job's id and a way to report progress."""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self.queue = queue
+        self.id = job_id
+
+    def progress(self, message: Optional[str] = None, **data: Any) -> None:
+        if message is not None:
+            data["message"] = message
+        self.queue._event(self.id, "progress", data)
+
+
+class JobQueue:
+    """Stages with per-stage worker pools over a shared job store.
+
+    Handlers take ``(payload, job)`` and return a JSON-serializable result;
+    ``job`` is a ``JobContext``. Coroutine handlers run on the event loop
+    passed to ``start``, so they can share that loop's clients.
+    """
+
+    def __init__(self, store=None, poll_interval: float = 0.5, lease: float = 60.0,
+                 retention: float = 24 * 3600, max_attempts: int = 3):
+        self.store = store if store is not None else MemoryJobStore()
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retention = retention
+        self.max_attempts = max_attempts
+        self.stages: Dict[str, Stage] = {}
+        self._cond = threading.Condition()
+        self._running: Dict[str, str] = {}
+        self._durations: Dict[str, float] = {}
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_purge = 0.0
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        """Build a queue from ``JOBS_DB_PATH`` (SQLite if set) and ``JOBS_RETENTION``."""
+        path = os.environ.get("JOBS_DB_PATH")
+        return cls(store=SQLiteJobStore(path) if path else None,
+                   retention=float(os.environ.get("JOBS_RETENTION", 24 * 3600)))
+
+    def stage(self, name: str, workers: int = 1, max_queued: int = 64,
+              cleanup: Optional[Callable[[Any], None]] = None):
+        """Register the decorated function as the handler of stage ``name``.
+
+        ``cleanup`` is called with a job's payload when the job is purged.
+        """
+        def register(handler):
+            self.stages[name] = Stage(name, handler, max(1, workers), max_queued, cleanup)
+            return handler
+        return register
+
+    # Lifecycle
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        if self._threads:
+            return
+        self._loop = loop
+        for stage in self.stages.values():
+            if asyncio.iscoroutinefunction(stage.handler) and loop is None:
+                raise ValueError(f"stage {stage.name!r} has a coroutine handler; start() needs a loop")
+            for i in range(stage.workers):
+                self._spawn(self._work, stage, name=f"job-{stage.name}-{i}")
+        self._spawn(self._keep_leases, name="job-leases")
+
+    def stop(self) -> None:
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _spawn(self, target, *args, name: str) -> None:
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    # Client side
+
+    def submit(self, stage: str, payload: Any) -> Dict[str, Any]:
+        """Queue a job and return its record; raises QueueFull or KeyError."""
+        spec = self.stages[stage]
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._cond:
+            self._purge(now)
+            queued = self.store.count(stage, "queued")
+            if queued >= spec.max_queued:
+                raise QueueFull(stage, self._retry_after(spec))
+            self.store.create(job_id, stage, payload, now)
+            self.store.add_event(job_id, "queued", {"position": queued + 1}, now)
+            self._cond.notify_all()
+            return self.store.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            return self.store.get(job_id)
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        with self._cond:
+            return self.store.events(job_id, after)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The job's record once it finished, or as it is when ``timeout`` runs out."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self.store.get(job_id)
+                if job is None or job["status"] in TERMINAL:
+                    return job
+                remaining = self.poll_interval if deadline is None else min(self.poll_interval, deadline - time.monotonic())
+                if remaining <= 0:
+                    return job
+                self._cond.wait(remaining)
+
+    def iter_events(self, job_id: str, after: int = 0, heartbeat: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """Yield the job's events as they happen, up to its final one.
+
+        ``None`` is yielded after ``heartbeat`` seconds without events, so a
+        streaming response can send a keep-alive.
+        """
+        idle_since = time.monotonic()
+        while True:
+            with self._cond:
+                events = self.store.events(job_id, after)
+                if not events:
+                    if self.store.get(job_id) is None:
+                        return
+                    self._cond.wait(self.poll_interval)
+                    events = self.store.events(job_id, after)
+            for event in events:
+                yield event
+                after = event["seq"]
+                if event["type"] in TERMINAL:
+                    return
+            if events:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= heartbeat:
+                idle_since = time.monotonic()
+                yield None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {name: {"workers": s.workers, "max_queued": s.max_queued,
+                           "queued": self.store.count(name, "queued"),
+                           "running": self.store.count(name, "running")}
+                    for name, s in self.stages.items()}
+
+    # Worker side
+
+    def _event(self, job_id: str, type: str, data: Dict[str, Any]) -> None:
+        with self._cond:
+            self.store.add_event(job_id, type, data, time.time())
+            self._cond.notify_all()
+
+    def _work(self, stage: Stage) -> None:
+        while not self._stopping.is_set():
+            with self._cond:
+                claimed = self.store.claim(stage.name, time.time(), self.lease, self.max_attempts)
+                if claimed is None:
+                    self._cond.wait(self.poll_interval)
+                    continue
+                job_id, payload = claimed
+                self._running[job_id] = stage.name
+            self._run(stage, job_id, payload)
+
+    def _run(self, stage: Stage, job_id: str, payload: Any) -> None:
+        self._event(job_id, "started", {})
+        started = time.monotonic()
+        try:
+            outcome = stage.handler(payload, JobContext(self, job_id))
+            if asyncio.iscoroutine(outcome):
+                outcome = asyncio.run_coroutine_threadsafe(outcome, self._loop).result()
+        except Exception as e:
+            logging.exception("Job %s (%s) failed", job_id, stage.name)
+            status, result, error = "failed", None, str(e) or type(e).__name__
+        else:
+            status, result, error = "succeeded", outcome, None
+        elapsed = time.monotonic() - started
+        with self._cond:
+            now = time.time()
+            self._running.pop(job_id, None)
+            previous = self._durations.get(stage.name)
+            self._durations[stage.name] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+            self.store.finish(job_id, status, result, error, now)
+            self.store.add_event(job_id, status, {"error": error} if error else {"result": result}, now)
+            self._cond.notify_all()
+
+    def _keep_leases(self) -> None:
+        while not self._stopping.wait(self.lease / 3):
+            with self._cond:
+                if self._running:
+                    self.store.renew(list(self._running), time.time() + self.lease)
+
+    def _retry_after(self, stage: Stage) -> int:
+        """Seconds until a queue slot is likely free: one job finishes about
+        every mean duration divided by the number of workers."""
+        mean = self._durations.get(stage.name, 30.0)
+        return max(1, min(300, math.ceil(mean / stage.workers)))
+
+    def _purge(self, now: float) -> None:
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        for stage, payload in self.store.purge(now - self.retention):
+            cleanup = self.stages[stage].cleanup if stage in self.stages else None
+            if cleanup is not None:
+                try:
+                    cleanup(payload)
+                except Exception:
+                    logging.exception("Cleanup failed for a purged %s job", stage)
@@ -0,0 +1,140 @@
+"""Response cache for model calls, keyed on a canonicalized prompt.
+
+Identical contexts produce identical prompts, so a completed model
+response can be replayed instead of paying another round trip. Keys are
+built from sorted-key JSON of the prompt inputs, with volatile fields
+normalized first. Entries live in a bounded in-memory LRU and, when a
+path is configured, in a SQLite table that survives restarts and is
+shared by every worker process of a service.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import hashlib, json, os, sqlite3, threading, time
+
+# Fields whose exact whitespace does not change the meaning of a prompt.
+WHITESPACE_FIELDS = frozenset({"raw_instruction"})
+
+
+def canonicalize(obj: Any) -> Any:
+    """Copy of a JSON-like value with volatile fields normalized."""
+    if isinstance(obj, dict):
+        return {k: (" ".join(v.split()) if k in WHITESPACE_FIELDS and isinstance(v, str) else canonicalize(v))
+                for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [canonicalize(v) for v in obj]
+    return obj
+
+
+def cache_key(namespace: str, *parts: Any) -> str:
+    """Stable digest of a call site name and its canonicalized prompt inputs."""
+    payload = json.dumps([namespace, canonicalize(list(parts))], sort_keys=True,
+                         separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def bypass_requested(cache_control: Optional[str]) -> bool:
+    """Whether a request's Cache-Control header asks to skip cached responses."""
+    return bool(cache_control) and "no-cache" in cache_control.lower()
+
+
+class LLMCache:
+    """Bounded LRU/TTL cache of model responses with an optional SQLite backend."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None,
+                 path: Optional[str] = None, disk_max_entries: int = 16384):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = os.getpid()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = self._connect()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        self._pid = os.getpid()
+        return db
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        # A connection must not be used across fork(): a worker forked from
+        # a preloaded master opens its own.
+        if self._conn is not None and self._pid != os.getpid():
+            self._conn = self._connect()
+        return self._conn
+
+    @classmethod
+    def from_env(cls) -> "LLMCache":
+        """Build a cache from ``LLM_CACHE_SIZE``, ``LLM_CACHE_TTL`` and ``LLM_CACHE_PATH``."""
+        ttl = float(os.environ.get("LLM_CACHE_TTL", 24 * 3600))
+        return cls(
+            max_entries=int(os.environ.get("LLM_CACHE_SIZE", 1024)),
+            ttl=ttl if ttl > 0 else None,
+            path=os.environ.get("LLM_CACHE_PATH") or None,
+            disk_max_entries=int(os.environ.get("LLM_CACHE_DISK_SIZE", 16384)),
+        )
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None and self._expired(item[0], now):
+                del self._memory[key]
+                item = None
+            if item is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    self._db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)", (key, value, now, now))
+                count = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+                if count > self.disk_max_entries:
+                    self._db.execute(
+                        "DELETE FROM llm_cache WHERE key IN "
+                        "(SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)",
+                        (count - self.disk_max_entries,))
+
+    def _remember(self, key: str, created: float, value: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._memory),
+            "persistent": self._db is not None,
+        }
@@ -0,0 +1,362 @@
+"""Prometheus-style metrics for the Python services.
+
+Counters, gauges and histograms are kept in process and rendered in the
+Prometheus text format on each service's ``/metrics``. The standard
+metrics below cover every request (duration by endpoint and status,
+requests in flight, upload bytes), internal stages timed with ``stage``
+or ``timed``, and model calls (latency and tokens).
+
+Set ``METRICS_ENABLED=0`` to turn collection off: ``stage`` then hands
+back a shared no-op, ``timed`` returns the function unchanged, and the
+request middleware is not installed. Values are per process; with
+several workers (gunicorn ``-w``) each one reports its own.
+"""
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+import functools, inspect, os, threading, time
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; from cache hits and index reads up to long model calls.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    """A named metric with label names; values are kept per tuple of label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Bucketed observations; each label set holds ``[bucket counts, sum, count]``."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def clear(self) -> None:
+        """Drop every recorded value, keeping the metrics."""
+        for metric in self.metrics:
+            with metric._lock:
+                metric._values.clear()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last byte of the response.",
+    ("method", "endpoint", "status")))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Requests being handled, responses still streaming included.", ("endpoint",)))
+UPLOAD_BYTES = REGISTRY.register(Counter(
+    "http_upload_bytes_total", "Request body bytes received.", ("endpoint",)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "stage_duration_seconds", "Time spent in an internal stage of request handling.", ("stage",)))
+LLM_SECONDS = REGISTRY.register(Histogram(
+    "llm_request_duration_seconds", "Model call latency, streamed calls until the last token.",
+    ("model", "operation")))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "llm_tokens_total", "Tokens used by model calls, by kind (input or output).", ("model", "kind")))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# --- Stage timing ---
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.name)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str):
+    """Context manager timing a block as stage ``name``."""
+    return _Stage(name) if ENABLED else _NO_STAGE
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator timing every call of a function (or coroutine function) as stage ``name``."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with _Stage(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Stage(name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_iter(name: str, chunks: Iterable) -> Iterable:
+    """Pass ``chunks`` through, timing from the first to the last as stage ``name``."""
+    if not ENABLED:
+        return chunks
+
+    def generate():
+        with _Stage(name):
+            yield from chunks
+    return generate()
+
+
+# --- Model calls ---
+
+def observe_llm(model: str, operation: str, seconds: float, usage: Any = None) -> None:
+    """Record a model call; ``usage`` is the response's usage object (or dict), when it has one."""
+    if not ENABLED:
+        return
+    LLM_SECONDS.observe(seconds, model, operation)
+    if usage is not None:
+        for kind in ("input", "output"):
+            key = kind + "_tokens"
+            tokens = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, None)
+            if tokens:
+                LLM_TOKENS.inc(model, kind, amount=tokens)
+
+
+# --- Request instrumentation ---
+
+class ASGIMiddleware:
+    """Per-request metrics for a Starlette/FastAPI app.
+
+    The endpoint label is the route's path template (``/jobs/{job_id}``),
+    or ``other`` when no route matches, so label sets stay bounded.
+    Durations run until the response's last body chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        endpoint = asgi_endpoint(scope)
+        status = ["500"]
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc(endpoint)
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request" and message.get("body"):
+                UPLOAD_BYTES.inc(endpoint, amount=len(message["body"]))
+            return message
+
+        async def status_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, status_send)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(endpoint)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], endpoint, status[0])
+
+
+def asgi_endpoint(scope) -> str:
+    from starlette.routing import Match
+
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return getattr(route, "path", "other")
+    return "other"
+
+
+class WSGIMiddleware:
+    """Per-request metrics for a Flask app, wrapping its ``wsgi_app``.
+
+    Upload bytes are taken from Content-Length. A streamed response is
+    timed until the server closes it.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_app = flask_app.wsgi_app
+
+    def __call__(self, environ, start_response):
+        endpoint = self.endpoint(environ)
+        status = ["500"]
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc(endpoint)
+        length = environ.get("CONTENT_LENGTH")
+        if length and length.isdigit():
+            UPLOAD_BYTES.inc(endpoint, amount=int(length))
+
+        def finish():
+            REQUESTS_IN_FLIGHT.dec(endpoint)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, environ["REQUEST_METHOD"], endpoint, status[0])
+
+        def status_start_response(status_line, headers, exc_info=None):
+            status[0] = status_line.split(" ", 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            body = self.wsgi_app(environ, status_start_response)
+        except BaseException:
+            finish()
+            raise
+        return _ClosingIterable(body, finish)
+
+    def endpoint(self, environ) -> str:
+        try:
+            rule, _ = self.flask_app.url_map.bind_to_environ(environ).match(return_rule=True)
+        except Exception:
+            return "other"
+        return rule.rule
+
+
+class _ClosingIterable:
+    """A WSGI body that calls ``on_close`` once the server closes it."""
+
+    def __init__(self, body, on_close: Callable[[], None]):
+        self.body = body
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.on_close()
+
+
+def instrument_fastapi(app) -> None:
+    """Install the request middleware on a FastAPI app, if metrics are enabled."""
+    if ENABLED:
+        app.add_middleware(ASGIMiddleware)
+
+
+def instrument_flask(app) -> None:
+    """Wrap a Flask app's WSGI callable with the request middleware, if metrics are enabled."""
+    if ENABLED:
+        app.wsgi_app = WSGIMiddleware(app)
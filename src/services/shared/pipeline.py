@@ -0,0 +1,315 @@
+"""Python orchestration of the Arvo services as a stage dependency graph.
+
+Each stage declares the stages whose results it needs, and starts as soon
+as those are done, so independent stages (language-context and
+codebase-context) run concurrently and end-to-end latency follows the
+critical path rather than the sum of all stages.
+
+A stage can also be speculative: ``keep_if`` names a later stage whose
+result decides whether the work is wanted. The stage starts without
+waiting for it; once that stage finishes, the speculative one is kept,
+or cancelled if still running, or its result discarded. Containerizing
+the project is started this way from the codebase context, with the
+deployment type predicted, before the suggestion returns.
+
+    python -m shared.pipeline repo.zip "Deploy my Flask app to AWS" -o terraformed.zip
+"""
+from typing import Any, Awaitable, Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+import argparse, asyncio, json, logging, os, time
+
+import httpx
+
+RUNNING, DONE, SKIPPED, CANCELLED, DISCARDED, FAILED = (
+    "running", "done", "skipped", "cancelled", "discarded", "failed")
+TERMINAL = frozenset({DONE, SKIPPED, CANCELLED, DISCARDED, FAILED})
+
+
+class Stage(NamedTuple):
+    """A unit of work in the graph.
+
+    ``run`` is awaited with the results gathered so far (pipeline inputs
+    included). ``when`` is checked once the dependencies are done; if it is
+    false the stage is skipped. ``keep_if`` is ``(stage, predicate)``: the
+    predicate sees the results once that stage is done and decides whether
+    this stage's work is kept.
+    """
+    name: str
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+    when: Optional[Callable[[Dict[str, Any]], bool]] = None
+    keep_if: Optional[Tuple[str, Callable[[Dict[str, Any]], bool]]] = None
+
+
+class PipelineResult(NamedTuple):
+    results: Dict[str, Any]
+    status: Dict[str, str]
+    timings: Dict[str, Tuple[float, float]]  # stage -> (start, end), seconds from pipeline start
+    elapsed: float
+
+
+class PipelineError(Exception):
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"stage {stage!r} failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class StageGraph:
+    """Runs stages concurrently as their dependencies complete."""
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: Dict[str, Stage] = {s.name: s for s in stages}
+        for s in self.stages.values():
+            refs = s.deps + ((s.keep_if[0],) if s.keep_if else ())
+            missing = [d for d in refs if d not in self.stages]
+            if missing:
+                raise ValueError(f"stage {s.name!r} refers to unknown stages {missing}")
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"dependency cycle through {name!r}")
+            visiting.add(name)
+            stage = self.stages[name]
+            for d in stage.deps + ((stage.keep_if[0],) if stage.keep_if else ()):
+                visit(d)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def run(self, inputs: Dict[str, Any],
+                  on_event: Optional[Callable[[str, str], None]] = None) -> PipelineResult:
+        """Run every stage; the first failure of a kept stage cancels the rest and raises."""
+        start = time.monotonic()
+        results: Dict[str, Any] = dict(inputs)
+        status: Dict[str, str] = {}
+        timings: Dict[str, Tuple[float, float]] = {}
+        started: Dict[str, float] = {}
+        running: Dict["asyncio.Task[Any]", str] = {}
+        kept: Dict[str, bool] = {}
+        failures: Dict[str, BaseException] = {}
+
+        def emit(name, state):
+            status[name] = state
+            if on_event is not None:
+                on_event(name, state)
+
+        def settled(name):
+            """Done, and not at risk of being discarded any more."""
+            return status.get(name) == DONE and (self.stages[name].keep_if is None or kept.get(name, False))
+
+        def decide(name, stage) -> None:
+            judge, predicate = stage.keep_if
+            keep = kept[name] = status[judge] == DONE and bool(predicate(results))
+            state = status.get(name)
+            if keep:
+                if state == FAILED:
+                    raise PipelineError(name, failures[name])
+            elif state == RUNNING:
+                task = next(t for t, n in running.items() if n == name)
+                task.cancel()
+                del running[task]
+                timings[name] = (started[name] - start, time.monotonic() - start)
+                emit(name, CANCELLED)
+            elif state in (DONE, FAILED):
+                results.pop(name, None)
+                emit(name, DISCARDED)
+            elif state is None:
+                emit(name, SKIPPED)
+
+        def step() -> bool:
+            """Settle speculation and start ready stages; whether anything changed."""
+            changed = False
+            for name, stage in self.stages.items():
+                if stage.keep_if and name not in kept and status.get(stage.keep_if[0]) in TERMINAL:
+                    decide(name, stage)
+                    changed = True
+            for name, stage in self.stages.items():
+                if name in status:
+                    continue
+                if any(status.get(d) in TERMINAL and status[d] != DONE for d in stage.deps):
+                    emit(name, SKIPPED)
+                elif not all(settled(d) for d in stage.deps):
+                    continue
+                elif stage.when is not None and not stage.when(results):
+                    emit(name, SKIPPED)
+                else:
+                    started[name] = time.monotonic()
+                    running[asyncio.ensure_future(stage.run(dict(results)))] = name
+                    emit(name, RUNNING)
+                changed = True
+            return changed
+
+        try:
+            while True:
+                while step():
+                    pass
+                if not running:
+                    break
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    timings[name] = (started[name] - start, time.monotonic() - start)
+                    error = task.exception()
+                    if error is None:
+                        results[name] = task.result()
+                        emit(name, DONE)
+                    elif self.stages[name].keep_if and name not in kept:
+                        # A failed guess only matters if the guess turns out to be kept.
+                        logging.warning("Speculative stage %s failed: %s", name, error)
+                        failures[name] = error
+                        emit(name, FAILED)
+                    else:
+                        emit(name, FAILED)
+                        raise PipelineError(name, error)
+        finally:
+            for task in running:
+                task.cancel()
+
+        for name in self.stages:
+            if name not in status:
+                emit(name, SKIPPED)
+        return PipelineResult({n: results[n] for n in self.stages if status[n] == DONE},
+                              status, timings, time.monotonic() - start)
+
+
+# --- Arvo services ---
+
+SERVICE_URLS = {
+    "language_context": ("LANGUAGE_CONTEXT_URL", "http://language-context:8080/extract"),
+    "codebase_context": ("CODEBASE_CONTEXT_URL", "http://codebase-context:8080/extract"),
+    "suggestion": ("DEPLOYMENT_SUGGESTION_URL", "http://deployment-suggestion:8080/suggest"),
+    "terraform": ("GENERATE_TERRAFORM_URL", "http://generate-terraform:8080/terraform"),
+    "containerize": ("CONTAINERIZE_URL", "http://containerize-project:8080/"),
+}
+
+# Deployment type (as suggested) -> suggestion_type understood by containerize-project.
+CONTAINERIZE_TYPES = {"kubernetes-minikube": "kubernetes-minikube", "multi-docker": "multi-microservice"}
+
+
+def service_urls() -> Dict[str, str]:
+    return {stage: os.environ.get(var, default) for stage, (var, default) in SERVICE_URLS.items()}
+
+
+def parse_suggestion(text: str) -> Dict[str, Any]:
+    """The suggestion service answers with model text; the JSON may be fenced."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return json.loads(text)
+
+
+def predict_type(codebase_context: Dict[str, Any]) -> str:
+    """Guess the suggested deployment type from the codebase context alone."""
+    found = codebase_context.get("containerization") or {}
+    if found.get("kubernetes"):
+        return "kubernetes-minikube"
+    if found.get("compose"):
+        return "multi-docker"
+    return "single-docker"
+
+
+def needs_containerizing(results: Dict[str, Any]) -> bool:
+    found = results["codebase_context"].get("containerization") or {}
+    return not (found.get("dockerfile") or found.get("compose") or found.get("kubernetes"))
+
+
+def predicted_right(results: Dict[str, Any]) -> bool:
+    return results["suggestion"].get("type") == predict_type(results["codebase_context"])
+
+
+def service_stages(client: httpx.AsyncClient, urls: Dict[str, str]) -> Tuple[Stage, ...]:
+    """The Arvo flow: both contexts, the suggestion, containerizing and Terraform.
+
+    Inputs are ``instruction``, ``repo_zip`` (bytes) and ``filename``.
+    Containerizing starts speculatively from the codebase context with the
+    predicted deployment type and is redone only if the prediction was wrong.
+    """
+    def upload(results):
+        return {"repo_zip": (results["filename"], results["repo_zip"], "application/zip")}
+
+    async def post(stage, **kwargs):
+        response = await client.post(urls[stage], **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def language_context(results):
+        return (await post("language_context", json={"instruction": results["instruction"]})).json()
+
+    async def codebase_context(results):
+        return (await post("codebase_context", files=upload(results))).json()
+
+    async def suggestion(results):
+        response = await post("suggestion", json={"language_context": results["language_context"],
+                                                  "codebase_context": results["codebase_context"]})
+        return parse_suggestion(response.text)
+
+    async def containerize_as(results, deployment_type):
+        data = {"suggestion_type": CONTAINERIZE_TYPES.get(deployment_type, "single-docker")}
+        if "suggestion" in results:
+            data["suggestion_text"] = results["suggestion"].get("suggestion_text", "")
+        return (await post("containerize", data=data, files=upload(results))).json()
+
+    async def containerize_predicted(results):
+        return await containerize_as(results, predict_type(results["codebase_context"]))
+
+    async def containerize(results):
+        return await containerize_as(results, results["suggestion"].get("type"))
+
+    async def terraform(results):
+        data = {"suggestion": json.dumps(results["suggestion"])}
+        return (await post("terraform", data=data, files=upload(results))).content
+
+    return (
+        Stage("language_context", language_context),
+        Stage("codebase_context", codebase_context),
+        Stage("suggestion", suggestion, deps=("language_context", "codebase_context")),
+        Stage("containerize_predicted", containerize_predicted, deps=("codebase_context",),
+              when=needs_containerizing, keep_if=("suggestion", predicted_right)),
+        Stage("containerize", containerize, deps=("codebase_context", "suggestion"),
+              when=lambda r: needs_containerizing(r) and not predicted_right(r)),
+        Stage("terraform", terraform, deps=("suggestion",)),
+    )
+
+
+async def run_services(repo_zip: bytes, filename: str, instruction: str,
+                       urls: Optional[Dict[str, str]] = None, timeout: float = 600,
+                       on_event: Optional[Callable[[str, str], None]] = None) -> PipelineResult:
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        graph = StageGraph(service_stages(client, urls or service_urls()))
+        return await graph.run({"instruction": instruction, "repo_zip": repo_zip, "filename": filename},
+                               on_event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("repo_zip")
+    parser.add_argument("instruction")
+    parser.add_argument("-o", "--output", default="terraformed.zip")
+    args = parser.parse_args()
+
+    with open(args.repo_zip, "rb") as f:
+        repo = f.read()
+    log = lambda name, state: print("%-24s %s" % (name, state))
+    result = asyncio.run(run_services(repo, os.path.basename(args.repo_zip), args.instruction, on_event=log))
+
+    with open(args.output, "wb") as f:
+        f.write(result.results["terraform"])
+    for name, (begin, end) in sorted(result.timings.items(), key=lambda item: item[1]):
+        print("%-24s %7.2f s -> %7.2f s" % (name, begin, end))
+    artifact = result.results.get("containerize") or result.results.get("containerize_predicted")
+    if artifact:
+        print("container artifact:", artifact.get("artifact_zip"))
+    print("wrote %s in %.2f s" % (args.output, result.elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Process startup: lazy imports, warm-up before fork, per-worker hooks and readiness.
+
+A service registers the work that makes its first request slow (heavy
+imports, tables built on first use) as warm-up tasks, and whatever must
+exist once per process (threads, sockets, clients) as ``after_fork``
+hooks. Under gunicorn with ``shared.gunicorn_conf`` the app is preloaded
+and warmed in the master, so every worker starts from the same pages,
+shared copy-on-write, and only runs its hooks. Run any other way
+(``uvicorn app:app``, the Flask dev server), ``start()`` does both in the
+process itself, the warm-up in the background so the server accepts
+connections at once.
+
+``status()`` backs each service's ``/ready``: ready once the warm-up is
+done and this process has run its hooks.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import importlib, json, logging, os, threading, time
+
+_lock = threading.Lock()
+_tasks: List[Tuple[str, Callable[[], Any]]] = []
+_hooks: List[Callable[[], Any]] = []
+_warm_ms: Dict[str, float] = {}
+_warm_pid: Optional[int] = None
+_started_pid: Optional[int] = None
+_warming: Optional[threading.Thread] = None
+
+
+class LazyModule:
+    """A module imported on first attribute access.
+
+    Importing is left to ``importlib`` (and its per-module locks), so
+    threads racing on first use all see the one fully imported module.
+    """
+
+    def __init__(self, name: str):
+        self.__name = name
+        self.__module = None
+
+    def load(self):
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        return self.__module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self.__name!r}{' (loaded)' if self.__module is not None else ''}>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """``name``, imported when first used instead of when the service starts.
+
+    Annotations using the module must then be strings, or they would
+    import it after all.
+    """
+    return LazyModule(name)
+
+
+def warmup(name: str) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+    """Decorator registering a function to run once before the service is ready."""
+    def register(func):
+        _tasks.append((name, func))
+        return func
+    return register
+
+
+def after_fork(func: Callable[[], Any]) -> Callable[[], Any]:
+    """Register ``func`` to run once in each process that serves requests."""
+    _hooks.append(func)
+    return func
+
+
+def warm() -> None:
+    """Run the warm-up tasks, once; a failing task is logged and skipped."""
+    global _warm_pid
+    with _lock:
+        if _warm_pid is not None:
+            return
+        for name, func in _tasks:
+            start = time.perf_counter()
+            try:
+                func()
+            except Exception:
+                logging.exception("Warm-up task %s failed", name)
+            _warm_ms[name] = round((time.perf_counter() - start) * 1000, 1)
+        _warm_pid = os.getpid()
+
+
+def start(background: bool = True) -> None:
+    """Run this process's ``after_fork`` hooks (once per process) and the warm-up.
+
+    Cheap to call repeatedly. With ``background`` the warm-up, when it did
+    not already run before fork, goes to a thread.
+    """
+    global _started_pid, _warming
+    pid = os.getpid()
+    if _started_pid == pid:
+        return
+    with _lock:
+        if _started_pid == pid:
+            return
+        for func in _hooks:
+            func()
+        _started_pid = pid
+    if _warm_pid is None:
+        if background:
+            _warming = threading.Thread(target=warm, name="warmup", daemon=True)
+            _warming.start()
+        else:
+            warm()
+
+
+def ready() -> bool:
+    return _warm_pid is not None and _started_pid == os.getpid()
+
+
+def status() -> Dict[str, Any]:
+    """Readiness, with what the warm-up cost and whether it ran before fork."""
+    return {
+        "ready": ready(),
+        "pid": os.getpid(),
+        "preloaded": _warm_pid is not None and _warm_pid != os.getpid(),
+        "warmup_ms": dict(_warm_ms),
+    }
+
+
+# --- OpenAI ---
+
+_WARM_RESPONSE = {
+    "id": "resp_warmup", "object": "response", "created_at": 0, "status": "completed", "model": "warmup",
+    "output": [{"type": "message", "id": "msg_warmup", "status": "completed", "role": "assistant",
+                "content": [{"type": "output_text", "text": "", "annotations": []}]}],
+    "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+    "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0,
+              "input_tokens_details": {"cached_tokens": 0}, "output_tokens_details": {"reasoning_tokens": 0}},
+}
+
+
+def warm_openai(stream: bool = False) -> None:
+    """Import openai and run a Responses call, streamed too if asked, against a canned reply.
+
+    The SDK builds its response models on first use, which costs the
+    first real call most of a second. The reply comes from an in-memory
+    transport: nothing is sent and no connection is left open, so this
+    is safe to run before fork.
+    """
+    import httpx, openai
+
+    def reply(request):
+        if not json.loads(request.content).get("stream"):
+            return httpx.Response(200, json=_WARM_RESPONSE)
+        events = [{"type": "response.output_text.delta", "item_id": "msg_warmup", "output_index": 0,
+                   "content_index": 0, "delta": ""},
+                  {"type": "response.completed", "response": _WARM_RESPONSE}]
+        body = "".join("event: %s\ndata: %s\n\n" % (e["type"], json.dumps(dict(e, sequence_number=i)))
+                       for i, e in enumerate(events))
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    with httpx.Client(transport=httpx.MockTransport(reply)) as http:
+        client = openai.OpenAI(api_key="warmup", base_url="http://warmup.invalid/v1", http_client=http)
+        client.responses.create(model="warmup", input="")
+        if stream:
+            with client.responses.create(model="warmup", input="", stream=True) as events:
+                for _ in events:
+                    pass